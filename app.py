@@ -1,6 +1,12 @@
-from flask import Flask, render_template
+import os, hmac
+from flask import Flask, Response, abort, jsonify, render_template, request
+
+import metrics
+from signal_feed import FEED, KEEPALIVE_S, reset_event, sse
 
 app = Flask(__name__)
+SIGNALS_TOKEN = os.environ.get("SIGNALS_TOKEN", "")
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
 
 @app.route('/')
 def painel():
@@ -10,6 +16,63 @@ def painel():
 def sinais():
     return render_template('sinais.html')
 
+@app.route('/bot/sinais/stream')
+def sinais_stream():
+    # SSE: snapshot na conexão (ou só o que faltou, via Last-Event-ID) e depois
+    # os deltas conforme chegam; o comentário periódico mantém proxies abertos
+    last = request.headers.get('Last-Event-ID') or request.args.get('since')
+
+    def gen():
+        seq, events = FEED.since(int(last)) if last and last.isdigit() else (0, None)
+        if events is None:
+            ev = reset_event(FEED)
+            seq = ev["seq"]
+            yield "retry: 3000\n" + sse(ev)
+        else:
+            for ev in events:
+                yield sse(ev)
+        while True:
+            seq, events = FEED.wait(seq, KEEPALIVE_S)
+            if events is None:
+                ev = reset_event(FEED)
+                seq = ev["seq"]
+                yield sse(ev)
+            elif events:
+                for ev in events:
+                    yield sse(ev)
+            else:
+                yield ": ping\n\n"
+
+    return Response(gen(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/bot/sinais/delta')
+def sinais_delta():
+    # alternativa em JSON para quem não tem EventSource: ?since=<seq>
+    since = request.args.get('since', '')
+    seq, events = FEED.since(int(since)) if since.isdigit() else (0, None)
+    if events is None:
+        return jsonify(reset_event(FEED))
+    return jsonify({"seq": seq, "eventos": events})
+
+@app.route('/bot/sinais/publicar', methods=['POST'])
+def sinais_publicar():
+    auth = request.headers.get('Authorization', '')
+    if not SIGNALS_TOKEN or not hmac.compare_digest(auth, f'Bearer {SIGNALS_TOKEN}'):
+        abort(403)
+    data = request.get_json(silent=True)
+    items = data if isinstance(data, list) else [data] if isinstance(data, dict) else []
+    if not items:
+        abort(400)
+    return jsonify([FEED.publish(s) for s in items])
+
+@app.route('/metrics')
+def metricas():
+    # formato texto do Prometheus: este processo + último relatório de cada job
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}'):
+        abort(403)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/bot/automatico')
 def automatico():
     return render_template('automatico.html')
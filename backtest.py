@@ -0,0 +1,220 @@
+# backtest.py - replay de histórico OHLCV pela mesma lógica de sinais do painel
+#
+#   python backtest.py dados/1m --tf 5m,15m --perfil moderado,agressivo_total --hold 1,3
+#
+# Cada arquivo da pasta (<ATIVO>.csv/.parquet/.npy, velas de 1m) vai para um
+# processo; dentro dele todas as combinações de parâmetros reaproveitam os
+# mesmos indicadores. Resultados ficam em cache por (estratégia, parâmetros,
+# hash dos dados), então repetir a varredura só calcula o que mudou.
+import os, sys, json, glob, time, hashlib, argparse, itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from candles import TIMEFRAMES, TS, OPEN, CLOSE, read_bars, resample
+from signal_engine import PROFILES, MIN_GAP_S, SIGNAL_WINDOW_S, position_pct, score_bars
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get("BACKTEST_CACHE") or os.path.join(BASE_DIR, ".cache", "backtest")
+STRATEGY = "signal_engine.v2"   # mude ao alterar a lógica para invalidar o cache
+
+DEFAULTS = {"tf": "5m", "perfil": "moderado", "hold": 1, "fee_bps": 10.0, "slippage_bps": 5.0,
+            "latency_s": 5.0, "ema_fast": 9, "ema_slow": 21}
+INDICATOR_KEYS = ("ema_fast", "ema_slow")
+COLUMNS = ("ativo", "tf", "perfil", "hold", "ema_fast", "ema_slow", "trades", "win_rate",
+           "retorno_pct", "max_dd_pct", "sharpe", "exposicao_pct")
+
+
+def grid(**axes: Iterable) -> List[Dict]:
+    """grid(tf=["5m", "15m"], hold=[1, 3]) -> produto cartesiano sobre DEFAULTS."""
+    keys = list(axes)
+    return [dict(DEFAULTS, **dict(zip(keys, combo))) for combo in itertools.product(*axes.values())]
+
+
+def data_hash(bars: np.ndarray) -> str:
+    return hashlib.blake2b(np.ascontiguousarray(bars).tobytes(), digest_size=12).hexdigest()
+
+
+def cache_key(params: Dict, dhash: str) -> str:
+    raw = json.dumps({"s": STRATEGY, "p": params, "d": dhash}, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _cache_get(key: str) -> Optional[Dict]:
+    path = os.path.join(CACHE_DIR, key[:2], key + ".json")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return None
+
+
+def _cache_put(key: str, row: Dict) -> None:
+    path = os.path.join(CACHE_DIR, key[:2], key + ".json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(row, f)
+    os.replace(tmp, path)
+
+
+def select_entries(sig_ts: np.ndarray, busy_until: np.ndarray, min_gap: float) -> np.ndarray:
+    """Índices dos sinais aceitos: respeita o espaçamento mínimo e não abre
+    posição antes da anterior sair. O laço é só sobre sinais candidatos."""
+    keep, free_at = [], -np.inf
+    for i in range(len(sig_ts)):
+        if sig_ts[i] >= free_at:
+            keep.append(i)
+            free_at = max(sig_ts[i] + min_gap, busy_until[i])
+    return np.asarray(keep, dtype=np.int64)
+
+
+def simulate(bars_1m: np.ndarray, scored: Dict[str, np.ndarray], tf_bars: np.ndarray, params: Dict) -> Dict:
+    """Sinal na vela fechada do tempo `tf`; entrada na abertura da vela de 1m
+    seguinte, se a latência couber na validade de 45 s; saída no fechamento
+    `hold` velas depois. Taxa e slippage nos dois lados; o tamanho é o % do
+    saldo do perfil, com juros compostos."""
+    profile = PROFILES[params["perfil"]]
+    secs = TIMEFRAMES[params["tf"]]
+    n = len(tf_bars)
+    hold = int(params["hold"])
+    empty = {"trades": 0, "win_rate": 0.0, "retorno_pct": 0.0, "max_dd_pct": 0.0, "sharpe": 0.0,
+             "exposicao_pct": 0.0}
+    if n <= hold + 1 or params["latency_s"] > SIGNAL_WINDOW_S:
+        return empty
+
+    direction, forca = scored["dir"], scored["forca"]
+    pct = position_pct(forca, scored["atr"], scored["close"], profile)
+    # a última vela pode estar incompleta e as `hold` finais não têm saída
+    ok = (direction != 0) & (forca >= profile.min_forca) & (pct > 0)
+    ok[-(hold + 1):] = False
+    ok[:max(params["ema_slow"], 20)] = False
+    idx = np.flatnonzero(ok)
+    if not len(idx):
+        return empty
+
+    sig_ts = tf_bars[idx, TS] + secs                  # fechamento da vela do sinal
+    exit_idx = idx + hold
+    exit_ts = tf_bars[exit_idx, TS] + secs
+    keep = select_entries(sig_ts, exit_ts, MIN_GAP_S)
+    idx, sig_ts, exit_idx = idx[keep], sig_ts[keep], exit_idx[keep]
+
+    # preço de entrada: abertura da primeira vela de 1m em ou após sinal +
+    # latência (a que já estava aberta teria preço do passado); sem vela, sem trade
+    pos = np.searchsorted(bars_1m[:, TS], sig_ts + params["latency_s"], side="left")
+    has = pos < len(bars_1m)
+    if not has.all():
+        idx, exit_idx, pos = idx[has], exit_idx[has], pos[has]
+        if not len(idx):
+            return empty
+    entry = bars_1m[pos, OPEN]
+    exit_ = tf_bars[exit_idx, CLOSE]
+    d = direction[idx]
+    slip = params["slippage_bps"] / 1e4
+    fee = params["fee_bps"] / 1e4
+    ret = d * ((exit_ * (1 - d * slip)) / (entry * (1 + d * slip)) - 1) - 2 * fee
+
+    weights = pct[idx] / 100.0
+    equity = np.cumprod(1 + weights * ret)
+    peak = np.maximum.accumulate(np.r_[1.0, equity])[1:]
+    dd = (equity / peak - 1).min()
+    sd = ret.std()
+    span = tf_bars[-1, TS] - tf_bars[0, TS] + secs
+    return {
+        "trades": int(len(ret)),
+        "win_rate": round(float((ret > 0).mean() * 100), 2),
+        "retorno_pct": round(float((equity[-1] - 1) * 100), 2),
+        "max_dd_pct": round(float(-dd * 100), 2),
+        "sharpe": round(float(ret.mean() / sd * np.sqrt(len(ret))) if sd > 0 else 0.0, 3),
+        "exposicao_pct": round(float(len(ret) * hold * secs / span * 100), 2),
+    }
+
+
+def run_symbol(path: str, param_sets: List[Dict]) -> List[Dict]:
+    """Trabalho de um processo: um ativo, todas as combinações."""
+    symbol = os.path.splitext(os.path.basename(path))[0]
+    bars = read_bars(path)
+    dhash = data_hash(bars)
+    rows, resampled, scored = [], {}, {}
+    for params in param_sets:
+        key = cache_key(params, dhash)
+        hit = _cache_get(key)
+        if hit is None:
+            tf = params["tf"]
+            if tf not in resampled:
+                resampled[tf] = resample(bars, TIMEFRAMES[tf])
+            ind = (tf,) + tuple(params[k] for k in INDICATOR_KEYS)
+            if ind not in scored:
+                scored[ind] = score_bars(resampled[tf], ema_fast=params["ema_fast"], ema_slow=params["ema_slow"])
+            hit = simulate(bars, scored[ind], resampled[tf], params)
+            _cache_put(key, hit)
+        rows.append(dict({k: params[k] for k in COLUMNS if k in params}, ativo=symbol, **hit))
+    return rows
+
+
+def run_grid(paths: List[str], param_sets: List[Dict], workers: Optional[int] = None):
+    """Distribui os ativos entre processos e devolve a tabela (DataFrame)."""
+    import pandas as pd
+
+    rows: List[Dict] = []
+    workers = workers or min(len(paths), os.cpu_count() or 1)
+    if workers <= 1:
+        for p in paths:
+            rows += run_symbol(p, param_sets)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futs = [pool.submit(run_symbol, p, param_sets) for p in paths]
+            for fut in as_completed(futs):
+                rows += fut.result()
+    df = pd.DataFrame(rows, columns=list(COLUMNS))
+    return df.sort_values(["retorno_pct", "sharpe"], ascending=False, ignore_index=True)
+
+
+def summarize(df):
+    """Uma linha por combinação de parâmetros, somando os ativos."""
+    keys = ["tf", "perfil", "hold", "ema_fast", "ema_slow"]
+    return (df.groupby(keys, as_index=False)
+              .agg(ativos=("ativo", "nunique"), trades=("trades", "sum"), win_rate=("win_rate", "mean"),
+                   retorno_pct=("retorno_pct", "mean"), max_dd_pct=("max_dd_pct", "max"),
+                   sharpe=("sharpe", "mean"))
+              .round(2).sort_values("retorno_pct", ascending=False, ignore_index=True))
+
+
+def _csv(v: str, cast=str) -> List:
+    return [cast(x) for x in v.split(",") if x.strip()]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Backtest dos sinais do painel sobre velas de 1m.")
+    ap.add_argument("pasta", help="pasta com <ATIVO>.csv/.parquet/.npy (velas de 1m)")
+    ap.add_argument("--tf", default="5m")
+    ap.add_argument("--perfil", default="moderado")
+    ap.add_argument("--hold", default="1")
+    ap.add_argument("--ema-fast", default="9")
+    ap.add_argument("--ema-slow", default="21")
+    ap.add_argument("--fee-bps", type=float, default=DEFAULTS["fee_bps"])
+    ap.add_argument("--slippage-bps", type=float, default=DEFAULTS["slippage_bps"])
+    ap.add_argument("--latency", type=float, default=DEFAULTS["latency_s"])
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out", help="grava a tabela completa (.csv ou .json)")
+    args = ap.parse_args()
+
+    paths = sorted(p for ext in ("csv", "parquet", "npy") for p in glob.glob(os.path.join(args.pasta, f"*.{ext}")))
+    if not paths:
+        print(f"[ERRO] Nenhum arquivo de velas em {args.pasta}")
+        sys.exit(1)
+    params = grid(tf=_csv(args.tf), perfil=_csv(args.perfil), hold=_csv(args.hold, int),
+                  ema_fast=_csv(args.ema_fast, int), ema_slow=_csv(args.ema_slow, int),
+                  fee_bps=[args.fee_bps], slippage_bps=[args.slippage_bps], latency_s=[args.latency])
+
+    t0 = time.time()
+    df = run_grid(paths, params, args.workers)
+    print(summarize(df).to_string(index=False))
+    if args.out:
+        df.to_json(args.out, orient="records", force_ascii=False) if args.out.endswith(".json") else df.to_csv(args.out, index=False)
+    print(json.dumps({"ativos": len(paths), "combinacoes": len(params), "linhas": len(df),
+                      "segundos": round(time.time() - t0, 2)}))
+
+
+if __name__ == "__main__":
+    main()
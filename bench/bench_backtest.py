@@ -0,0 +1,50 @@
+# bench/bench_backtest.py - varredura do backtest: 20 ativos × 1 ano de velas de 1m
+#
+#   python bench/bench_backtest.py
+#   BENCH_SYMBOLS=4 BENCH_DAYS=30 BENCH_WORKERS=2 python bench/bench_backtest.py
+#
+# Gera os arquivos .npy num diretório temporário, roda a grade uma vez (fria)
+# e outra com o cache quente.
+import os, sys, json, time, tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import numpy as np
+from bench_candles import synthetic
+
+SYMBOLS = int(os.environ.get("BENCH_SYMBOLS", "20"))
+DAYS = float(os.environ.get("BENCH_DAYS", "365"))
+WORKERS = int(os.environ.get("BENCH_WORKERS", "0")) or None
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["BACKTEST_CACHE"] = os.path.join(tmp, "cache")
+        import backtest
+
+        data = os.path.join(tmp, "1m")
+        os.makedirs(data)
+        n = int(DAYS * 1440)
+        for i in range(SYMBOLS):
+            np.save(os.path.join(data, f"SYM{i}USDT.npy"), synthetic(n, i))
+        paths = sorted(str(p) for p in Path(data).glob("*.npy"))
+        params = backtest.grid(tf=["5m", "15m", "1h"], perfil=list(backtest.PROFILES), hold=[1, 3])
+
+        t0 = time.perf_counter()
+        df = backtest.run_grid(paths, params, WORKERS)
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        backtest.run_grid(paths, params, WORKERS)
+        warm = time.perf_counter() - t0
+
+        print(backtest.summarize(df).head(10).to_string(index=False))
+        print(json.dumps({"symbols": SYMBOLS, "bars_1m": n * SYMBOLS, "combos": len(params),
+                          "rows": len(df), "cold_s": round(cold, 2), "cached_s": round(warm, 2),
+                          "workers": WORKERS or os.cpu_count()}))
+
+
+if __name__ == "__main__":
+    main()
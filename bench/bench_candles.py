@@ -0,0 +1,94 @@
+# bench/bench_candles.py - motor de velas: vela a vela x carga em lote + memória
+#
+#   python bench/bench_candles.py                      # 20 ativos, 30 dias de 1m
+#   BENCH_SYMBOLS=200 BENCH_DAYS=2 python bench/bench_candles.py
+#
+# Gera velas de 1m sintéticas, grava um CSV para exercitar o replay e confere
+# que a agregação incremental (add_bar) bate com resample() em todos os tempos.
+import os, sys, json, time, tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import numpy as np
+import pandas as pd
+from candles import CandleEngine, COLUMNS, TIMEFRAMES, read_bars, replay, resample
+
+SYMBOLS = int(os.environ.get("BENCH_SYMBOLS", "20"))
+DAYS = float(os.environ.get("BENCH_DAYS", "30"))
+
+
+def synthetic(n: int, seed: int, start: int = 1_700_000_040) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    spread = np.abs(rng.normal(0, 0.0008, n)) * close
+    bars = np.empty((n, 6))
+    bars[:, 0] = start + 60 * np.arange(n)
+    bars[:, 1], bars[:, 4] = open_, close
+    bars[:, 2] = np.maximum(open_, close) + spread
+    bars[:, 3] = np.minimum(open_, close) - spread
+    bars[:, 5] = rng.gamma(2.0, 50.0, n)
+    return bars
+
+
+def main():
+    n = int(DAYS * 1440)
+    data = {f"SYM{i}/USDT": synthetic(n, i) for i in range(SYMBOLS)}
+
+    engine = CandleEngine()
+    closes = []
+    engine.on_close(lambda ex, sym, tf, ring: closes.append(tf))
+    t0 = time.perf_counter()
+    for sym, bars in data.items():
+        for row in bars:
+            engine.add_bar("binance", sym, *row)
+    incr_s = time.perf_counter() - t0
+
+    bulk = CandleEngine()
+    t0 = time.perf_counter()
+    for sym, bars in data.items():
+        bulk.load("binance", sym, bars)
+    bulk_s = time.perf_counter() - t0
+
+    mismatches = 0
+    for sym, bars in data.items():
+        for tf, secs in TIMEFRAMES.items():
+            a = engine.latest("binance", sym, tf, 10**9)
+            b = resample(bars, secs)[-len(a):]
+            c = bulk.latest("binance", sym, tf, 10**9)
+            if not (np.allclose(a, b) and np.allclose(c, b)):
+                mismatches += 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "btc_1m.csv")
+        pd.DataFrame(data["SYM0/USDT"], columns=COLUMNS).assign(
+            ts=lambda d: (d.ts * 1000).astype("int64")).to_csv(path, index=False)
+        rep = CandleEngine()
+        t0 = time.perf_counter()
+        replay(rep, path, "binance", "SYM0/USDT")
+        replay_s = time.perf_counter() - t0
+        same = np.allclose(rep.latest("binance", "SYM0/USDT", "1h", 100),
+                           engine.latest("binance", "SYM0/USDT", "1h", 100))
+        parsed = len(read_bars(path))
+
+    t0 = time.perf_counter()
+    for _ in range(100_000):
+        engine.latest("binance", "SYM0/USDT", "5m", 200)
+    latest_us = (time.perf_counter() - t0) / 100_000 * 1e6
+
+    result = {
+        "symbols": SYMBOLS, "bars_1m": n * SYMBOLS, "series": SYMBOLS * len(TIMEFRAMES),
+        "add_bar_per_s": round(n * SYMBOLS / incr_s), "add_bar_s": round(incr_s, 2),
+        "bulk_load_s": round(bulk_s, 3), "csv_replay_s": round(replay_s, 2), "csv_rows": parsed,
+        "latest_200_us": round(latest_us, 2), "closed_bars": len(closes),
+        "memory_mb": round(engine.memory_bytes() / 1024 / 1024, 1),
+        "mismatches": mismatches, "replay_matches": bool(same),
+    }
+    print(json.dumps(result))
+    sys.exit(1 if mismatches or not same else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# bench/bench_e2e.py - ponta a ponta, offline: buscadores e lojas gravados + WooCommerce falso
+#
+#   python bench/bench_e2e.py                                # todos os cenários
+#   python bench/bench_e2e.py crawler ingest --latencia 50 --erros 0.05
+#   python bench/bench_e2e.py --saida atual.json --comparar base.json
+#
+# Cada cenário roda num processo próprio (RSS de pico limpo) com os caches em
+# um diretório temporário; as requisições do `requests` são desviadas para
+# bench/stubs.py. Os limites de cortesia (FETCH_HOST_RATE, WOO_RATE) ficam em
+# --rate para medir o código e não o TokenBucket; passe --rate 2 para
+# reproduzir o ritmo de produção. Resultado: itens/s, latência p50/p99 das
+# requisições, chamadas por rota e RSS de pico, em JSON.
+import os, sys, json, time, runpy, argparse, resource, subprocess, tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import stubs
+
+QUERIES = ["iphone 14 128gb preço", "notebook i5 16gb ssd 512", "smart tv 50 4k", "ssd nvme 1tb",
+           "roteador wi-fi 6 ax3000", "air fryer 4 litros", "fone bluetooth jbl", "kindle 11 geração",
+           "cafeteira expresso", "mouse sem fio logitech", "monitor 27 144hz", "cadeira gamer"]
+
+
+# ---------- cenários (rodam no processo filho) ----------
+
+def queries():
+    n = int(os.environ.get("BENCH_QUERIES", "12"))
+    return [QUERIES[i % len(QUERIES)] + (f" {i // len(QUERIES)}" if i >= len(QUERIES) else "") for i in range(n)]
+
+
+def run_crawler():
+    import crawler
+    crawler.QUERIES[:] = queries()
+    crawler.MAX_PER_RUN = 10 ** 9
+    return len(crawler.crawl_once())
+
+
+def run_crawler_v2():
+    import crawler_v2
+    return sum(1 for it in crawler_v2.crawl_queries(queries()) if it["ok"])
+
+
+def run_crawler_v3():
+    return len(runpy.run_path(str(BASE_DIR / "crawler_v3.py"), run_name="__main__")["items"])
+
+
+def run_mercadolivre():
+    # o extrator do scrapper_automatico, sem a importação do JSON legado
+    from merchants import crawl
+    return sum(1 for _ in crawl(["mercadolivre"]))
+
+
+def run_ingest():
+    sys.path.insert(0, str(BASE_DIR / "scripts"))
+    sys.argv = ["ingest.py"]
+    import ingest
+    ingest.FEED_PATH = Path(os.environ["BENCH_FEED"])
+    ingest.main()
+    return int(os.environ["BENCH_ROWS"])
+
+
+def run_migrate_wc():
+    import migrate_wc
+    migrate_wc.run()
+    return int(os.environ["BENCH_ROWS"])
+
+
+SCENARIOS = {
+    "crawler": run_crawler,
+    "crawler_v2": run_crawler_v2,
+    "crawler_v3": run_crawler_v3,
+    "mercadolivre": run_mercadolivre,
+    "ingest": run_ingest,
+    "migrate_wc": run_migrate_wc,
+}
+
+
+def child(name: str) -> None:
+    log: list = []
+    stubs.redirect(os.environ["BENCH_STUB"], log)
+    t0 = time.perf_counter()
+    items = SCENARIOS[name]()
+    elapsed = time.perf_counter() - t0
+    with open(os.environ["BENCH_RESULT"], "w", encoding="utf-8") as f:
+        json.dump({"itens": items, "segundos": elapsed, "latencias": log,
+                   "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}, f)
+
+
+# ---------- orquestração ----------
+
+def pct(values, q):
+    if not values:
+        return None
+    s = sorted(values)
+    return s[min(len(s) - 1, int(q * len(s)))]
+
+
+def run(name: str, args, retail: stubs.RetailStub, woo: stubs.WooStub) -> dict:
+    retail.reset()
+    woo.reset()
+    with tempfile.TemporaryDirectory() as tmp:
+        t = Path(tmp)
+        env = dict(os.environ,
+                   BENCH_STUB=retail.address, BENCH_RESULT=str(t / "resultado.json"),
+                   BENCH_QUERIES=str(args.consultas), BENCH_ROWS=str(args.linhas),
+                   BENCH_FEED=str(t / "feed.csv"),
+                   HTTP_CACHE="0", SERP_CACHE="0", HTTP_CACHE_PATH=str(t / "http.sqlite3"),
+                   SERP_CACHE_PATH=str(t / "serp.sqlite3"), SEEN_INDEX_PATH=str(t / "seen.sqlite3"),
+                   PRICE_HISTORY_DIR=str(t / "precos"), IMAGE_CACHE_PATH=str(t / "imagens.json"),
+                   PRODUCT_SINK=str(t / "sink.jsonl"), CATALOG_PATH=str(t / "catalogo.sqlite3"),
+                   SYNC_MANIFEST_PATH=str(t / "manifesto.json"), METRICS_DIR=str(t / "metrics"),
+                   FETCH_HOST_RATE=str(args.rate), FETCH_HOST_BURST=str(max(2, int(args.rate))),
+                   WOO_RATE=str(args.rate),
+                   WOO_BASE_URL=f"http://{woo.address}", WOO_CONSUMER_KEY="ck_bench", WOO_CONSUMER_SECRET="cs_bench",
+                   WC_URL=f"http://{woo.address}", WC_CK="ck_bench", WC_CS="cs_bench",
+                   CSV_URL="https://planilha.bench/migrar.csv")
+        if name == "ingest":
+            stubs.feed_csv(t / "feed.csv", args.linhas)
+        with open(t / "saida.log", "w", encoding="utf-8") as out:
+            code = subprocess.run([sys.executable, __file__, "--filho", name], env=env, cwd=tmp,
+                                  stdout=out, stderr=subprocess.STDOUT, timeout=args.timeout).returncode
+        if code or not (t / "resultado.json").exists():
+            tail = (t / "saida.log").read_text(encoding="utf-8", errors="replace")[-2000:]
+            print(f"[ERRO] {name} saiu com código {code}:\n{tail}")
+            return {"status": "falhou", "codigo": code}
+        res = json.loads((t / "resultado.json").read_text(encoding="utf-8"))
+
+    lat = [s for _, s in res["latencias"]]
+    woo_lat = [s for h, s in res["latencias"] if h in stubs.LOCAL]
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "status": "ok",
+        "itens": res["itens"],
+        "segundos": round(res["segundos"], 3),
+        "itens_s": round(res["itens"] / res["segundos"], 2) if res["segundos"] else None,
+        "requisicoes": len(lat),
+        "p50_ms": ms(pct(lat, 0.50)),
+        "p99_ms": ms(pct(lat, 0.99)),
+        "woo_p50_ms": ms(pct(woo_lat, 0.50)),
+        "woo_p99_ms": ms(pct(woo_lat, 0.99)),
+        "rss_mb": round(res["rss_mb"], 1),
+        "varejo": dict(sorted(retail.calls.items())),
+        "woo": dict(sorted(woo.calls.items())),
+    }
+
+
+def compare(cur: dict, base_path: str) -> None:
+    base = json.loads(Path(base_path).read_text(encoding="utf-8")).get("cenarios", {})
+    for name, r in cur.items():
+        b = base.get(name)
+        if not b or r.get("status") != "ok" or b.get("status") != "ok":
+            continue
+        parts = []
+        for k in ("itens_s", "p99_ms", "rss_mb"):
+            if r.get(k) and b.get(k):
+                parts.append(f"{k} {b[k]} -> {r[k]} ({(r[k] / b[k] - 1) * 100:+.1f}%)")
+        print(f"{name:13} " + "  ".join(parts))
+
+
+def git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de ponta a ponta com lojas e WooCommerce locais.")
+    ap.add_argument("cenarios", nargs="*", help="|".join(SCENARIOS) + " (padrão: todos)")
+    ap.add_argument("--latencia", type=float, default=20, help="ms por resposta das lojas/buscadores (±50%%)")
+    ap.add_argument("--latencia-woo", type=float, default=40, help="ms por chamada à API do WooCommerce")
+    ap.add_argument("--por-item", type=float, default=2, help="ms extras por produto gravado no WooCommerce")
+    ap.add_argument("--erros", type=float, default=0.02, help="fração de 503 nas lojas/buscadores")
+    ap.add_argument("--erros-woo", type=float, default=0.0, help="fração de 503 na API")
+    ap.add_argument("--pagina-kb", type=int, default=400, help="tamanho das páginas de produto")
+    ap.add_argument("--paginas-ml", type=int, default=5, help="páginas de ofertas por listagem do ML")
+    ap.add_argument("--consultas", type=int, default=12)
+    ap.add_argument("--linhas", type=int, default=500, help="linhas do feed (ingest) e da planilha (migrate_wc)")
+    ap.add_argument("--rate", type=float, default=1000, help="FETCH_HOST_RATE/WOO_RATE dos processos medidos")
+    ap.add_argument("--timeout", type=float, default=900)
+    ap.add_argument("--saida", help="arquivo JSON (padrão: .cache/bench/e2e_<commit>_<hora>.json)")
+    ap.add_argument("--comparar", help="JSON de uma execução anterior")
+    ap.add_argument("--filho", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.filho:
+        return child(args.filho)
+    unknown = set(args.cenarios) - set(SCENARIOS)
+    if unknown:
+        ap.error("cenário desconhecido: " + ", ".join(sorted(unknown)))
+
+    retail = stubs.RetailStub(page_kb=args.pagina_kb, ml_pages=args.paginas_ml, csv_rows=args.linhas,
+                              latency=args.latencia / 1000, error_rate=args.erros, seed=1)
+    woo = stubs.WooStub(per_item=args.por_item / 1000, latency=args.latencia_woo / 1000,
+                        error_rate=args.erros_woo, seed=2)
+    results = {}
+    try:
+        for name in args.cenarios or list(SCENARIOS):
+            r = results[name] = run(name, args, retail, woo)
+            if r["status"] == "ok":
+                print(f"{name:13} {r['itens']:6} itens  {r['segundos']:7.2f}s  {r['itens_s']:8.1f} itens/s  "
+                      f"p50 {r['p50_ms']} ms  p99 {r['p99_ms']} ms  {r['requisicoes']} req  "
+                      f"woo {sum(v for k, v in r['woo'].items() if k != 'escritos')} chamadas  "
+                      f"RSS {r['rss_mb']} MB")
+    finally:
+        retail.close()
+        woo.close()
+
+    rev = git_rev()
+    out = Path(args.saida) if args.saida else \
+        BASE_DIR / ".cache" / "bench" / f"e2e_{rev or 'local'}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    config = {k: v for k, v in vars(args).items() if k not in ("cenarios", "saida", "comparar", "filho")}
+    out.write_text(json.dumps({"commit": rev, "ts": int(time.time()), "python": sys.version.split()[0],
+                               "config": config, "cenarios": results}, ensure_ascii=False, indent=2),
+                   encoding="utf-8")
+    print(f"[INFO] resultado em {out}")
+    if args.comparar:
+        compare(results, args.comparar)
+    if any(r["status"] != "ok" for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
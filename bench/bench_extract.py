@@ -0,0 +1,114 @@
+# bench/bench_extract.py - BeautifulSoup (página inteira) x meta_stream (só o <head>)
+#
+#   python bench/bench_extract.py            # páginas de ~2 MB
+#   BENCH_PAGE_MB=5 python bench/bench_extract.py
+#
+# As fixtures guardam o <head> e o começo do <body> de páginas reais; o
+# marcador <!--BODY--> é preenchido com markup de vitrine até o tamanho pedido,
+# já que as páginas de varejo reais passam de alguns MB.
+import os, re, sys, json, time, tracemalloc
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from bs4 import BeautifulSoup
+import meta_stream
+from crawler_v2 import norm_space
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+PAGE_MB = float(os.environ.get("BENCH_PAGE_MB", "2"))
+REPEAT = int(os.environ.get("BENCH_REPEAT", "5"))
+
+FILLER = (
+    '<div class="product-card"><a href="/p/{i}"><img src="https://img.example/{i}.jpg" alt="Item {i}"/>'
+    '<span class="name">Produto relacionado número {i} com descrição longa</span>'
+    '<span class="price">R$ {i},90</span></a></div>\n'
+)
+
+
+def load_pages():
+    pages = {}
+    target = int(PAGE_MB * 1024 * 1024)
+    for f in sorted(FIXTURES.glob("*_produto.html")):
+        html = f.read_text(encoding="utf-8")
+        parts, i, size = [], 0, len(html)
+        while size < target:
+            block = FILLER.format(i=i)
+            parts.append(block)
+            size += len(block)
+            i += 1
+        pages[f.stem] = html.replace("<!--BODY-->", "".join(parts)).encode("utf-8")
+    return pages
+
+
+# implementações anteriores (crawler.extract_meta e crawler_v2.fetch_product_page)
+PRICE_RX = re.compile(r"(R\$\s*\d{1,3}(\.\d{3})*(,\d{2})?)", re.I)
+PRICE_RX_V2 = re.compile(r"(?:R\$\s?|US\$\s?|€\s?|£\s?)(?:\d{1,3}(?:[\.\,]\d{3})*|\d+)(?:[\.\,]\d{2})?", re.I)
+
+
+def extract_price(txt):
+    m = PRICE_RX_V2.search(txt or "")
+    return m.group(0) if m else None
+
+
+def legacy_crawler(raw: bytes):
+    html_text = raw.decode("utf-8")
+    soup = BeautifulSoup(html_text, "lxml")
+
+    def m(name):
+        tag = soup.find("meta", attrs={"property": name}) or soup.find("meta", attrs={"name": name})
+        return tag.get("content").strip() if tag and tag.get("content") else None
+
+    mprice = PRICE_RX.search(html_text)
+    return {"title": m("og:title") or (soup.title.string.strip() if soup.title else None),
+            "image": m("og:image"), "description": m("og:description") or m("description"),
+            "price_text": mprice.group(1) if mprice else None}
+
+
+def legacy_crawler_v2(raw: bytes):
+    soup = BeautifulSoup(raw.decode("utf-8"), "lxml")
+    title = norm_space((soup.select_one("meta[property='og:title']") or {}).get("content") or "")
+    meta_price = soup.select_one("meta[itemprop='price'], meta[property='product:price:amount']")
+    price = meta_price.get("content") if meta_price else extract_price(soup.get_text(" ", strip=True))
+    return {"title": title, "price": price}
+
+
+def streaming(raw: bytes):
+    step = meta_stream.CHUNK_SIZE
+    return meta_stream.extract_from_chunks(raw[i:i + step] for i in range(0, len(raw), step))
+
+
+def measure(fn, raw):
+    t0 = time.process_time()
+    for _ in range(REPEAT):
+        out = fn(raw)
+    cpu_ms = (time.process_time() - t0) / REPEAT * 1000
+    tracemalloc.start()
+    fn(raw)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, cpu_ms, peak / 1024 / 1024
+
+
+def main():
+    results = []
+    for name, raw in load_pages().items():
+        row = {"page": name, "size_mb": round(len(raw) / 1024 / 1024, 2)}
+        for label, fn in (("bs4_crawler", legacy_crawler), ("bs4_crawler_v2", legacy_crawler_v2),
+                          ("stream", streaming)):
+            out, cpu_ms, peak_mb = measure(fn, raw)
+            row[label] = {"cpu_ms": round(cpu_ms, 2), "peak_mb": round(peak_mb, 2)}
+            if label == "stream":
+                row["stream"]["read_kb"] = round(out["bytes"] / 1024, 1)
+                row["stream"]["title"] = out["title"]
+                row["stream"]["price_text"] = out["price_text"]
+        results.append(row)
+        print(f"{name:24} {row['size_mb']:5.2f} MB | bs4 {row['bs4_crawler']['cpu_ms']:8.1f} ms "
+              f"{row['bs4_crawler']['peak_mb']:7.1f} MB | stream {row['stream']['cpu_ms']:7.2f} ms "
+              f"{row['stream']['peak_mb']:6.2f} MB ({row['stream']['read_kb']} KB lidos)")
+    print(json.dumps(results, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# bench/bench_price.py - corpus de preços + parse por linha (antigo) x price.parse_series
+#
+#   python bench/bench_price.py                  # 100k linhas
+#   BENCH_PRICE_ROWS=500000 python bench/bench_price.py
+#
+# Primeiro confere price.parse_price e price.parse_series contra
+# fixtures/precos.jsonl (sai com código 1 se algo divergir); depois mede uma
+# coluna de feed sintética, meio repetida (como nos CSVs de afiliados) e meio
+# com valores distintos.
+import os, sys, json, time, random
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import pandas as pd
+from price import parse_price, parse_series
+
+CORPUS = Path(__file__).resolve().parent / "fixtures" / "precos.jsonl"
+ROWS = int(os.environ.get("BENCH_PRICE_ROWS", "100000"))
+REPEAT = int(os.environ.get("BENCH_REPEAT", "3"))
+
+
+# implementação anterior (parse_price aninhado de scripts/ingest.read_feed)
+def legacy_parse_price(v) -> float:
+    if v is None:
+        return 0.0
+    s = str(v).replace("\xa0", "").strip()
+    if not s:
+        return 0.0
+    if "," in s and "." in s:
+        s = s.replace(".", "").replace(",", ".")
+    elif "," in s:
+        s = s.replace(".", "").replace(",", ".")
+    try:
+        return float(s)
+    except ValueError:
+        return 0.0
+
+
+def check_corpus() -> int:
+    cases = [json.loads(line) for line in CORPUS.read_text(encoding="utf-8").splitlines() if line.strip()]
+    batch = parse_series(pd.Series([c["text"] for c in cases], dtype="object"))
+    errors = 0
+    for c, (_, row) in zip(cases, batch.iterrows()):
+        want = Decimal(c["amount"]) if c["amount"] is not None else None
+        got = parse_price(c["text"])
+        vec = Decimal(str(round(row["amount"], 6))).normalize() if pd.notna(row["amount"]) else None
+        ok = (got.amount == want and (want is None or got.currency == c["currency"])
+              and (vec == (want.normalize() if want is not None else None))
+              and (want is None or row["currency"] == c["currency"]))
+        if not ok:
+            errors += 1
+            print(f"DIVERGE {c['text']!r}: esperado {want} {c['currency']} | "
+                  f"parse_price {got.amount} {got.currency} | parse_series {row['amount']} {row['currency']}")
+    print(f"corpus: {len(cases)} casos, {errors} divergências")
+    return errors
+
+
+def feed_column(n: int) -> pd.Series:
+    rnd = random.Random(42)
+    common = [f"{rnd.randint(10, 5000)},{rnd.choice(['00', '90', '99'])}" for _ in range(500)]
+    vals = []
+    for i in range(n):
+        if i % 2:
+            vals.append(rnd.choice(common))
+        else:
+            v = rnd.uniform(1, 20000)
+            br = f"{v:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+            vals.append(rnd.choice([f"R$ {br}", br, f"{v:.2f}"]))
+    return pd.Series(vals, dtype="object")
+
+
+def timed(fn):
+    best = None
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        out = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return out, best
+
+
+def main():
+    errors = check_corpus()
+    col = feed_column(ROWS)
+    legacy, legacy_s = timed(lambda: [legacy_parse_price(v) for v in col])
+    _, single_s = timed(lambda: [parse_price(v) for v in col])
+    df, vector_s = timed(lambda: parse_series(col))
+    result = {
+        "rows": ROWS,
+        "distinct": int(col.nunique()),
+        "legacy_per_row_s": round(legacy_s, 3),
+        "parse_price_per_row_s": round(single_s, 3),
+        "parse_series_s": round(vector_s, 3),
+        "parsed": int(df["amount"].notna().sum()),
+        # o código antigo devolve 0.0 para "R$ 1.234,56" e 1.299 para "1.299"
+        "legacy_disagree": int(((pd.Series(legacy) - df["amount"].fillna(0)).abs() > 0.005).sum()),
+        "corpus_errors": errors,
+    }
+    print(json.dumps(result, ensure_ascii=False))
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
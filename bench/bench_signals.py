@@ -0,0 +1,70 @@
+# bench/bench_signals.py - scan vetorizado do Top-20 em todos os tempos + atualização incremental
+#
+#   python bench/bench_signals.py
+#   BENCH_SYMBOLS=50 BENCH_PROFILE=agressivo_total python bench/bench_signals.py
+#
+# Confere também que o estado incremental (EMAs, RSI, ATR) chega ao mesmo
+# valor que o cálculo vetorizado sobre o histórico inteiro.
+import os, sys, json, time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import numpy as np
+from bench_candles import synthetic
+from candles import CandleEngine, CLOSE, HIGH, LOW
+from signal_engine import IncrementalState, SignalEngine, atr, ema, rsi, EMA_FAST, EMA_SLOW
+
+SYMBOLS = int(os.environ.get("BENCH_SYMBOLS", "20"))
+PROFILE = os.environ.get("BENCH_PROFILE", "moderado")
+DAYS = float(os.environ.get("BENCH_DAYS", "10"))
+REPEAT = int(os.environ.get("BENCH_REPEAT", "20"))
+
+
+def main():
+    n = int(DAYS * 1440)
+    candles = CandleEngine()
+    data = {f"SYM{i}/USDT": synthetic(n, i) for i in range(SYMBOLS)}
+    for sym, bars in data.items():
+        candles.load("binance", sym, bars)
+    engine = SignalEngine(candles, PROFILE, min_gap=0)
+
+    engine.scan()
+    t0 = time.perf_counter()
+    for _ in range(REPEAT):
+        top = engine.scan(top=20)
+    scan_ms = (time.perf_counter() - t0) / REPEAT * 1000
+
+    # incremental: semeia com metade do histórico e alimenta o resto vela a vela
+    bars = data["SYM0/USDT"]
+    half = len(bars) // 2
+    st = IncrementalState.seed(bars[:half])
+    t0 = time.perf_counter()
+    for row in bars[half:]:
+        st.update(row)
+    update_us = (time.perf_counter() - t0) / (len(bars) - half) * 1e6
+    c, h, l = bars[:, CLOSE], bars[:, HIGH], bars[:, LOW]
+    want = np.array([ema(c, EMA_FAST)[-1], ema(c, EMA_SLOW)[-1], rsi(c)[-1], atr(h, l, c)[-1]])
+    got = np.array([st.ema_f, st.ema_s, st.rsi(), st.atr])
+
+    live = CandleEngine()
+    eng_live = SignalEngine(live, PROFILE, min_gap=0)
+    t0 = time.perf_counter()
+    for row in bars[:5000]:
+        live.add_bar("binance", "SYM0/USDT", *row)
+    live_s = time.perf_counter() - t0
+
+    result = {
+        "profile": PROFILE, "series": SYMBOLS * 9, "scan_top20_ms": round(scan_ms, 2),
+        "top": [(s["ativo"], s["vela"], s["direcao"], s["forca"], s["pct"]) for s in top[:5]],
+        "incremental_update_us": round(update_us, 2),
+        "incremental_matches": bool(np.allclose(want, got, rtol=1e-9)),
+        "live_5000_bars_s": round(live_s, 3), "live_signaled_symbols": len(eng_live.last_signal),
+    }
+    print(json.dumps(result, ensure_ascii=False))
+    sys.exit(0 if result["incremental_matches"] else 1)
+
+
+if __name__ == "__main__":
+    main()
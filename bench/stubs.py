@@ -0,0 +1,455 @@
+# bench/stubs.py - servidores locais para o benchmark de ponta a ponta
+#
+# RetailStub responde como Bing, DuckDuckGo, Amazon, Mercado Livre, KaBuM e as
+# CDNs de imagem a partir das fixtures gravadas em bench/fixtures; WooStub é
+# uma API REST do WooCommerce em memória (/products, /products/batch,
+# /products/categories, /products/tags). Os dois aceitam latência e taxa de
+# erro (503 com Retry-After) configuráveis e contam as chamadas por rota.
+#
+# redirect() é instalado no processo medido: toda requisição do `requests` para
+# fora de 127.0.0.1 vai para o RetailStub (o host original segue no cabeçalho
+# X-Stub-Host) e a latência de cada uma fica registrada.
+import re, sys, csv, io, json, time, math, base64, random, hashlib, threading, urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+LOCAL = ("127.0.0.1", "localhost")
+
+AMAZON_CATEGORIES = {
+    "kitchen": "Cozinha", "electronics": "Eletrônicos", "computers": "Computadores e Informática",
+    "home": "Casa", "appliances": "Eletrodomésticos", "videogames": "Games", "beauty": "Beleza",
+    "hpc": "Saúde e Cuidados Pessoais", "toys": "Brinquedos e Jogos", "sports": "Esportes e Aventura",
+    "pet-products": "Pet Shop", "baby": "Bebês", "office-products": "Material de Escritório",
+    "automotive": "Automotivo", "hi": "Ferramentas e Materiais de Construção", "books": "Livros",
+    "garden": "Jardim e Piscina", "music": "Música", "fashion": "Moda", "luggage": "Malas e Mochilas",
+}
+PRODUCTS = ("Smartphone Motorola Moto g15 256GB", "Fone de Ouvido Bluetooth JBL Tune 520BT",
+            "SSD NVMe Kingston NV2 1TB", "Air Fryer Mondial 4L", "Smart TV LG 50 4K UHD",
+            "Roteador TP-Link Archer AX23 Wi-Fi 6", "Notebook Lenovo IdeaPad i5 16GB",
+            "Cafeteira Nespresso Essenza Mini", "Mouse Logitech MX Master 3S", "Kindle 11ª geração")
+PNG_1000 = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x03\xe8\x00\x00\x03\xe8\x08\x06\x00\x00\x00" + bytes(999)
+FILLER = ('<div class="product-card"><a href="/p/{i}"><img src="https://img.example/{i}.jpg" alt="Item {i}"/>'
+          '<span class="name">Produto relacionado número {i} com descrição longa</span>'
+          '<span class="price">R$ {i},90</span></a></div>\n')
+
+_FIELD_RX = re.compile(r"\{(\w+)\}")
+
+
+def _h(*parts, size: int = 10) -> str:
+    return hashlib.md5("|".join(map(str, parts)).encode("utf-8")).hexdigest()[:size]
+
+
+def _fill(text: str, values: Dict) -> str:
+    # {campo} conhecido é trocado; o resto (JSON, CSS) fica como está
+    return _FIELD_RX.sub(lambda m: str(values.get(m.group(1), m.group(0))), text)
+
+
+def render(name: str, items: List[Dict], **values) -> str:
+    """Fixture com os blocos <!--ITEM--> (e <!--NAV-->) repetidos para cada item."""
+    page = (FIXTURES / name).read_text(encoding="utf-8")
+    for tag, rows in (("ITEM", items), ("NAV", values.pop("nav", None))):
+        start, end = f"<!--{tag}-->", f"<!--/{tag}-->"
+        if start not in page:
+            continue
+        head, rest = page.split(start, 1)
+        block, tail = rest.split(end, 1)
+        page = head + "".join(_fill(block, r) for r in rows or ()) + tail
+    return _fill(page, values)
+
+
+def price(seed: str) -> Tuple[str, float]:
+    v = 49.9 + int(_h(seed, size=6), 16) % 450000 / 100
+    return f"{v:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), v
+
+
+def product_url(query: str, i: int) -> Tuple[str, str]:
+    """(url, título) do i-ésimo resultado de uma busca: Amazon, ML, KaBuM e um
+    quinto fora das lojas permitidas."""
+    title = f"{PRODUCTS[int(_h(query, i, size=4), 16) % len(PRODUCTS)]} {_h(query, i, size=4).upper()}"
+    slug = re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-")
+    kind = i % 5
+    if kind in (0, 3):
+        return f"https://www.amazon.com.br/{slug}/dp/B0{_h(query, i, size=8).upper()}", title
+    if kind == 1:
+        return f"https://www.mercadolivre.com.br/{slug}/p/MLB{int(_h(query, i, size=8), 16) % 10**8}", title
+    if kind == 2:
+        return f"https://www.kabum.com.br/produto/{int(_h(query, i, size=6), 16) % 10**6}/{slug}", title
+    return f"https://pt.wikipedia.org/wiki/{slug}", title
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        # cliente que fecha a conexão no meio (streaming, fim do processo) é o normal aqui
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None):
+        try:
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # o cliente leu só o <head> e fechou
+            self.close_connection = True
+
+    def read_body(self) -> bytes:
+        n = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(n) if n else b""
+
+    def _dispatch(self):
+        stub = self.server.stub
+        stub.wait()
+        if stub.fail():
+            self.read_body()        # mantém o keep-alive alinhado
+            stub.count("503")
+            return self._reply(503, b"Service Unavailable", {"Retry-After": "0"})
+        status, headers, body = stub.handle(self)
+        self._reply(status, body, headers)
+
+    do_GET = do_HEAD = do_POST = do_PUT = _dispatch
+
+
+class Stub:
+    """Servidor em thread própria; latency em segundos (±50%), error_rate de 0 a 1."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls: Counter = Counter()
+        self.server = _Server(("127.0.0.1", 0), _Handler)
+        self.server.stub = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def address(self) -> str:
+        return "%s:%d" % self.server.server_address[:2]
+
+    def wait(self):
+        with self.lock:
+            jitter = self.rng.uniform(0.5, 1.5)
+        if self.latency:
+            time.sleep(self.latency * jitter)
+
+    def fail(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+    def count(self, key: str):
+        with self.lock:
+            self.calls[key] += 1
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, req: BaseHTTPRequestHandler) -> Tuple[int, Dict[str, str], bytes]:
+        raise NotImplementedError
+
+
+class RetailStub(Stub):
+    """Lojas e buscadores. page_kb é o tamanho das páginas de produto (o
+    <body> é completado como em bench_extract); ml_pages, quantas páginas de
+    ofertas o ML tem antes de vir uma vazia."""
+
+    def __init__(self, page_kb: int = 400, ml_pages: int = 5, csv_rows: int = 500, **kw):
+        super().__init__(**kw)
+        self.ml_pages = ml_pages
+        self.csv_rows = csv_rows
+        self.pages: Dict[str, bytes] = {}
+        target = page_kb * 1024
+        for f in FIXTURES.glob("*_produto.html"):
+            html = f.read_text(encoding="utf-8")
+            parts, i, size = [], 0, len(html)
+            while size < target:
+                parts.append(FILLER.format(i=i))
+                size += len(parts[-1])
+                i += 1
+            self.pages[f.stem.split("_")[0]] = html.replace("<!--BODY-->", "".join(parts)).encode("utf-8")
+
+    def handle(self, req):
+        parts = urllib.parse.urlsplit(req.path)
+        host = (req.headers.get("X-Stub-Host") or req.headers.get("Host") or "").split(":")[0].lower()
+        qs = dict(urllib.parse.parse_qsl(parts.query))
+        path = parts.path
+        html = {"Content-Type": "text/html; charset=utf-8"}
+        kind, status, headers, body = "404", 404, html, b"<html><body>404</body></html>"
+        if host.endswith("bing.com") and path == "/search":
+            kind, status, body = "serp_bing", 200, self.serp("bing", qs.get("q", "")).encode("utf-8")
+        elif host.endswith("duckduckgo.com") and path.startswith("/html"):
+            kind, status, body = "serp_ddg", 200, self.serp("ddg", qs.get("q", "")).encode("utf-8")
+        elif host.endswith("amazon.com.br") and path.startswith("/gp/bestsellers/"):
+            cat = path.split("/ref=")[0].strip("/").split("/")[2:3]
+            kind, status, body = "listagem", 200, self.bestsellers(cat[0] if cat else "", int(qs.get("pg") or 1))
+        elif host.endswith("amazon.com.br") and "/dp/" in path:
+            kind, status, body = "produto", 200, self.pages["amazon"]
+        elif host.endswith("mercadolivre.com.br") and path.startswith("/ofertas"):
+            kind, status, body = "listagem", 200, self.ofertas(qs.get("promotion_type", ""), int(qs.get("page") or 1))
+        elif host.endswith("mercadolivre.com.br") and "/p/MLB" in path:
+            kind, status, body = "produto", 200, self.pages["mercadolivre"]
+        elif host.endswith("kabum.com.br") and path.startswith("/produto/"):
+            kind, status, body = "produto", 200, self.pages["kabum"]
+        elif "amazon.com" in host and "/images/" in path or host.endswith("mlstatic.com"):
+            kind, status, body = "imagem", 206, PNG_1000
+            headers = {"Content-Type": "image/png", "Content-Range": f"bytes 0-{len(PNG_1000) - 1}/184320"}
+        elif host == "planilha.bench" and path == "/migrar.csv":
+            kind, status, body = "csv", 200, migrate_csv(self.csv_rows).encode("utf-8")
+            headers = {"Content-Type": "text/csv; charset=utf-8"}
+        self.count(f"{host} {kind}")
+        return status, headers, body
+
+    def serp(self, engine: str, q: str) -> str:
+        # o DDG devolve 30 resultados e repete os 10 primeiros do Bing
+        rows = []
+        for i in range(10 if engine == "bing" else 30):
+            url, title = product_url(q, i)
+            row = {"rank": i + 1, "title": title, "site": urllib.parse.urlsplit(url).netloc,
+                   "uddg": urllib.parse.quote(url, safe="")}
+            if engine == "bing" and i % 2:
+                b64 = base64.urlsafe_b64encode(url.encode("utf-8")).decode("ascii").rstrip("=")
+                row["href"] = f"https://www.bing.com/ck/a?!&amp;&amp;p={_h(url)}&amp;u=a1{b64}&amp;ntb=1"
+            else:
+                row["href"] = url
+            rows.append(row)
+        return render(f"{engine}_serp.html", rows, query=q, q=urllib.parse.quote_plus(q))
+
+    def bestsellers(self, cat: str, pg: int) -> bytes:
+        nav = [{"cat": c, "cat_title": t} for c, t in AMAZON_CATEGORIES.items()]
+        items = []
+        if cat in AMAZON_CATEGORIES and pg <= 2:
+            for n in range(30):
+                rank = (pg - 1) * 50 + n + 1
+                title = f"{PRODUCTS[(rank + len(cat)) % len(PRODUCTS)]} {_h(cat, rank, size=4).upper()}"
+                items.append({"n": rank - 1, "rank": rank, "cat": cat, "asin": "B0" + _h(cat, rank, size=8).upper(),
+                              "slug": re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-"), "title": title,
+                              "img": _h("img", cat, rank, size=11), "price": price(cat + str(rank))[0],
+                              "reviews": 100 + rank * 7})
+        return render("amazon_bestsellers.html", items, nav=nav, cat=cat,
+                      cat_title=AMAZON_CATEGORIES.get(cat, "Loja")).encode("utf-8")
+
+    def ofertas(self, promo: str, page: int) -> bytes:
+        items = []
+        if page <= self.ml_pages:
+            for n in range(48):
+                title = f"{PRODUCTS[(page * 48 + n) % len(PRODUCTS)]} {_h(promo, page, n, size=4).upper()}"
+                txt, v = price(f"{promo}{page}{n}")
+                items.append({"n": n, "rank": n + 1, "title": title,
+                              "slug": re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-"),
+                              "mlb": f"MLB{int(_h(promo, page, n, size=8), 16) % 10**8}",
+                              "img": f"{int(_h('img', page, n, size=6), 16)}-MLA{int(_h(promo, n, size=8), 16)}",
+                              "price": txt.split(",")[0], "cents": txt.split(",")[1],
+                              "old_price": f"{math.ceil(v * 1.25):,}".replace(",", "."), "old_cents": "90",
+                              "discount": 20})
+        return render("mercadolivre_ofertas.html", items, page=page, next=page + 1).encode("utf-8")
+
+
+def migrate_csv(rows: int) -> str:
+    """Planilha do migrate_wc: ~5% de nomes repetidos (vira atualização)."""
+    out = io.StringIO()
+    w = csv.writer(out)
+    w.writerow(["Name", "External URL", "Images", "Description", "Short description",
+                "Categories", "Tags", "Regular price", "Button text"])
+    cats = list(AMAZON_CATEGORIES.values())
+    for i in range(rows):
+        j = i - 1 if i % 20 == 19 else i
+        asin = "B0" + _h("csv", j, size=8).upper()
+        w.writerow([f"{PRODUCTS[j % len(PRODUCTS)]} {asin}",
+                    f"https://www.amazon.com.br/dp/{asin}?tag=ctctechstore-20",
+                    f"https://m.media-amazon.com/images/I/{_h('img', j, size=11)}._AC_SX342_.jpg",
+                    f"<p>{PRODUCTS[j % len(PRODUCTS)]} com entrega rápida.</p>", "",
+                    f"Ofertas > {cats[j % len(cats)]}", "oferta, amazon", f"{price(str(j))[1]:.2f}", "Comprar"])
+    return out.getvalue()
+
+
+def feed_csv(path: Path, rows: int) -> None:
+    """Feed do scripts/ingest.py (mesmas colunas de alimentar/produtos_woo_01.csv).
+    O código vem no começo do nome: o SKU do ingest usa só 40 caracteres do slug."""
+    cats = list(AMAZON_CATEGORIES.values())
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["merchant_domain", "affiliate_url", "name", "price", "old_price", "currency",
+                    "category", "tags", "image_url", "description", "source"])
+        for i in range(rows):
+            j = i - 1 if i % 20 == 19 else i
+            txt, v = price("feed" + str(j))
+            if j % 2:
+                mlb = f"MLB{int(_h('feed', j, size=8), 16) % 10**8}"
+                w.writerow(["mercadolivre.com.br", f"https://www.mercadolivre.com.br/p/{mlb}",
+                            f"{mlb} {PRODUCTS[j % len(PRODUCTS)]}", f"R$ {txt}", f"{v * 1.2:.2f}", "BRL",
+                            cats[j % len(cats)], "oferta", f"https://http2.mlstatic.com/D_NQ_NP_{j}-{mlb}-I.webp",
+                            "Oferta do dia no Mercado Livre.", "bench"])
+            else:
+                asin = "B0" + _h("feed", j, size=8).upper()
+                w.writerow(["amazon.com.br", f"https://www.amazon.com.br/dp/{asin}",
+                            f"{asin} {PRODUCTS[j % len(PRODUCTS)]}", f"{v:.2f}", "", "BRL",
+                            cats[j % len(cats)], "oferta, amazon",
+                            f"https://m.media-amazon.com/images/I/{_h('img', j, size=11)}._AC_UL300_.jpg",
+                            "Mais vendido da Amazon.", "bench"])
+
+
+class WooStub(Stub):
+    """WooCommerce REST v3 em memória. per_item é o custo extra (s) de cada
+    produto gravado, o que pesa nos lotes de /products/batch."""
+
+    def __init__(self, per_item: float = 0.0, **kw):
+        super().__init__(**kw)
+        self.per_item = per_item
+        self.products: Dict[int, Dict] = {}
+        self.terms: Dict[str, Dict[int, Dict]] = {"categories": {}, "tags": {}}
+        self.next_id = 1
+        self.data_lock = threading.Lock()
+
+    def reset(self):
+        super().reset()
+        with self.data_lock:
+            self.products.clear()
+            for t in self.terms.values():
+                t.clear()
+
+    @property
+    def written(self) -> int:
+        return self.calls["escritos"]
+
+    def _id(self) -> int:
+        self.next_id += 1
+        return self.next_id
+
+    def handle(self, req):
+        parts = urllib.parse.urlsplit(req.path)
+        path = parts.path.split("/wp-json/wc/v3", 1)[-1].rstrip("/")
+        qs = dict(urllib.parse.parse_qsl(parts.query))
+        self.count(f"{req.command} {re.sub(r'/[0-9]+', '/{id}', path)}")
+        body = json.loads(req.read_body() or b"null")
+        if path in ("/products/categories", "/products/tags"):
+            kind = path.rsplit("/", 1)[1]
+            if req.command == "GET":
+                return self.page(list(self.terms[kind].values()), qs)
+            return self.create_term(kind, body or {})
+        if path == "/products":
+            if req.command == "GET":
+                return self.list_products(qs)
+            status, item = self.save(None, body or {})
+            return self.json(status, item)
+        if path == "/products/batch":
+            out = {"create": [], "update": []}
+            for data in body.get("create") or []:
+                out["create"].append(self.save(None, data)[1])
+            for data in body.get("update") or []:
+                out["update"].append(self.save(data.get("id"), data)[1])
+            return self.json(200, out)
+        m = re.fullmatch(r"/products/([0-9]+)", path)
+        if m:
+            pid = int(m.group(1))
+            if req.command == "GET":
+                p = self.products.get(pid)
+                return self.json(200, p) if p else self.json(404, self.error("woocommerce_rest_product_invalid_id"))
+            status, item = self.save(pid, body or {})
+            return self.json(status, item)
+        return self.json(404, self.error("rest_no_route"))
+
+    @staticmethod
+    def error(code: str, **data) -> Dict:
+        return {"code": code, "message": code, "data": dict(data, status=400)}
+
+    @staticmethod
+    def json(status: int, data, headers: Optional[Dict[str, str]] = None):
+        return status, dict(headers or {}, **{"Content-Type": "application/json"}), json.dumps(data).encode("utf-8")
+
+    def page(self, items: List[Dict], qs: Dict[str, str]):
+        per = max(1, min(100, int(qs.get("per_page") or 10)))
+        n = max(1, int(qs.get("page") or 1))
+        fields = [f for f in (qs.get("_fields") or "").split(",") if f]
+        chunk = items[(n - 1) * per:n * per]
+        if fields:
+            chunk = [{f: it.get(f) for f in fields} for it in chunk]
+        return self.json(200, chunk, {"X-WP-Total": str(len(items)),
+                                      "X-WP-TotalPages": str(max(1, math.ceil(len(items) / per)))})
+
+    def list_products(self, qs: Dict[str, str]):
+        with self.data_lock:
+            items = list(self.products.values())
+        if qs.get("sku"):
+            skus = set(qs["sku"].split(","))
+            items = [p for p in items if p.get("sku") in skus]
+        if qs.get("search"):
+            s = qs["search"].lower()
+            items = [p for p in items if s in (p.get("name") or "").lower()]
+        return self.page(items, qs)
+
+    def save(self, pid: Optional[int], data: Dict) -> Tuple[int, Dict]:
+        if self.per_item:
+            time.sleep(self.per_item)
+        with self.data_lock:
+            if pid is None:
+                sku = data.get("sku")
+                if sku and any(p.get("sku") == sku for p in self.products.values()):
+                    return 400, {"id": 0, "error": self.error("product_invalid_sku")}
+                pid = self._id()
+                self.products[pid] = dict(data, id=pid)
+                status = 201
+            elif pid in self.products:
+                self.products[pid].update(data)
+                status = 200
+            else:
+                return 404, {"id": pid, "error": self.error("woocommerce_rest_product_invalid_id")}
+            item = dict(self.products[pid])
+        self.count("escritos")
+        return status, item
+
+    def create_term(self, kind: str, data: Dict):
+        name, parent = data.get("name") or "", data.get("parent") or 0
+        with self.data_lock:
+            for t in self.terms[kind].values():
+                if t["name"].lower() == name.lower() and t.get("parent", 0) == parent:
+                    return self.json(400, self.error("term_exists", resource_id=t["id"]))
+            tid = self._id()
+            term = self.terms[kind][tid] = {"id": tid, "name": name, "parent": parent,
+                                            "slug": re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")}
+        return self.json(201, term)
+
+
+def redirect(stub: str, log: list) -> None:
+    """Desvia para `stub` (host:porta) toda requisição do `requests` que não
+    seja para 127.0.0.1 e anota (host, segundos até os cabeçalhos) em `log`."""
+    from requests.adapters import HTTPAdapter
+    send = HTTPAdapter.send
+
+    def send_local(self, request, **kwargs):
+        url = request.url
+        parts = urllib.parse.urlsplit(url)
+        host = parts.hostname or ""
+        if host not in LOCAL:
+            request.headers["X-Stub-Host"] = parts.netloc
+            request.url = urllib.parse.urlunsplit(("http", stub, parts.path or "/", parts.query, ""))
+        t0 = time.perf_counter()
+        try:
+            r = send(self, request, **kwargs)
+        finally:
+            log.append((host, time.perf_counter() - t0))
+            request.url = url
+        r.url = url
+        return r
+
+    HTTPAdapter.send = send_local
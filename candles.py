@@ -0,0 +1,242 @@
+# candles.py - velas OHLCV em memória (buffers circulares NumPy) para os painéis
+import os, threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# as mesmas opções de "Vela/Tempo" do sinais.html e do automatico.html
+TIMEFRAMES: Dict[str, int] = {
+    "1m": 60, "3m": 180, "5m": 300, "15m": 900, "30m": 1800,
+    "1h": 3600, "2h": 7200, "4h": 14400, "1d": 86400,
+}
+CAPACITY = int(os.environ.get("CANDLE_CAPACITY", "300"))
+EXCHANGES = ("binance", "bybit", "okx")
+
+TS, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+COLUMNS = ("ts", "open", "high", "low", "close", "volume")
+
+Key = Tuple[str, str]                       # (corretora, ativo)
+OnClose = Callable[[str, str, str, "CandleRing"], None]
+
+
+class CandleRing:
+    """Últimas `capacity` velas de um ativo/tempo. Cada linha é gravada duas
+    vezes (posição i e i + capacity), então as N mais recentes são sempre uma
+    fatia contígua: latest(n) devolve uma view, sem cópia nem np.roll."""
+
+    __slots__ = ("capacity", "buf", "count", "pos")
+
+    def __init__(self, capacity: int = CAPACITY):
+        self.capacity = capacity
+        self.buf = np.zeros((2 * capacity, 6), dtype=np.float64)
+        self.count = 0      # velas já vistas (a mais nova inclusive)
+        self.pos = -1       # índice da mais nova em [0, capacity)
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def _write(self, row) -> None:
+        self.buf[self.pos] = row
+        self.buf[self.pos + self.capacity] = row
+
+    @property
+    def last(self) -> Optional[np.ndarray]:
+        return self.buf[self.pos] if self.count else None
+
+    def latest(self, n: int) -> np.ndarray:
+        """Até n velas, da mais antiga para a mais nova (a última pode estar
+        em formação). View somente leitura: copie se for guardar."""
+        n = min(n, len(self))
+        end = self.pos + self.capacity + 1
+        view = self.buf[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def column(self, col: int, n: int) -> np.ndarray:
+        return self.latest(n)[:, col]
+
+    def merge(self, bucket: float, o: float, h: float, l: float, c: float, v: float) -> bool:
+        """Soma uma vela (ou negócio) ao bucket; devolve True quando isso
+        abriu um bucket novo, ou seja, a vela anterior fechou."""
+        if self.count and bucket == self.buf[self.pos, TS]:
+            r = self.buf[self.pos]
+            r[HIGH] = max(r[HIGH], h)
+            r[LOW] = min(r[LOW], l)
+            r[CLOSE] = c
+            r[VOLUME] += v
+            self.buf[self.pos + self.capacity] = r
+            return False
+        if self.count and bucket < self.buf[self.pos, TS]:
+            return False    # fora de ordem: o histórico não é refeito
+        self.pos = (self.pos + 1) % self.capacity
+        self.count += 1
+        self._write((bucket, o, h, l, c, v))
+        return self.count > 1
+
+    def replace(self, bucket: float, o: float, h: float, l: float, c: float, v: float) -> bool:
+        # kline ainda aberta reenviada pela corretora: substitui em vez de somar
+        if self.count and bucket == self.buf[self.pos, TS]:
+            self._write((bucket, o, h, l, c, v))
+            return False
+        return self.merge(bucket, o, h, l, c, v)
+
+    def load(self, bars: np.ndarray) -> None:
+        tail = bars[-self.capacity:]
+        n = len(tail)
+        self.buf[:n] = tail
+        self.buf[self.capacity:self.capacity + n] = tail
+        self.count, self.pos = n, n - 1
+
+
+class CandleEngine:
+    """Velas de 1m (ou negócios) entram uma vez e cada tempo gráfico é
+    atualizado no próprio bucket, sem recalcular o histórico. Uma kline de 1m
+    ainda aberta (final=False) só chega aos tempos maiores quando fecha, para
+    não somar o volume duas vezes. Listeners de `on_close` recebem cada vela
+    fechada (é o gancho do motor de sinais)."""
+
+    def __init__(self, timeframes: Iterable[str] = TIMEFRAMES, capacity: int = CAPACITY,
+                 capacities: Optional[Dict[str, int]] = None):
+        self.timeframes: List[Tuple[str, int]] = [(tf, TIMEFRAMES[tf]) for tf in timeframes]
+        self.capacity = capacity
+        self.capacities = capacities or {}
+        self.rings: Dict[Key, Dict[str, CandleRing]] = {}
+        self.pending: Dict[Key, tuple] = {}
+        self.committed: Dict[Key, float] = {}
+        self.listeners: List[OnClose] = []
+        self.lock = threading.Lock()
+
+    def on_close(self, fn: OnClose) -> OnClose:
+        self.listeners.append(fn)
+        return fn
+
+    def _rings(self, key: Key) -> Dict[str, CandleRing]:
+        rings = self.rings.get(key)
+        if rings is None:
+            rings = self.rings[key] = {tf: CandleRing(self.capacities.get(tf, self.capacity))
+                                       for tf, _ in self.timeframes}
+        return rings
+
+    def series(self, exchange: str, symbol: str, tf: str) -> CandleRing:
+        with self.lock:
+            return self._rings((exchange.lower(), symbol.upper()))[tf]
+
+    def latest(self, exchange: str, symbol: str, tf: str, n: int) -> np.ndarray:
+        return self.series(exchange, symbol, tf).latest(n)
+
+    def keys(self) -> List[Key]:
+        return list(self.rings)
+
+    def _emit(self, key: Key, closed: List[str], rings: Dict[str, CandleRing]) -> None:
+        for tf in closed:
+            for fn in self.listeners:
+                fn(key[0], key[1], tf, rings[tf])
+
+    def _roll(self, key: Key, rings: Dict[str, CandleRing], ts: float, bar, skip_base: bool) -> List[str]:
+        closed = []
+        for tf, secs in self.timeframes:
+            if skip_base and secs == 60:
+                continue
+            if rings[tf].merge(ts - ts % secs, *bar):
+                closed.append(tf)
+        return closed
+
+    def _commit(self, key: Key, rings: Dict[str, CandleRing], ts: float, bar) -> List[str]:
+        # cada minuto entra uma vez nos tempos maiores, mesmo se reenviado
+        if ts <= self.committed.get(key, -1):
+            return []
+        self.committed[key] = ts
+        return self._roll(key, rings, ts, bar, True)
+
+    def add_trade(self, exchange: str, symbol: str, ts: float, price: float, qty: float) -> None:
+        key = (exchange.lower(), symbol.upper())
+        with self.lock:
+            rings = self._rings(key)
+            closed = self._roll(key, rings, ts, (price, price, price, price, qty), False)
+        self._emit(key, closed, rings)
+
+    def add_bar(self, exchange: str, symbol: str, ts: float, o: float, h: float, l: float,
+                c: float, v: float, final: bool = True) -> None:
+        """Vela de 1m que começa em `ts` (segundos epoch)."""
+        key = (exchange.lower(), symbol.upper())
+        ts = ts - ts % 60
+        closed: List[str] = []
+        with self.lock:
+            rings = self._rings(key)
+            base = rings.get("1m")
+            pend = self.pending.pop(key, None)
+            if pend and pend[0] != ts:
+                closed += self._commit(key, rings, *pend)
+            bar = (o, h, l, c, v)
+            if base is not None and base.replace(ts, *bar):
+                closed.append("1m")
+            if final:
+                closed += self._commit(key, rings, ts, bar)
+            else:
+                self.pending[key] = (ts, bar)
+        self._emit(key, closed, rings)
+
+    def load(self, exchange: str, symbol: str, bars_1m: np.ndarray) -> None:
+        """Carga em lote (histórico, replay rápido): cada tempo é agregado
+        de uma vez com reduceat, sem passar vela a vela."""
+        key = (exchange.lower(), symbol.upper())
+        with self.lock:
+            rings = self._rings(key)
+            for tf, secs in self.timeframes:
+                rings[tf].load(resample(bars_1m, secs))
+
+    def memory_bytes(self) -> int:
+        return sum(r.buf.nbytes for rings in self.rings.values() for r in rings.values())
+
+
+def resample(bars: np.ndarray, secs: int) -> np.ndarray:
+    """Agrega velas ordenadas (colunas COLUMNS) em buckets de `secs`."""
+    if not len(bars) or secs == 60:
+        return bars
+    buckets = bars[:, TS] - bars[:, TS] % secs
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(bars)] - 1
+    out = np.empty((len(starts), 6), dtype=np.float64)
+    out[:, TS] = buckets[starts]
+    out[:, OPEN] = bars[starts, OPEN]
+    out[:, HIGH] = np.maximum.reduceat(bars[:, HIGH], starts)
+    out[:, LOW] = np.minimum.reduceat(bars[:, LOW], starts)
+    out[:, CLOSE] = bars[ends, CLOSE]
+    out[:, VOLUME] = np.add.reduceat(bars[:, VOLUME], starts)
+    return out
+
+
+def read_bars(path: str) -> np.ndarray:
+    """CSV ou Parquet com ts (s, ms ou data) + open/high/low/close/volume,
+    ou .npy já no formato do motor -> array (n, 6) ordenado, ts em segundos."""
+    if path.endswith(".npy"):
+        # formato nativo do motor: array (n, 6) já em COLUMNS
+        bars = np.load(path)
+        return bars[np.argsort(bars[:, TS], kind="stable")]
+    import pandas as pd
+
+    df = pd.read_parquet(path) if path.endswith((".parquet", ".pq")) else pd.read_csv(path)
+    df.columns = [c.strip().lower() for c in df.columns]
+    for alias in ("timestamp", "time", "open_time", "date"):
+        if "ts" not in df.columns and alias in df.columns:
+            df = df.rename(columns={alias: "ts"})
+    ts = df["ts"]
+    if not np.issubdtype(ts.dtype, np.number):
+        ts = pd.to_datetime(ts, utc=True).astype("int64") // 10**9
+    elif ts.max() > 1e11:
+        ts = ts // 1000
+    bars = np.column_stack([ts.to_numpy(dtype=np.float64)] +
+                           [df[c].to_numpy(dtype=np.float64) for c in COLUMNS[1:]])
+    return bars[np.argsort(bars[:, TS], kind="stable")]
+
+
+def replay(engine: CandleEngine, path: str, exchange: str, symbol: str, bulk: bool = False) -> int:
+    """Reproduz um arquivo de velas de 1m. bulk=True carrega de uma vez;
+    senão passa vela a vela por add_bar (dispara on_close como ao vivo)."""
+    bars = read_bars(path)
+    if bulk:
+        engine.load(exchange, symbol, bars)
+        return len(bars)
+    for row in bars:
+        engine.add_bar(exchange, symbol, *row)
+    return len(bars)
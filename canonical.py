@@ -0,0 +1,146 @@
+# canonical.py - chave estável de produto por loja + índice do que já foi visto
+import os, re, math, time, hashlib, sqlite3, threading, urllib.parse
+from typing import Optional, Tuple
+
+from http_cache import canonical_url as strip_tracking
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SEEN_PATH = os.environ.get("SEEN_INDEX_PATH") or os.path.join(BASE_DIR, ".cache", "seen", "produtos.sqlite3")
+
+# (sufixo do host, regex sobre o path, chave, URL canônica)
+RULES = [
+    ("mercadolivre.com.br", re.compile(r"/p/MLB(\d+)", re.I), "ML:MLB{0}",
+     "https://www.mercadolivre.com.br/p/MLB{0}"),
+    ("mercadolivre.com.br", re.compile(r"\bMLB-?(\d{6,})", re.I), "ML:MLB-{0}",
+     "https://produto.mercadolivre.com.br/MLB-{0}"),
+    ("amazon.com.br", re.compile(r"/(?:dp|gp/product|gp/aw/d|exec/obidos/ASIN)/([A-Z0-9]{10})(?=[/?]|$)", re.I),
+     "AMZN:{0}", "https://www.amazon.com.br/dp/{0}"),
+    ("shopee.com.br", re.compile(r"-i\.(\d+)\.(\d+)|/product/(\d+)/(\d+)"), "SHOPEE:{0}.{1}",
+     "https://shopee.com.br/product/{0}/{1}"),
+    ("kabum.com.br", re.compile(r"/produto/(\d+)"), "KABUM:{0}", "https://www.kabum.com.br/produto/{0}"),
+    ("magazineluiza.com.br", re.compile(r"/p/([a-z0-9]{6,})(?=/|$)", re.I), "MAGALU:{0}",
+     "https://www.magazineluiza.com.br/p/{0}/"),
+]
+KEY_PREFIXES = {"ML", "AMZN", "SHOPEE", "KABUM", "MAGALU", "URL"}
+
+# segmentos de sessão/rastreio que a Amazon pendura no path
+AMAZON_NOISE = re.compile(r"/(?:ref=[^/]*|\d{3}-\d{7}-\d{7})(?=/|$)")
+
+
+def _match(url: str) -> Optional[Tuple[str, str]]:
+    u = urllib.parse.urlsplit(url.strip())
+    host = (u.hostname or "").lower()
+    for suffix, rx, key_fmt, url_fmt in RULES:
+        if not (host == suffix or host.endswith("." + suffix)):
+            continue
+        m = rx.search(u.path)
+        if m:
+            groups = [g for g in m.groups() if g is not None]
+            if key_fmt.startswith("AMZN"):
+                groups = [g.upper() for g in groups]
+            return key_fmt.format(*groups), url_fmt.format(*groups)
+    return None
+
+
+def is_key(s: str) -> bool:
+    return s.split(":", 1)[0] in KEY_PREFIXES and not s.startswith(("http:", "https:"))
+
+
+def product_key(url: str) -> str:
+    """'ML:MLB36772633', 'AMZN:B0DQQCGG3Q', 'SHOPEE:123.456', 'KABUM:378061'...
+    URLs fora das regras caem na URL sem rastreio ('URL:https://...')."""
+    hit = _match(url)
+    return hit[0] if hit else "URL:" + canonical_url(url)
+
+
+def canonical_url(url: str) -> str:
+    hit = _match(url)
+    if hit:
+        return hit[1]
+    clean = strip_tracking(url)
+    if "amazon." in clean:
+        parts = urllib.parse.urlsplit(clean)
+        clean = urllib.parse.urlunsplit(parts._replace(path=AMAZON_NOISE.sub("", parts.path) or "/"))
+    return clean
+
+
+def sku_for(url: str, size: int = 32) -> str:
+    return hashlib.md5(product_key(url).encode("utf-8")).hexdigest()[:size]
+
+
+class BloomFilter:
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.01, data: Optional[bytes] = None):
+        self.bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.array = bytearray(data) if data and len(data) == (self.bits + 7) // 8 else bytearray((self.bits + 7) // 8)
+
+    def _positions(self, key: str):
+        d = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(d[:8], "little"), int.from_bytes(d[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for p in self._positions(key):
+            self.array[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.array[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+
+class SeenIndex:
+    """Chaves de produto já processadas: um Bloom filter em memória responde
+    "nunca visto" sem I/O e o SQLite confirma os positivos. Crawlers e
+    importadores consultam antes de buscar ou enviar."""
+
+    def __init__(self, path: str = SEEN_PATH, capacity: int = 1_000_000):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.bloom_path = path + ".bloom"
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS vistos (key TEXT PRIMARY KEY, source TEXT, first_seen REAL)")
+        # o .bloom guarda quantas chaves cobria; se o SQLite tiver outra
+        # contagem (queda antes do save), o filtro é refeito a partir dele
+        data, count = None, -1
+        if os.path.exists(self.bloom_path):
+            with open(self.bloom_path, "rb") as f:
+                count = int.from_bytes(f.read(8), "little")
+                data = f.read()
+        self.bloom = BloomFilter(capacity, data=data)
+        self.count = self.db.execute("SELECT COUNT(*) FROM vistos").fetchone()[0]
+        if count != self.count or len(data or b"") != len(self.bloom.array):
+            self.bloom = BloomFilter(capacity)
+            for (k,) in self.db.execute("SELECT key FROM vistos"):
+                self.bloom.add(k)
+        self.dirty = False
+
+    def __contains__(self, url_or_key: str) -> bool:
+        key = url_or_key if is_key(url_or_key) else product_key(url_or_key)
+        if key not in self.bloom:
+            return False
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM vistos WHERE key = ?", (key,)).fetchone() is not None
+
+    def add(self, url_or_key: str, source: str = "") -> bool:
+        """Registra a chave; devolve False se ela já existia."""
+        key = url_or_key if is_key(url_or_key) else product_key(url_or_key)
+        with self.lock:
+            cur = self.db.execute("INSERT OR IGNORE INTO vistos VALUES (?,?,?)", (key, source, time.time()))
+            if cur.rowcount != 1:
+                return False
+            self.bloom.add(key)
+            self.count += 1
+            self.dirty = True
+            return True
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        with self.lock:
+            tmp = self.bloom_path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(self.count.to_bytes(8, "little"))
+                f.write(self.bloom.array)
+            os.replace(tmp, self.bloom_path)
+            self.dirty = False
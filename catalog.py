@@ -0,0 +1,402 @@
+# catalog.py - catálogo local de produtos (SQLite WAL + índice FTS5)
+#
+# Uma linha por produto (chave de canonical.product_key), com índices por
+# loja, categoria e preço, busca textual em nome/descrição e o registro do que
+# já foi postado em cada loja. Os crawlers gravam em lote (upsert), os
+# importadores e a fila de postagem leem por cursor, e os CSV/JSON antigos
+# viram exportações geradas sob demanda.
+#
+#   python catalog.py importar alimenta/produtos_woo_01.csv alimentar/produtos_novos.jsonl
+#   python catalog.py buscar --categoria kitchen --max-preco 100 --nao-postado LOJA_NOVA
+#   python catalog.py exportar csv alimenta/produtos_woo_01.csv --loja amazon
+#   python catalog.py status
+import os, csv, sys, json, time, sqlite3, argparse, threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import metrics
+from canonical import canonical_url, is_key, product_key
+from fetcher import host_key
+from price import parse_amount
+from price_history import merchant_of
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CATALOG_PATH = os.environ.get("CATALOG_PATH") or os.path.join(BASE_DIR, ".cache", "catalogo", "catalogo.sqlite3")
+LOG_PATH = os.path.join(BASE_DIR, "inteligencia_links", "LOG_POSTAGEM.txt")
+
+FETCH_SIZE = 500
+PLACEHOLDER_NAMES = {"produto oferta", "oferta", "produto", "sem nome"}
+
+# colunas do feed do WooCommerce (scripts/ingest.py) e da lista de postagem
+WOO_FIELDS = ("merchant_domain", "affiliate_url", "name", "price", "old_price", "currency",
+              "category", "tags", "image_url", "description", "source")
+LIST_FIELDS = ("merchant_domain", "affiliate_url", "name", "price", "image_url")
+
+COLUMNS = ("key", "url", "affiliate_url", "merchant", "merchant_domain", "name", "description",
+           "price", "old_price", "currency", "category", "tags", "image_url", "source", "extra")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS produtos (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,              -- URL canônica
+    affiliate_url TEXT NOT NULL,
+    merchant TEXT NOT NULL,         -- amzn, ml, shopee, ... (price_history.merchant_of)
+    merchant_domain TEXT,
+    name TEXT,
+    description TEXT,
+    price REAL,                     -- NULL = sem preço ("Oferta")
+    old_price REAL,
+    currency TEXT,
+    category TEXT COLLATE NOCASE,
+    tags TEXT,
+    image_url TEXT,
+    source TEXT,
+    extra TEXT,                     -- JSON com os campos que não têm coluna
+    first_seen REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS produtos_merchant ON produtos (merchant, price);
+CREATE INDEX IF NOT EXISTS produtos_category ON produtos (category, price);
+CREATE INDEX IF NOT EXISTS produtos_updated ON produtos (updated_at);
+CREATE TABLE IF NOT EXISTS postagens (
+    key TEXT NOT NULL,
+    loja TEXT NOT NULL,
+    ts REAL NOT NULL,
+    PRIMARY KEY (key, loja)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS produtos_fts USING fts5(
+    name, description, content='produtos', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2');
+CREATE TRIGGER IF NOT EXISTS produtos_ai AFTER INSERT ON produtos BEGIN
+    INSERT INTO produtos_fts (rowid, name, description) VALUES (new.rowid, new.name, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS produtos_ad AFTER DELETE ON produtos BEGIN
+    INSERT INTO produtos_fts (produtos_fts, rowid, name, description)
+    VALUES ('delete', old.rowid, old.name, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS produtos_au AFTER UPDATE OF name, description ON produtos BEGIN
+    INSERT INTO produtos_fts (produtos_fts, rowid, name, description)
+    VALUES ('delete', old.rowid, old.name, old.description);
+    INSERT INTO produtos_fts (rowid, name, description) VALUES (new.rowid, new.name, new.description);
+END;
+"""
+
+# campo vazio no registro novo não apaga o que já se sabia do produto
+_UPSERT = (
+    "INSERT INTO produtos ({cols}, first_seen, updated_at) VALUES ({marks}, ?, ?) "
+    "ON CONFLICT(key) DO UPDATE SET {sets}, updated_at = excluded.updated_at".format(
+        cols=", ".join(COLUMNS), marks=", ".join("?" * len(COLUMNS)),
+        sets=", ".join(f"{c} = COALESCE(NULLIF(excluded.{c}, ''), {c})" for c in COLUMNS[1:])))
+
+
+def _clean(v) -> str:
+    return " ".join(str(v).split()) if v is not None else ""
+
+
+def normalize(rec: Dict, source: str = "") -> Optional[Tuple]:
+    """Registro solto (CSV do Woo, JSON da lista, ProductSink, merchants) ->
+    linha da tabela, ou None se não tem URL."""
+    url = rec.get("url") or rec.get("affiliate_url") or ""
+    aff = rec.get("affiliate_url") or url
+    if not url.startswith("http"):
+        return None
+    key = rec.get("key") or product_key(url)
+    name = _clean(rec.get("name"))
+    if name.startswith("http") or name.lower() in PLACEHOLDER_NAMES:
+        name = ""       # feeds antigos repetem a URL (ou um rótulo fixo) na coluna do nome
+    price = parse_amount(rec.get("price"), 0.0) if rec.get("price") not in (None, "") else 0.0
+    old = parse_amount(rec.get("old_price"), 0.0) if rec.get("old_price") not in (None, "") else 0.0
+    domain = rec.get("merchant_domain") or ""
+    if "." not in domain:       # "Afiliado" nos feeds antigos
+        domain = host_key(canonical_url(url))
+    extra = {k: v for k, v in rec.items() if k not in COLUMNS and k not in ("ts",) and v not in (None, "")}
+    return (key, canonical_url(url), aff, merchant_of(key), domain, name, _clean(rec.get("description")),
+            price or None, old or None, rec.get("currency") or "BRL", _clean(rec.get("category")),
+            _clean(rec.get("tags")), rec.get("image_url") or "", rec.get("source") or source,
+            json.dumps(extra, ensure_ascii=False) if extra else "")
+
+
+def _fts_query(text: str) -> str:
+    # cada palavra vira um termo entre aspas (a última como prefixo): sem
+    # sintaxe FTS vinda do usuário
+    words = [w.replace('"', '""') for w in text.split()]
+    return " ".join(f'"{w}"' for w in words[:-1]) + (f' "{words[-1]}"*' if words else "")
+
+
+class Catalog:
+    """Loja local de produtos. Thread-safe (uma conexão, um lock); leituras
+    longas usam uma conexão própria para não segurar as escritas."""
+
+    def __init__(self, path: str = CATALOG_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = self._connect()
+        self.db.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM produtos").fetchone()[0]
+
+    def __contains__(self, url_or_key: str) -> bool:
+        key = url_or_key if is_key(url_or_key) else product_key(url_or_key)
+        return self.db.execute("SELECT 1 FROM produtos WHERE key = ?", (key,)).fetchone() is not None
+
+    # ---------- escrita ----------
+    def upsert(self, records: Iterable[Dict], source: str = "", chunk: int = 1000) -> Dict[str, int]:
+        """Grava em transações de `chunk` linhas. Produto já conhecido é
+        atualizado campo a campo (vazio não sobrescreve)."""
+        stats = {"novos": 0, "atualizados": 0, "ignorados": 0}
+        rows: List[Tuple] = []
+
+        def flush():
+            now = time.time()
+            with metrics.timed("catalog_upsert"), self.lock:
+                self.db.execute("BEGIN")
+                try:
+                    known = {r[0] for r in self.db.execute(
+                        f"SELECT key FROM produtos WHERE key IN ({','.join('?' * len(rows))})", [r[0] for r in rows])}
+                    self.db.executemany(_UPSERT, [r + (now, now) for r in rows])
+                    self.db.execute("COMMIT")
+                except Exception:
+                    self.db.execute("ROLLBACK")
+                    raise
+            fresh = len({r[0] for r in rows} - known)
+            stats["novos"] += fresh
+            stats["atualizados"] += len(rows) - fresh
+            rows.clear()
+
+        for rec in records:
+            row = normalize(rec, source)
+            if row is None:
+                stats["ignorados"] += 1
+                continue
+            rows.append(row)
+            if len(rows) >= chunk:
+                flush()
+        if rows:
+            flush()
+        return stats
+
+    def mark_posted(self, keys: Iterable[str], loja: str, ts: Optional[float] = None) -> int:
+        now = time.time() if ts is None else ts
+        with self.lock:
+            cur = self.db.executemany("INSERT OR IGNORE INTO postagens VALUES (?,?,?)",
+                                      [(k, loja, now) for k in keys])
+            return cur.rowcount
+
+    def import_log(self, path: str = LOG_PATH) -> int:
+        """Postagens do LOG_POSTAGEM.txt (linhas "ts\\tloja\\tchave\\turl")."""
+        if not os.path.exists(path):
+            return 0
+        rows = []
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) >= 3:
+                    try:
+                        ts = time.mktime(time.strptime(parts[0], "%Y-%m-%dT%H:%M:%S"))
+                    except ValueError:
+                        continue
+                    rows.append((parts[2], parts[1], ts))
+        with self.lock:
+            cur = self.db.executemany("INSERT OR IGNORE INTO postagens VALUES (?,?,?)", rows)
+            return cur.rowcount
+
+    def import_file(self, path: str) -> Dict[str, int]:
+        """CSV (feed do Woo), JSON (lista) ou JSONL (ProductSink)."""
+        source = os.path.basename(path)
+        if path.endswith(".csv"):
+            with open(path, newline="", encoding="utf-8") as f:
+                return self.upsert(csv.DictReader(f), source)
+        if path.endswith(".jsonl"):
+            from product_sink import iter_jsonl
+            return self.upsert(iter_jsonl(path), source)
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return self.upsert((r for r in data if isinstance(r, dict)), source)
+
+    # ---------- leitura ----------
+    def _where(self, category: Optional[str], merchant: Optional[str], min_price: Optional[float],
+               max_price: Optional[float], text: Optional[str], not_posted: Optional[str],
+               since: Optional[float]) -> Tuple[str, list]:
+        conds, args = [], []
+        if category and category.endswith("*"):
+            # prefixo: "Eletrônicos*" pega "Eletrônicos > Celulares" (ainda pelo índice, NOCASE)
+            conds.append("p.category LIKE ? ESCAPE '\\'")
+            args.append(category[:-1].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        elif category:
+            conds.append("p.category = ?")
+            args.append(category)
+        if merchant:
+            conds.append("p.merchant = ?")
+            args.append(merchant.lower())
+        if min_price is not None:
+            conds.append("p.price >= ?")
+            args.append(min_price)
+        if max_price is not None:
+            conds.append("p.price <= ?")
+            args.append(max_price)
+        if text:
+            conds.append("p.rowid IN (SELECT rowid FROM produtos_fts WHERE produtos_fts MATCH ?)")
+            args.append(_fts_query(text))
+        if not_posted:
+            conds.append("NOT EXISTS (SELECT 1 FROM postagens s WHERE s.key = p.key AND s.loja = ?)")
+            args.append(not_posted)
+        if since is not None:
+            conds.append("p.updated_at >= ?")
+            args.append(since)
+        return (" WHERE " + " AND ".join(conds)) if conds else "", args
+
+    def query(self, category: Optional[str] = None, merchant: Optional[str] = None,
+              min_price: Optional[float] = None, max_price: Optional[float] = None,
+              text: Optional[str] = None, not_posted: Optional[str] = None, since: Optional[float] = None,
+              order: str = "price", limit: Optional[int] = None) -> Iterator[Dict]:
+        """Produtos que passam em todos os filtros, lidos por cursor (FETCH_SIZE
+        por vez). order: price | recent | name."""
+        where, args = self._where(category, merchant, min_price, max_price, text, not_posted, since)
+        # com filtro de preço não há NULL: ordenar só por price deixa o índice
+        # (category|merchant, price) entregar já ordenado e o LIMIT parar cedo
+        priced = min_price is not None or max_price is not None
+        order_by = {"price": "p.price" if priced else "p.price IS NULL, p.price",
+                    "recent": "p.updated_at DESC", "name": "p.name"}[order]
+        sql = f"SELECT p.* FROM produtos p{where} ORDER BY {order_by}"
+        if limit:
+            sql += " LIMIT ?"
+            args.append(limit)
+        db = self._connect()
+        try:
+            cur = db.execute(sql, args)
+            while True:
+                rows = cur.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                for r in rows:
+                    rec = dict(r)
+                    extra = rec.pop("extra")
+                    if extra:
+                        rec.update({k: v for k, v in json.loads(extra).items() if k not in rec})
+                    yield rec
+        finally:
+            db.close()
+
+    def count(self, **filters) -> int:
+        where, args = self._where(*(filters.get(k) for k in (
+            "category", "merchant", "min_price", "max_price", "text", "not_posted", "since")))
+        return self.db.execute(f"SELECT COUNT(*) FROM produtos p{where}", args).fetchone()[0]
+
+    def get(self, url_or_key: str) -> Optional[Dict]:
+        key = url_or_key if is_key(url_or_key) else product_key(url_or_key)
+        r = self.db.execute("SELECT * FROM produtos WHERE key = ?", (key,)).fetchone()
+        return dict(r) if r else None
+
+    def summary(self) -> Dict:
+        return {
+            "produtos": len(self),
+            "por_loja": dict(self.db.execute("SELECT merchant, COUNT(*) FROM produtos GROUP BY merchant").fetchall()),
+            "postagens": dict(self.db.execute("SELECT loja, COUNT(*) FROM postagens GROUP BY loja").fetchall()),
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
+
+
+# ---------- exportações (formatos antigos) ----------
+
+def _export_value(rec: Dict, field: str):
+    v = rec.get(field)
+    if field in ("price", "old_price"):
+        return f"{v:.2f}" if v else ""
+    return v if v is not None else ""
+
+
+def export_csv(cat: Catalog, path: str, fields: Sequence[str] = WOO_FIELDS, **filters) -> int:
+    """Feed no formato de alimenta/produtos_woo_01.csv (troca atômica)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp, n = path + ".tmp", 0
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(fields)
+        for rec in cat.query(**filters):
+            w.writerow([_export_value(rec, k) for k in fields])
+            n += 1
+    os.replace(tmp, path)
+    return n
+
+
+def export_json(cat: Catalog, path: str, fields: Sequence[str] = LIST_FIELDS, **filters) -> int:
+    """Lista no formato de PROCESSAR_AGORA.json / LISTA_FINAL_POSTAGEM.json,
+    escrita item a item."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp, n = path + ".tmp", 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("[")
+        for rec in cat.query(**filters):
+            row = {k: rec.get(k) for k in fields}
+            if "price" in row:
+                row["price"] = row["price"] or "Oferta"
+            f.write(("," if n else "") + "\n    " + json.dumps(row, ensure_ascii=False))
+            n += 1
+        f.write("\n]\n")
+    os.replace(tmp, path)
+    return n
+
+
+def _filters(args) -> Dict:
+    return {"category": args.categoria, "merchant": args.loja, "min_price": args.min_preco,
+            "max_price": args.max_preco, "text": args.texto, "not_posted": args.nao_postado}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Catálogo local de produtos.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("importar")
+    imp.add_argument("arquivos", nargs="*", help="CSV, JSON ou JSONL (padrão: os feeds conhecidos)")
+    b = sub.add_parser("buscar")
+    e = sub.add_parser("exportar")
+    e.add_argument("formato", choices=("csv", "json"))
+    e.add_argument("destino")
+    for p in (b, e):
+        p.add_argument("--categoria", help="exata; com * no fim, prefixo (\"Eletrônicos*\")")
+        p.add_argument("--loja", help="amzn, ml, shopee, kabum, magalu...")
+        p.add_argument("--min-preco", type=float)
+        p.add_argument("--max-preco", type=float)
+        p.add_argument("--texto")
+        p.add_argument("--nao-postado", metavar="LOJA", help="só o que ainda não foi postado nesta loja")
+        p.add_argument("--limite", type=int)
+    sub.add_parser("status")
+    args = ap.parse_args()
+
+    cat = Catalog()
+    t0 = time.time()
+    if args.cmd == "importar":
+        paths = args.arquivos or [os.path.join(BASE_DIR, p) for p in (
+            "alimenta/produtos_woo_01.csv", "alimentar/produtos_woo_01.csv", "alimentar/produtos_novos.json",
+            "alimentar/produtos_novos.jsonl", "inteligencia_links/PROCESSAR_AGORA.json",
+            "inteligencia_links/LISTA_FINAL_POSTAGEM.json")]
+        out = {p: cat.import_file(p) for p in paths if os.path.exists(p)}
+        out["postagens"] = cat.import_log()
+        print(json.dumps(out, ensure_ascii=False, indent=2))
+    elif args.cmd == "buscar":
+        n = 0
+        for rec in cat.query(**_filters(args), limit=args.limite):
+            print(json.dumps({k: rec.get(k) for k in ("key", "name", "price", "category", "affiliate_url")},
+                             ensure_ascii=False))
+            n += 1
+        print(json.dumps({"resultados": n, "ms": round((time.time() - t0) * 1000, 1)}), file=sys.stderr)
+    elif args.cmd == "exportar":
+        fn = export_csv if args.formato == "csv" else export_json
+        n = fn(cat, args.destino, **_filters(args), limit=args.limite)
+        print(json.dumps({"exportados": n, "destino": args.destino}, ensure_ascii=False))
+    else:
+        print(json.dumps(cat.summary(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# crawl_frontier.py - fronteira de crawl persistente (SQLite) para jobs com tempo contado
+#
+# Cada item é uma busca (consulta, buscador, página) ou uma URL (com a
+# profundidade em que foi achada), com prioridade, última visita e intervalo
+# de revisita. Quem roda pega um lote "arrendado" (lease) por alguns minutos;
+# cada resultado é gravado na hora, então um job morto pelo timeout perde no
+# máximo o lote em andamento e o próximo continua de onde esse parou.
+import os, json, time, sqlite3, threading
+from typing import Dict, List, NamedTuple, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FRONTIER_PATH = os.environ.get("CRAWL_FRONTIER_PATH") or os.path.join(BASE_DIR, ".cache", "crawl", "fronteira.sqlite3")
+
+LEASE_S = 30 * 60           # item pego e não devolvido volta para a fila depois disso
+MAX_BACKOFF_S = 24 * 3600
+DONE = None                 # intervalo "nunca revisitar"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fronteira (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,             -- 'serp' | 'page'
+    data TEXT NOT NULL,             -- JSON: {query, engine, page, ...} ou {url, ...}
+    depth INTEGER NOT NULL DEFAULT 0,
+    priority REAL NOT NULL,
+    interval REAL,                  -- revisita (s); NULL = terminal
+    next_due REAL,                  -- NULL = terminal
+    last_visit REAL,
+    fails INTEGER NOT NULL DEFAULT 0,
+    visits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS fronteira_due ON fronteira (next_due, priority);
+"""
+
+
+class Item(NamedTuple):
+    id: str
+    kind: str
+    data: Dict
+    depth: int
+    priority: float
+    interval: Optional[float]
+
+
+def serp_id(engine: str, query: str, page: int, scope: str = "primary") -> str:
+    return f"serp:{engine}:{scope}:{page}:{query}"
+
+
+class Frontier:
+    """Fila de prioridade persistente. `lease` devolve os itens vencidos de
+    maior prioridade e os marca como em uso; `done`/`fail` reagendam."""
+
+    def __init__(self, path: str = FRONTIER_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        self.stats = {"novos": 0, "visitados": 0, "falhas": 0}
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM fronteira WHERE next_due IS NOT NULL").fetchone()[0]
+
+    def push(self, id: str, kind: str, data: Dict, priority: float, depth: int = 0,
+             interval: Optional[float] = DONE, due: Optional[float] = None) -> bool:
+        """Agenda um item novo. Se já existe, só sobe a prioridade (nunca
+        reagenda nem ressuscita item terminal). Devolve True se era novo."""
+        with self.lock:
+            cur = self.db.execute(
+                "INSERT OR IGNORE INTO fronteira (id, kind, data, depth, priority, interval, next_due) "
+                "VALUES (?,?,?,?,?,?,?)",
+                (id, kind, json.dumps(data, ensure_ascii=False), depth, priority, interval,
+                 time.time() if due is None else due))
+            if cur.rowcount == 1:
+                self.stats["novos"] += 1
+                return True
+            self.db.execute("UPDATE fronteira SET priority = MAX(priority, ?) WHERE id = ?", (priority, id))
+            return False
+
+    def push_many(self, items: List[tuple]) -> int:
+        """[(id, kind, data, priority, depth, interval), ...] numa transação."""
+        n = 0
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                now = time.time()
+                for id, kind, data, priority, depth, interval in items:
+                    cur = self.db.execute(
+                        "INSERT OR IGNORE INTO fronteira (id, kind, data, depth, priority, interval, next_due) "
+                        "VALUES (?,?,?,?,?,?,?)",
+                        (id, kind, json.dumps(data, ensure_ascii=False), depth, priority, interval, now))
+                    n += cur.rowcount
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        self.stats["novos"] += n
+        return n
+
+    def lease(self, n: int, kind: Optional[str] = None, lease_s: float = LEASE_S) -> List[Item]:
+        """Até n itens vencidos, maior prioridade primeiro (empate: o mais
+        atrasado). Ficam reservados por lease_s, inclusive para outro job."""
+        now = time.time()
+        q = ("SELECT id, kind, data, depth, priority, interval FROM fronteira "
+             "WHERE next_due IS NOT NULL AND next_due <= ?")
+        args: list = [now]
+        if kind:
+            q += " AND kind = ?"
+            args.append(kind)
+        q += " ORDER BY priority DESC, next_due LIMIT ?"
+        args.append(n)
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.db.execute(q, args).fetchall()
+                self.db.executemany("UPDATE fronteira SET next_due = ? WHERE id = ?",
+                                    [(now + lease_s, r[0]) for r in rows])
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return [Item(r[0], r[1], json.loads(r[2]), r[3], r[4], r[5]) for r in rows]
+
+    def done(self, item: Item, interval: Optional[float] = -1.0) -> None:
+        """Visita concluída: reagenda pelo intervalo do item (ou o passado
+        aqui; DONE encerra o item)."""
+        interval = item.interval if interval == -1.0 else interval
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "UPDATE fronteira SET last_visit = ?, visits = visits + 1, fails = 0, interval = ?, "
+                "next_due = ? WHERE id = ?",
+                (now, interval, None if interval is None else now + interval, item.id))
+            self.stats["visitados"] += 1
+
+    def fail(self, item: Item, base_s: float = 600, max_fails: int = 6) -> None:
+        """Erro de rede/HTTP: tenta de novo com espera exponencial; depois de
+        max_fails seguidas, o item sai da fila."""
+        now = time.time()
+        with self.lock:
+            fails = self.db.execute("SELECT fails FROM fronteira WHERE id = ?", (item.id,)).fetchone()
+            fails = (fails[0] if fails else 0) + 1
+            due = None if fails >= max_fails else now + min(MAX_BACKOFF_S, base_s * 2 ** (fails - 1))
+            self.db.execute("UPDATE fronteira SET fails = ?, last_visit = ?, next_due = ? WHERE id = ?",
+                            (fails, now, due, item.id))
+            self.stats["falhas"] += 1
+
+    def release(self, items: List[Item]) -> None:
+        # itens arrendados e não processados (fim do orçamento) voltam já
+        now = time.time()
+        with self.lock:
+            self.db.executemany("UPDATE fronteira SET next_due = ? WHERE id = ? AND next_due > ?",
+                                [(now, it.id, now) for it in items])
+
+    def summary(self) -> Dict:
+        now = time.time()
+        rows = self.db.execute(
+            "SELECT kind, SUM(next_due IS NOT NULL AND next_due <= ?), SUM(next_due > ?), "
+            "SUM(next_due IS NULL) FROM fronteira GROUP BY kind", (now, now)).fetchall()
+        return {k: {"vencidos": a or 0, "agendados": b or 0, "encerrados": c or 0} for k, a, b, c in rows}
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
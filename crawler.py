@@ -1,16 +1,20 @@
-import re, json, time, random, hashlib, html, urllib.parse, requests
-from bs4 import BeautifulSoup
+import os, json, time, random, itertools, urllib.parse
 from slugify import slugify
+from fetcher import Fetcher
+from http_cache import default_cache
+import meta_stream
+from canonical import SeenIndex, product_key, sku_for
+import serp
+import metrics
+from price import parse_amount
+from price_history import PriceHistory
 
 UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124 Safari/537.36"
 HDRS = {"User-Agent": UA, "Accept-Language": "pt-BR,pt;q=0.9"}
 TIMEOUT = 20
 MAX_PER_RUN = 20
 
-SEARCH_ENGINES = [
-    "https://www.bing.com/search?q={q}",
-    "https://duckduckgo.com/html/?q={q}"
-]
+SEARCH_ENGINES = ("bing", "ddg")
 
 # domínios permitidos (expanda depois)
 DOMAINS_OK = [
@@ -21,39 +25,16 @@ DOMAINS_OK = [
 
 BAD_PATH = ("login","cart","checkout","track","seller","support","help","mailto:", "account","orders","wishlist","entrar","minha-conta")
 
-PRICE_RX = re.compile(r"(R\$\s*\d{1,3}(\.\d{3})*(,\d{2})?)", re.I)
-
 QUERIES = [
     "iphone 14 128gb preço", "notebook i5 16gb ssd 512",
     "smart tv 50 4k", "ssd nvme 1tb", "roteador wi-fi 6 ax3000",
 ]
 
-def http_get(url):
-    try:
-        r = requests.get(url, headers=HDRS, timeout=TIMEOUT, allow_redirects=True)
-        r.raise_for_status()
-        return r.text, r.url
-    except:
-        return None, url
+FETCH = Fetcher(headers=HDRS, timeout=TIMEOUT, cache=default_cache())
 
 def extract_meta(html_text):
-    soup = BeautifulSoup(html_text, "lxml")
-
-    def m(name):
-        tag = soup.find("meta", attrs={"property": name}) or soup.find("meta", attrs={"name": name})
-        return tag.get("content").strip() if tag and tag.get("content") else None
-
-    title = (m("og:title") or (soup.title.string.strip() if soup.title else None))
-    img = m("og:image")
-    desc = m("og:description") or m("description")
-
-    price = None
-    if html_text:
-        mprice = PRICE_RX.search(html_text)
-        if mprice:
-            price = mprice.group(1)
-
-    return {"title": title, "image": img, "description": desc, "price_text": price}
+    # parser em streaming: lê só o <head> (ou até o primeiro JSON-LD Product)
+    return meta_stream.extract_meta(html_text)
 
 def allowed(url):
     u = urllib.parse.urlparse(url)
@@ -64,66 +45,70 @@ def allowed(url):
     return any(host.endswith(d) for d in DOMAINS_OK)
 
 def search_links(query):
-    links = []
-    q = urllib.parse.quote_plus(query)
-    for tmpl in SEARCH_ENGINES:
-        html_text, _ = http_get(tmpl.format(q=q))
-        if not html_text:
-            continue
-        soup = BeautifulSoup(html_text, "lxml")
-        for a in soup.select("a[href]"):
-            href = a["href"]
-            if href.startswith("/"):  # relativos em motores
-                continue
-            if href.startswith("http"):
-                links.append(href)
-    # dedup simples
-    seen = set()
-    out = []
-    for l in links:
-        u = l.split("#")[0]
-        if u not in seen:
-            seen.add(u)
-            out.append(u)
-    return out
+    # só os resultados orgânicos; a SERP fica em cache (serp.TTL) por consulta e
+    # o segundo buscador só é consultado se o primeiro não der MAX_PER_RUN links
+    links = (r.url for r in serp.search(FETCH, query, engines=SEARCH_ENGINES) if allowed(r.url))
+    return list(itertools.islice(links, MAX_PER_RUN))
 
 def sku_from_url(u):
-    return hashlib.md5(u.encode("utf-8")).hexdigest()
+    # mesma chave para todas as variantes de rastreio do mesmo produto
+    return sku_for(u)
 
 def crawl_once():
     random.shuffle(QUERIES)
-    created = 0
+    # 1) SERPs de todas as queries em paralelo
+    # produtos já vistos (nesta ou em execuções anteriores) nem são baixados
+    seen_index = SeenIndex()
+    candidates, seen = [], set()
+    with metrics.stage("serp"):
+        for q, links in FETCH.map(search_links, QUERIES):
+            for ln in links:
+                key = product_key(ln)
+                if key in seen or key in seen_index:
+                    continue
+                seen.add(key)
+                candidates.append((q, ln))
+
+    # 2) páginas de produto em paralelo; o TokenBucket por domínio substitui o sleep
+    def visit(cand):
+        q, ln = cand
+        meta, final_url = meta_stream.fetch_meta(FETCH, ln)
+        if not meta:
+            return None
+        if not (meta["title"] and (meta["price_text"] or meta["image"])):
+            return None
+        return {
+            "sku": sku_from_url(final_url),
+            "url": final_url,
+            "query": q,
+            "title": meta["title"],
+            "image": meta["image"],
+            "price_text": meta["price_text"],
+            "description": meta["description"],
+            "slug": slugify(meta["title"])[:80],
+            "ts": int(time.time()),
+        }
+
     items = []
-    for q in QUERIES:
-        if created >= MAX_PER_RUN:
-            break
-        for ln in search_links(q):
-            if created >= MAX_PER_RUN:
-                break
-            if not allowed(ln):
-                continue
-            html_text, final_url = http_get(ln)
-            if not html_text:
-                continue
-            meta = extract_meta(html_text)
-            if not (meta["title"] and (meta["price_text"] or meta["image"])):
-                continue
-            item = {
-                "sku": sku_from_url(final_url),
-                "url": final_url,
-                "query": q,
-                "title": meta["title"],
-                "image": meta["image"],
-                "price_text": meta["price_text"],
-                "description": meta["description"],
-                "slug": slugify(meta["title"])[:80],
-                "ts": int(time.time()),
-            }
-            items.append(item)
-            created += 1
-            time.sleep(0.3)
+    history = PriceHistory()
+    with metrics.stage("paginas"):
+        for (_, ln), item in FETCH.map(visit, candidates):
+            metrics.count("products", outcome="novo" if item else "descartado")
+            if item and seen_index.add(item["url"], "crawler"):
+                seen_index.add(ln, "crawler")
+                items.append(item)
+                if item["price_text"]:
+                    history.observe(item["url"], parse_amount(item["price_text"]))
+                if len(items) >= MAX_PER_RUN:
+                    break
+    seen_index.save()
     return items
 
 if __name__ == "__main__":
+    metrics.start_run("crawler")
     data = crawl_once()
-    print(json.dumps({"created": len(data), "items": data}, ensure_ascii=False))
+    # PRODUCT_SINK=caminho.jsonl grava também no mesmo sink do crawler_v3/scrapper
+    if os.environ.get("PRODUCT_SINK"):
+        from product_sink import ProductSink
+        ProductSink(os.environ["PRODUCT_SINK"]).extend(data)
+    print(json.dumps({"created": len(data), "items": data, "fetch": FETCH.stats}, ensure_ascii=False))
@@ -1,8 +1,13 @@
 # crawler.py
-import os, re, time, random, json, logging
+import re, json, logging, itertools
 from typing import List, Dict, Optional
-import requests
-from bs4 import BeautifulSoup
+from fetcher import Fetcher
+from http_cache import default_cache
+import meta_stream
+from canonical import SeenIndex, product_key
+from price import find_price, format_price, parse_amount
+from price_history import PriceHistory
+import serp
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
@@ -12,10 +17,8 @@ HEADERS = {
     "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
 }
 
-ENGINES = [
-    "https://www.bing.com/search?q=",
-    "https://duckduckgo.com/html/?q=",
-]
+ENGINES = ("bing", "ddg")
+MAX_HITS = 20
 
 # deixe vazio para buscar globalmente; se quiser restringir, adicione domínios aqui
 DOMAINS: List[str] = []
@@ -25,10 +28,7 @@ BAD_PATH = (
     "account", "orders", "wishlist", "enter", "minha-conta"
 )
 
-PRICE_RX = re.compile(
-    r"(?:R\$\s?|US\$\s?|€\s?|£\s?)(?:\d{1,3}(?:[\.\,]\d{3})*|\d+)(?:[\.\,]\d{2})?",
-    re.IGNORECASE,
-)
+FETCH = Fetcher(headers=HEADERS, timeout=25, cache=default_cache())
 
 def norm_space(s: str) -> str:
     return re.sub(r"\s+", " ", s or "").strip()
@@ -44,57 +44,32 @@ def ok_url(u: str) -> bool:
     return True
 
 def extract_price(txt: str) -> Optional[str]:
-    m = PRICE_RX.search(txt or "")
-    return m.group(0) if m else None
+    p = find_price(txt)
+    return format_price(p.amount, p.currency) if p.amount is not None else None
 
 def search_once(query: str) -> List[Dict]:
-    q = requests.utils.quote(query)
-    engine = random.choice(ENGINES)
-    url = f"{engine}{q}"
-    logging.info("GET %s", url)
-    r = requests.get(url, headers=HEADERS, timeout=25)
-    r.raise_for_status()
-
-    soup = BeautifulSoup(r.text, "lxml")
-
-    # Bing
-    results = soup.select("li.b_algo h2 a, h2 a")
-    if not results:
-        # DuckDuckGo HTML
-        results = soup.select("a.result__a, a[href][rel='nofollow']")
-    out = []
-    for a in results:
-        href = a.get("href")
-        title = norm_space(a.get_text())
-        if not ok_url(href):
-            continue
-        out.append({"title": title, "url": href})
-        if len(out) >= 20:
-            break
+    # o segundo buscador só é consultado se o primeiro não der MAX_HITS
+    hits = (r for r in serp.search(FETCH, query, engines=ENGINES) if ok_url(r.url))
+    out = [{"title": norm_space(r.title), "url": r.url} for r in itertools.islice(hits, MAX_HITS)]
+    logging.info("busca %r: %d resultado(s)", query, len(out))
     return out
 
 def fetch_product_page(u: str) -> Dict:
+    # só o <head>/JSON-LD é lido; o download é interrompido quando basta
+    try:
+        final_url, encoding, chunks = FETCH.stream(u)
+    except Exception as e:
+        return {"url": u, "ok": False, "error": str(e)}
     try:
-        r = requests.get(u, headers=HEADERS, timeout=25)
-        r.raise_for_status()
+        # o corpo chega durante a extração: timeout/conexão cortada aparecem aqui
+        meta = meta_stream.extract_from_chunks(chunks, encoding)
     except Exception as e:
         return {"url": u, "ok": False, "error": str(e)}
+    finally:
+        chunks.close()
 
-    soup = BeautifulSoup(r.text, "lxml")
-    title = norm_space(
-        (soup.select_one("meta[property='og:title']") or {}).get("content")
-        or soup.title.string if soup.title else ""
-    )
-    if not title:
-        h = soup.select_one("h1") or soup.select_one("h2")
-        title = norm_space(h.get_text()) if h else ""
-
-    price = None
-    meta_price = soup.select_one("meta[itemprop='price'], meta[property='product:price:amount']")
-    if meta_price and meta_price.get("content"):
-        price = meta_price.get("content")
-    if not price:
-        price = extract_price(soup.get_text(" ", strip=True))
+    title = norm_space(meta["title"] or meta["h1"] or "")
+    price = meta["price"] or extract_price(meta["price_text"] or "")
 
     return {
         "url": u, "ok": True,
@@ -102,17 +77,37 @@ def fetch_product_page(u: str) -> Dict:
         "price": price,
     }
 
+def search_safe(query: str) -> List[Dict]:
+    try:
+        return search_once(query)
+    except Exception as e:
+        logging.warning("busca falhou para %r: %s", query, e)
+        return []
+
 def crawl_queries(queries: List[str]) -> List[Dict]:
+    # buscas e páginas de produto rodam em paralelo; a cortesia com cada
+    # domínio fica a cargo do TokenBucket do Fetcher (sem sleep fixo)
+    seen_index = SeenIndex()
+    hits, seen = [], set()
+    for q, results in FETCH.map(search_safe, queries):
+        for h in results:
+            key = product_key(h["url"])
+            if key in seen or key in seen_index:
+                continue
+            seen.add(key)
+            hits.append((q, h))
+
     all_items: List[Dict] = []
-    for q in queries:
-        hits = search_once(q)
-        for h in hits:
-            info = fetch_product_page(h["url"])
-            info["query"] = q
-            info["hit_title"] = h["title"]
-            all_items.append(info)
-            time.sleep(random.uniform(1.0, 2.2))
-        time.sleep(random.uniform(2.0, 4.0))
+    history = PriceHistory()
+    for (q, h), info in FETCH.map(lambda qh: fetch_product_page(qh[1]["url"]), hits):
+        info["query"] = q
+        info["hit_title"] = h["title"]
+        if info["ok"]:
+            seen_index.add(h["url"], "crawler_v2")
+            if info["price"]:
+                history.observe(h["url"], parse_amount(info["price"]))
+        all_items.append(info)
+    seen_index.save()
     return all_items
 
 def main():
@@ -123,7 +118,7 @@ def main():
         "Cartier Love Bracelet price", "apartamento de luxo preço m2",
     ]
     data = crawl_queries(QUERIES)
-    print(json.dumps({"count": len(data), "items": data[:50]}, ensure_ascii=False))
+    print(json.dumps({"count": len(data), "items": data[:50], "fetch": FETCH.stats}, ensure_ascii=False))
 
 if __name__ == "__main__":
     main()
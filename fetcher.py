@@ -0,0 +1,429 @@
+# fetcher.py - motor de download compartilhado pelos crawlers
+import os, time, random, threading, urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from tenacity import Retrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# limites globais (ajustáveis por variável de ambiente)
+MAX_IN_FLIGHT = int(os.environ.get("FETCH_MAX_IN_FLIGHT", "16"))
+HOST_RATE = float(os.environ.get("FETCH_HOST_RATE", "2.0"))   # requisições/s por domínio
+HOST_BURST = int(os.environ.get("FETCH_HOST_BURST", "2"))
+HOST_MAX_CONCURRENCY = int(os.environ.get("FETCH_HOST_MAX", "8"))  # teto do AIMD por domínio
+RETRIES = int(os.environ.get("FETCH_RETRIES", "3"))                # tentativas por requisição
+SLOW_S = float(os.environ.get("FETCH_SLOW_S", "8"))                # acima disso conta como sobrecarga
+MAX_RETRY_AFTER_S = 120.0
+BREAKER_FAILS = int(os.environ.get("FETCH_BREAKER_FAILS", "5"))    # falhas seguidas para abrir
+BREAKER_COOLDOWN_S = 30.0                                          # dobra a cada reabertura
+BREAKER_MAX_S = 600.0
+MIN_TIMEOUT = 5.0
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+IDEMPOTENT = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+# sufixos de dois níveis comuns nas lojas que visitamos
+_SECOND_LEVEL = ("com.br", "net.br", "org.br", "co.uk", "com.mx", "com.ar")
+
+
+def host_key(url: str) -> str:
+    """Domínio registrado da URL (www.amazon.com.br -> amazon.com.br)."""
+    host = (urllib.parse.urlparse(url).hostname or "").lower()
+    if host.replace(".", "").isdigit() or ":" in host:
+        return host     # IP
+    parts = host.split(".")
+    n = 3 if any(host.endswith("." + s) for s in _SECOND_LEVEL) else 2
+    return ".".join(parts[-n:]) if len(parts) > n else host
+
+
+def _charset(content_type: Optional[str]) -> Optional[str]:
+    for part in (content_type or "").split(";")[1:]:
+        k, _, v = part.strip().partition("=")
+        if k.lower() == "charset" and v:
+            return v.strip("\"' ")
+    return None
+
+
+def _once(body: bytes) -> Iterator[bytes]:
+    yield body
+
+
+class TokenBucket:
+    """Balde de fichas: `rate` fichas por segundo, no máximo `burst` acumuladas."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(rate, 0.01)
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def retry_after(r: requests.Response) -> Optional[float]:
+    """Retry-After em segundos (aceita número ou data HTTP)."""
+    v = (r.headers.get("Retry-After") or "").strip()
+    if not v:
+        return None
+    if v.isdigit():
+        return float(v)
+    try:
+        return max(0.0, parsedate_to_datetime(v).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostOpen(requests.ConnectionError):
+    """Circuito aberto: o domínio falhou demais e está em quarentena."""
+
+
+class HostController:
+    """Concorrência de um domínio ajustada por AIMD: +1/limite a cada resposta
+    boa e rápida, metade a cada 429/5xx/timeout/resposta lenta (no máximo uma
+    redução por janela de latência). Retry-After pausa o domínio inteiro.
+    Falhas seguidas abrem o circuito: as requisições falham na hora até o
+    resfriamento; depois uma única sonda decide se fecha ou reabre."""
+
+    def __init__(self, host: str, initial: float = HOST_BURST, max_limit: int = HOST_MAX_CONCURRENCY):
+        self.host = host
+        self.limit = float(max(1, min(initial, max_limit)))
+        self.max_limit = max(1, max_limit)
+        self.in_flight = 0
+        self.cond = threading.Condition()
+        self.ewma = 0.0             # latência média (s)
+        self.samples = 0
+        self.last_cut = 0.0
+        self.paused_until = 0.0
+        self.fails = 0              # falhas seguidas
+        self.open_until = 0.0
+        self.cooldown = BREAKER_COOLDOWN_S
+        self.probe: Optional[object] = None     # a requisição de sonda em voo
+        self.counts = {"ok": 0, "throttled": 0, "errors": 0, "timeouts": 0, "rejected": 0}
+
+    def acquire(self) -> Optional[object]:
+        """Espera uma vaga. Na meia-abertura devolve o token da sonda, que
+        precisa voltar em release(); fora dela, None."""
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                if self.open_until > now:
+                    self.counts["rejected"] += 1
+                    raise HostOpen(f"circuito aberto para {self.host} por mais {self.open_until - now:.0f}s")
+                if self.open_until and self.probe is None:
+                    self.probe = object()       # meia-abertura: só esta passa
+                    self.in_flight += 1
+                    return self.probe
+                if self.paused_until > now:
+                    self.cond.wait(self.paused_until - now)
+                    continue
+                if not self.open_until and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return None
+                self.cond.wait(1.0)
+
+    def timeout(self, default: float) -> float:
+        # com amostras suficientes, não espera muito mais que o normal do domínio
+        if self.samples < 5:
+            return default
+        return min(default, max(MIN_TIMEOUT, 4 * self.ewma + 2))
+
+    def _cut(self, now: float) -> None:
+        if now - self.last_cut > max(self.ewma, 1.0):
+            self.limit = max(1.0, self.limit / 2)
+            self.last_cut = now
+
+    def release(self, outcome: str, latency: float = 0.0, pause: Optional[float] = None,
+                token: Optional[object] = None) -> None:
+        """outcome: ok | throttled | error | timeout | abort (só devolve a vaga).
+        Só a requisição com o token da sonda fecha ou reabre o circuito; as
+        que já estavam em voo quando ele abriu não decidem nada."""
+        now = time.monotonic()
+        with self.cond:
+            self.in_flight -= 1
+            was_probe = token is not None and token is self.probe
+            if was_probe:
+                self.probe = None
+            if outcome == "abort":
+                self.cond.notify_all()
+                return
+            if latency:
+                self.ewma = latency if not self.samples else 0.8 * self.ewma + 0.2 * latency
+                self.samples += 1
+            if outcome == "ok":
+                self.counts["ok"] += 1
+                self.fails = 0
+                if was_probe:
+                    self.open_until, self.cooldown = 0.0, BREAKER_COOLDOWN_S
+                if latency > SLOW_S:
+                    self._cut(now)
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            else:
+                self.counts[{"throttled": "throttled", "timeout": "timeouts"}.get(outcome, "errors")] += 1
+                self.fails += 1
+                self._cut(now)
+                if pause:
+                    self.paused_until = max(self.paused_until, now + min(pause, MAX_RETRY_AFTER_S))
+                if was_probe or (not self.open_until and self.fails >= BREAKER_FAILS):
+                    if was_probe:
+                        self.cooldown = min(BREAKER_MAX_S, self.cooldown * 2)
+                    self.open_until = now + self.cooldown
+            self.cond.notify_all()
+
+    def snapshot(self) -> Dict:
+        with self.cond:
+            now = time.monotonic()
+            return dict(self.counts, limite=round(self.limit, 2), em_voo=self.in_flight,
+                        latencia_ms=round(self.ewma * 1000), aberto_s=round(max(0.0, self.open_until - now), 1))
+
+
+class _Retry(Exception):
+    def __init__(self, response: Optional[requests.Response] = None, exc: Optional[Exception] = None,
+                 pause: Optional[float] = None):
+        super().__init__(exc or (response.status_code if response is not None else ""))
+        self.response, self.exc, self.pause = response, exc, pause
+
+
+def _wait(state) -> float:
+    # Retry-After manda; senão, exponencial com jitter
+    exc = state.outcome.exception()
+    if isinstance(exc, _Retry) and exc.pause is not None:
+        return min(exc.pause, MAX_RETRY_AFTER_S) + random.uniform(0, 0.5)
+    return wait_random_exponential(multiplier=0.5, max=20)(state)
+
+
+class Fetcher:
+    """Sessão HTTP compartilhada com limite global de requisições simultâneas,
+    um TokenBucket e um HostController (AIMD + circuito) por domínio, e
+    novas tentativas com backoff. Serve para lojas, buscadores e a API do
+    WooCommerce: cada domínio lento ou bloqueado só atrasa a si mesmo."""
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None, timeout: float = 20,
+                 max_in_flight: int = MAX_IN_FLIGHT, rate: float = HOST_RATE,
+                 burst: int = HOST_BURST, cache=None, retries: int = RETRIES,
+                 host_max: int = HOST_MAX_CONCURRENCY):
+        self.timeout = timeout
+        self.cache = cache  # http_cache.HttpCache opcional
+        self.max_in_flight = max(1, max_in_flight)
+        self.rate = rate
+        self.burst = burst
+        self.retries = max(1, retries)
+        self.host_max = host_max
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=self.max_in_flight, pool_maxsize=self.max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._hosts: Dict[str, HostController] = {}
+        self._lock = threading.Lock()
+        # métricas da execução: bytes baixados e tempo gasto esperando a rede
+        self.stats = {"requests": 0, "bytes": 0, "fetch_s": 0.0,
+                      "cache_hits": 0, "revalidated": 0, "retries": 0}
+
+    def _count(self, **delta) -> None:
+        with self._lock:
+            for k, v in delta.items():
+                self.stats[k] += v
+
+    def bucket(self, url: str) -> TokenBucket:
+        key = host_key(url)
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                b = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            return b
+
+    def controller(self, url: str) -> HostController:
+        key = host_key(url)
+        with self._lock:
+            c = self._hosts.get(key)
+            if c is None:
+                c = self._hosts[key] = HostController(key, self.burst, self.host_max)
+            return c
+
+    def host_stats(self) -> Dict[str, Dict]:
+        """Por domínio: respostas ok/429/erros/timeouts, limite atual do AIMD,
+        latência média e quanto falta para o circuito fechar."""
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {k: c.snapshot() for k, c in sorted(hosts.items())}
+
+    def _attempt(self, method: str, url: str, retryable: bool, last: bool, **kwargs) -> requests.Response:
+        ctl = self.controller(url)
+        token = ctl.acquire()
+        t0 = time.perf_counter()
+        try:
+            # timeout adaptativo só para leituras sem timeout explícito: uma
+            # escrita cortada no meio pode ter sido gravada e não se repete
+            if kwargs.get("timeout") is None:
+                kwargs["timeout"] = ctl.timeout(self.timeout) if method in IDEMPOTENT else self.timeout
+            self.bucket(url).acquire()
+            t0 = time.perf_counter()
+            with self._slots:
+                r = self.session.request(method, url, **kwargs)
+                size = 0 if kwargs.get("stream") else len(r.content)
+        except requests.Timeout as e:
+            ctl.release("timeout", time.perf_counter() - t0, token=token)
+            metrics.count("http_requests", host=ctl.host, status="timeout")
+            if last or not retryable:
+                raise
+            raise _Retry(exc=e)
+        except requests.ConnectionError as e:
+            ctl.release("error", time.perf_counter() - t0, token=token)
+            metrics.count("http_requests", host=ctl.host, status="conexao")
+            # conexão recusada/DNS: nada chegou ao servidor, pode repetir qualquer método
+            if last:
+                raise
+            raise _Retry(exc=e)
+        except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError) as e:
+            # corpo truncado ou corrompido: falha do servidor, repete como um 5xx
+            ctl.release("error", time.perf_counter() - t0, token=token)
+            metrics.count("http_requests", host=ctl.host, status="corpo")
+            if last or not retryable:
+                raise
+            raise _Retry(exc=e)
+        except BaseException:
+            # URL inválida, redirecionamentos demais, interrupção...: a vaga do
+            # domínio volta sem contar como falha dele
+            ctl.release("abort", token=token)
+            raise
+        elapsed = time.perf_counter() - t0
+        self._count(requests=1, bytes=size, fetch_s=elapsed)
+        metrics.observe("http_request_seconds", elapsed, host=ctl.host)
+        metrics.count("http_requests", host=ctl.host, status=r.status_code)
+        if size:
+            metrics.observe("http_response_bytes", size, metrics.BYTES, host=ctl.host)
+        if r.status_code in RETRY_STATUS:
+            pause = retry_after(r)
+            ctl.release("throttled" if r.status_code in (429, 503) else "error", elapsed, pause, token=token)
+            # POST só é repetido em 429 (o servidor avisou que não processou)
+            if not last and (retryable or r.status_code == 429):
+                r.close()
+                raise _Retry(response=r, pause=pause)
+            return r
+        ctl.release("ok", elapsed, token=token)
+        return r
+
+    def request(self, method: str, url: str, retries: Optional[int] = None,
+                retry_unsafe: Optional[bool] = None, **kwargs) -> requests.Response:
+        """Uma requisição com controle por domínio e novas tentativas (429,
+        5xx, timeout, conexão). Métodos não idempotentes só repetem em 429 ou
+        falha de conexão, salvo retry_unsafe=True. HostOpen (circuito aberto)
+        sobe sem tentar."""
+        method = method.upper()
+        attempts = max(1, retries or self.retries)
+        retryable = method in IDEMPOTENT if retry_unsafe is None else retry_unsafe
+        n = 0
+        for attempt in Retrying(stop=stop_after_attempt(attempts), wait=_wait, reraise=True,
+                                retry=retry_if_exception_type(_Retry)):
+            with attempt:
+                n += 1
+                if n > 1:
+                    self._count(retries=1)
+                return self._attempt(method, url, retryable, n >= attempts, **kwargs)
+        raise AssertionError("inalcançável")
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        return self.request("HEAD", url, **kwargs)
+
+    def _send(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        if self.cache is None or kwargs.get("stream"):
+            return self._send(url, **kwargs)
+
+        entry = self.cache.lookup(url)
+        if entry and entry.complete and self.cache.is_fresh(url, entry):
+            self._count(cache_hits=1)
+            metrics.count("http_cache", result="hit")
+            return entry.to_response()
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry and entry.complete:
+            headers.update(entry.validators())
+        r = self._send(url, headers=headers, **kwargs)
+        if r.status_code == 304 and entry:
+            self.cache.touch(url)
+            self._count(revalidated=1)
+            metrics.count("http_cache", result="revalidated")
+            return entry.to_response()
+        if r.status_code == 200:
+            self.cache.store(url, r)
+        return r
+
+    def stream(self, url: str, chunk_size: int = 16384, **kwargs):
+        """Versão em streaming de get(): devolve (url final, charset, iterador
+        de bytes). Quem consome pode parar no meio; o que foi lido vai para o
+        cache marcado como incompleto, o que basta para reextrair metadados."""
+        entry = self.cache.lookup(url) if self.cache is not None else None
+        if entry and self.cache.is_fresh(url, entry):
+            self._count(cache_hits=1)
+            metrics.count("http_cache", result="hit")
+            return entry.final_url, _charset(entry.content_type), _once(entry.body)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry:
+            headers.update(entry.validators())
+        r = self._send(url, headers=headers, stream=True, **kwargs)
+        if r.status_code == 304 and entry:
+            r.close()
+            self.cache.touch(url)
+            self._count(revalidated=1)
+            metrics.count("http_cache", result="revalidated")
+            return entry.final_url, _charset(entry.content_type), _once(entry.body)
+        try:
+            r.raise_for_status()
+        except Exception:
+            r.close()
+            raise
+        return r.url, _charset(r.headers.get("Content-Type")), self._drain(url, r, chunk_size)
+
+    def _drain(self, url: str, r: requests.Response, chunk_size: int) -> Iterator[bytes]:
+        buf = bytearray()
+        complete = False
+        try:
+            for chunk in r.iter_content(chunk_size):
+                buf += chunk
+                yield chunk
+            complete = True
+        finally:
+            r.close()
+            self._count(bytes=len(buf))
+            if buf:
+                metrics.observe("http_response_bytes", len(buf), metrics.BYTES, host=host_key(url))
+            if self.cache is not None and buf:
+                self.cache.store(url, r, bytes(buf), complete=complete)
+
+    def map(self, fn: Callable[[T], R], items: Iterable[T]) -> Iterator[Tuple[T, R]]:
+        """Executa `fn` em paralelo e devolve (item, resultado) na ordem em que
+        terminam. Se o chamador parar de iterar (ex.: atingiu MAX_PER_RUN), o
+        que ainda não começou é cancelado."""
+        pool = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        try:
+            futures = {pool.submit(fn, it): it for it in items}
+            for fut in as_completed(futures):
+                yield futures[fut], fut.result()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,321 @@
+# fila_postagem.py - fila de postagem por loja com prioridade (heap) e estado incremental
+#
+#   python fila_postagem.py adicionar inteligencia_links/PROCESSAR_AGORA.json
+#   python fila_postagem.py adicionar catalogo --categoria kitchen --max-preco 100
+#   python fila_postagem.py lote                 # um lote por loja (10 a 50 itens)
+#   python fila_postagem.py status
+#
+# A prioridade sai das regras de CONFIG_BOT.txt / CRITERIOS_BOT.txt (margem
+# mínima por modalidade, avaliação acima de 4.0, tamanho de lote). O estado é
+# um diário JSONL só de acréscimos (cada push/pop uma linha); ao abrir, o diário
+# é reaplicado e os heaps montados com heapify.
+import os, re, json, time, heapq, argparse, itertools, urllib.parse
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from canonical import product_key, canonical_url
+from price import parse_price
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LINKS_DIR = os.path.join(BASE_DIR, "inteligencia_links")
+CONFIG_PATH = os.path.join(LINKS_DIR, "CONFIG_BOT.txt")
+CRITERIOS_PATH = os.path.join(LINKS_DIR, "CRITERIOS_BOT.txt")
+LOG_PATH = os.path.join(LINKS_DIR, "LOG_POSTAGEM.txt")
+LOTES_DIR = os.path.join(LINKS_DIR, "lotes")
+STATE_PATH = os.environ.get("FILA_STATE_PATH") or os.path.join(BASE_DIR, ".cache", "fila", "fila.jsonl")
+
+# destinos (mesmo formato das linhas [LOJA_NOVA] / [LOJA_ANTIGA] da fila antiga)
+LOJAS = {
+    "LOJA_NOVA": {"post": "https://lojanova.com/post?url={url}", "cor": "#FFD700"},
+    "LOJA_ANTIGA": {"post": "https://lojaantiga.com/post?url={url}", "cor": "PADRAO"},
+}
+FOCO = re.compile(r"smart|tecnolog|notebook|monitor|teclado|mouse|headset|fone|carregador|usb|led|"
+                  r"suporte|mesa|cadeira|organizador|alexa|echo|ssd|roteador|cozinha|limpeza", re.I)
+
+
+@dataclass(frozen=True)
+class Regras:
+    margem_afiliado: float = 8.0
+    margem_drop_min: float = 15.0
+    margem_drop_max: float = 25.0
+    avaliacao_min: float = 4.0
+    lote_min: int = 10
+    lote_max: int = 50
+    envio_max_h: int = 48
+
+
+def carregar_regras(config: str = CONFIG_PATH, criterios: str = CRITERIOS_PATH) -> Regras:
+    """Lê os números dos .txt do bot; o que não achar fica no padrão."""
+    txt = ""
+    for path in (config, criterios):
+        if os.path.exists(path):
+            with open(path, encoding="utf-8", errors="replace") as f:
+                txt += f.read() + "\n"
+    r = Regras()
+    vals = {}
+    m = re.search(r"AFILIADO:\s*M[ií]nimo\s*(\d+(?:[.,]\d+)?)\s*%", txt, re.I)
+    if m:
+        vals["margem_afiliado"] = float(m.group(1).replace(",", "."))
+    m = re.search(r"DROPSHIPPING:\s*(\d+)\s*%\s*a\s*(\d+)\s*%", txt, re.I)
+    if m:
+        vals["margem_drop_min"], vals["margem_drop_max"] = float(m.group(1)), float(m.group(2))
+    m = re.search(r"Avalia[cç][aã]o acima de\s*(\d+(?:[.,]\d+)?)", txt, re.I)
+    if m:
+        vals["avaliacao_min"] = float(m.group(1).replace(",", "."))
+    m = re.search(r"Lotes de\s*(\d+)\s*a\s*(\d+)", txt, re.I)
+    if m:
+        vals["lote_min"], vals["lote_max"] = int(m.group(1)), int(m.group(2))
+    hs = [int(h) for h in re.findall(r"(\d+)h", txt)]
+    if hs:
+        vals["envio_max_h"] = max(hs)
+    return Regras(**{**r.__dict__, **vals})
+
+
+def _num(v) -> Optional[float]:
+    if v is None or v == "":
+        return None
+    if isinstance(v, (int, float)):
+        return float(v)
+    p = parse_price(str(v).replace("%", "").strip())
+    return float(p.amount) if p.amount is not None else None
+
+
+def pontuar(item: Dict, regras: Regras) -> Optional[float]:
+    """Prioridade 0..100 (maior sai antes) ou None se o item fere uma regra.
+    Campos opcionais: margem/margin (%), modalidade (afiliado|dropshipping),
+    avaliacao/rating, envio_h; os feeds atuais não trazem quase nenhum, então
+    o que falta é neutro e pesa só um pouco contra."""
+    score = 50.0
+    modalidade = (item.get("modalidade") or "afiliado").lower()
+    margem = _num(item.get("margem", item.get("margin")))
+    if margem is not None:
+        minimo = regras.margem_drop_min if modalidade.startswith("drop") else regras.margem_afiliado
+        if margem < minimo:
+            return None
+        teto = regras.margem_drop_max if modalidade.startswith("drop") else minimo + 17
+        score += 25 * min(1.0, (margem - minimo) / max(1.0, teto - minimo))
+    else:
+        score -= 5
+    nota = _num(item.get("avaliacao", item.get("rating")))
+    if nota is not None:
+        if nota <= regras.avaliacao_min:
+            return None
+        score += 15 * min(1.0, (nota - regras.avaliacao_min) / (5.0 - regras.avaliacao_min))
+    else:
+        score -= 3
+    envio = _num(item.get("envio_h"))
+    if envio is not None and envio > regras.envio_max_h:
+        return None
+    if FOCO.search(item.get("name") or ""):
+        score += 10
+    if item.get("image_url"):
+        score += 5
+    if _num(item.get("price")):
+        score += 3
+    return round(max(0.0, min(100.0, score)), 2)
+
+
+class PostingQueue:
+    """Um heap por loja com (-score, seq, chave). Reinserir um item com outra
+    pontuação só empilha a entrada nova; a antiga é descartada quando chega
+    ao topo (remoção preguiçosa), então push e pop seguem O(log n)."""
+
+    def __init__(self, path: str = STATE_PATH, log_path: str = LOG_PATH, regras: Optional[Regras] = None,
+                 lojas: Dict[str, Dict] = LOJAS):
+        self.path = path
+        self.log_path = log_path
+        self.regras = regras or carregar_regras()
+        self.lojas = lojas
+        self.heaps: Dict[str, List[Tuple[float, int, str]]] = {l: [] for l in lojas}
+        self.items: Dict[str, Dict[str, Tuple[float, int, Dict]]] = {l: {} for l in lojas}
+        self.postados: Dict[str, set] = {l: set() for l in lojas}
+        self.seq = itertools.count()
+        self.journal_lines = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._load_log()
+        self._replay()
+
+    # ---------- estado ----------
+    def _load_log(self) -> None:
+        # linhas "ts\tloja\tchave\turl"; cabeçalhos do formato antigo são ignorados
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) >= 3 and parts[1] in self.postados:
+                    self.postados[parts[1]].add(parts[2])
+
+    def _replay(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                try:
+                    ev = json.loads(line)
+                except ValueError:
+                    continue
+                self.journal_lines += 1
+                loja = ev.get("loja")
+                if loja not in self.items:
+                    continue
+                if ev["op"] == "push":
+                    self.items[loja][ev["key"]] = (ev["score"], next(self.seq), ev["item"])
+                elif ev["op"] == "pop":
+                    self.items[loja].pop(ev["key"], None)
+        for loja, entries in self.items.items():
+            self.heaps[loja] = [(-s, seq, k) for k, (s, seq, _) in entries.items()]
+            heapq.heapify(self.heaps[loja])
+
+    def _append(self, events: List[Dict]) -> None:
+        if not events:
+            return
+        data = "".join(json.dumps(ev, ensure_ascii=False, separators=(",", ":")) + "\n" for ev in events)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data.encode("utf-8"))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self.journal_lines += len(events)
+
+    def compact(self) -> None:
+        """Reescreve o diário só com o que ainda está na fila (troca atômica)."""
+        tmp = self.path + ".tmp"
+        n = 0
+        with open(tmp, "w", encoding="utf-8") as f:
+            for loja, entries in self.items.items():
+                for key, (score, _, item) in sorted(entries.items(), key=lambda kv: kv[1][1]):
+                    f.write(json.dumps({"op": "push", "loja": loja, "key": key, "score": score, "item": item},
+                                       ensure_ascii=False, separators=(",", ":")) + "\n")
+                    n += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.journal_lines = n
+
+    # ---------- operações ----------
+    def __len__(self) -> int:
+        return sum(len(e) for e in self.items.values())
+
+    def add(self, products: Iterable[Dict]) -> Dict[str, int]:
+        """Enfileira em todas as lojas o que ainda não foi postado nelas.
+        Item já na fila com a mesma pontuação não gera escrita."""
+        events, stats = [], {"novos": 0, "atualizados": 0, "rejeitados": 0, "ja_postados": 0}
+        for p in products:
+            url = p.get("affiliate_url") or p.get("url")
+            if not url:
+                continue
+            key = product_key(url)
+            score = pontuar(p, self.regras)
+            if score is None:
+                stats["rejeitados"] += 1
+                continue
+            item = {k: p.get(k) for k in ("name", "merchant_domain", "price", "image_url") if p.get(k)}
+            item["url"] = url
+            for loja in self.lojas:
+                if key in self.postados[loja]:
+                    stats["ja_postados"] += 1
+                    continue
+                cur = self.items[loja].get(key)
+                if cur and cur[0] == score:
+                    continue
+                seq = next(self.seq)
+                self.items[loja][key] = (score, seq, item)
+                heapq.heappush(self.heaps[loja], (-score, seq, key))
+                events.append({"op": "push", "loja": loja, "key": key, "score": score, "item": item})
+                stats["atualizados" if cur else "novos"] += 1
+        self._append(events)
+        if self.journal_lines > 4 * max(1, len(self)) + 1000:
+            self.compact()
+        return stats
+
+    def pop(self, loja: str, n: int) -> List[Dict]:
+        heap, entries, out = self.heaps[loja], self.items[loja], []
+        while heap and len(out) < n:
+            neg, seq, key = heapq.heappop(heap)
+            cur = entries.get(key)
+            if not cur or cur[1] != seq:
+                continue    # entrada substituída por um push mais novo
+            del entries[key]
+            out.append(dict(cur[2], key=key, score=-neg))
+        return out
+
+    def batch(self, loja: str, size: Optional[int] = None, force: bool = False) -> List[Dict]:
+        """Tira um lote (entre lote_min e lote_max) e registra no LOG_POSTAGEM
+        e no diário. Com menos que o mínimo na fila, só sai com force=True."""
+        size = max(self.regras.lote_min, min(size or self.regras.lote_max, self.regras.lote_max))
+        if len(self.items[loja]) < self.regras.lote_min and not force:
+            return []
+        lote = self.pop(loja, size)
+        if not lote:
+            return []
+        now = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(f"--- LOTE {loja} {now}: {len(lote)} PRODUTOS ---\n")
+            f.writelines(f"{now}\t{loja}\t{it['key']}\t{it['url']}\n" for it in lote)
+        self.postados[loja].update(it["key"] for it in lote)
+        self._append([{"op": "pop", "loja": loja, "key": it["key"]} for it in lote])
+        return lote
+
+
+def post_url(loja: str, url: str) -> str:
+    return LOJAS[loja]["post"].format(url=urllib.parse.quote(canonical_url(url), safe=":/?=&"))
+
+
+def write_batch(loja: str, lote: List[Dict], out_dir: Optional[str] = None) -> str:
+    out_dir = out_dir or LOTES_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{loja.lower()}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    rows = [{"produto": it.get("name"), "link_origem": it["url"], "post": post_url(loja, it["url"]),
+             "cor": LOJAS[loja]["cor"], "score": it["score"]} for it in lote]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, ensure_ascii=False, indent=4)
+    return path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fila de postagem por loja.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    a = sub.add_parser("adicionar")
+    a.add_argument("arquivos", nargs="+", help="JSON (lista) ou JSONL de produtos; 'catalogo' lê do catalog.py")
+    a.add_argument("--categoria", help="com 'catalogo': só esta categoria")
+    a.add_argument("--max-preco", type=float, help="com 'catalogo': preço máximo")
+    l = sub.add_parser("lote")
+    l.add_argument("--loja", choices=list(LOJAS), action="append")
+    l.add_argument("--tamanho", type=int)
+    l.add_argument("--forcar", action="store_true", help="emite mesmo abaixo do lote mínimo")
+    sub.add_parser("status")
+    args = ap.parse_args()
+
+    q = PostingQueue()
+    if args.cmd == "adicionar":
+        total: Dict[str, int] = {}
+        for path in args.arquivos:
+            if path == "catalogo":
+                from catalog import Catalog
+                data = Catalog().query(category=args.categoria, max_price=args.max_preco)
+            else:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f) if path.endswith(".json") else [json.loads(x) for x in f if x.strip()]
+            for k, v in q.add(r for r in data if isinstance(r, dict)).items():
+                total[k] = total.get(k, 0) + v
+        print(json.dumps(total, ensure_ascii=False))
+    elif args.cmd == "lote":
+        from catalog import CATALOG_PATH, Catalog
+        out = {}
+        for loja in args.loja or LOJAS:
+            lote = q.batch(loja, args.tamanho, args.forcar)
+            out[loja] = {"itens": len(lote), "arquivo": write_batch(loja, lote) if lote else None}
+            if lote and os.path.exists(CATALOG_PATH):
+                Catalog().mark_posted((it["key"] for it in lote), loja)
+        print(json.dumps(out, ensure_ascii=False))
+    else:
+        print(json.dumps({"regras": q.regras.__dict__, "na_fila": {l: len(e) for l, e in q.items.items()},
+                          "postados": {l: len(s) for l, s in q.postados.items()}}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
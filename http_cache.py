@@ -0,0 +1,159 @@
+# http_cache.py - cache persistente de respostas HTTP (SQLite + zlib)
+import os, time, zlib, sqlite3, threading, urllib.parse
+from typing import Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from fetcher import host_key
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.environ.get("HTTP_CACHE_PATH") or os.path.join(BASE_DIR, ".cache", "http", "respostas.sqlite3")
+MAX_BYTES = int(os.environ.get("HTTP_CACHE_MAX_MB", "256")) * 1024 * 1024
+DEFAULT_TTL = int(os.environ.get("HTTP_CACHE_TTL", "900"))  # 15 min, o intervalo do ingest_continuo
+
+# TTL por domínio em segundos; SERPs mudam pouco em poucas horas
+DOMAIN_TTL: Dict[str, int] = {
+    "bing.com": 6 * 3600,
+    "duckduckgo.com": 6 * 3600,
+}
+# sobrescreve/estende via HTTP_CACHE_TTLS="amazon.com.br=1800,kabum.com.br=600"
+for _kv in filter(None, os.environ.get("HTTP_CACHE_TTLS", "").split(",")):
+    _d, _, _t = _kv.partition("=")
+    if _t.strip().isdigit():
+        DOMAIN_TTL[_d.strip().lower()] = int(_t)
+
+# parâmetros de rastreamento que não mudam o conteúdo da página
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "ref_", "pd_rd_", "pf_rd_", "content-id",
+                   "linkcode", "linkid", "tracking_id", "deal_print_id", "polycard_client")
+
+
+def canonical_url(url: str) -> str:
+    u = urllib.parse.urlsplit(url.strip())
+    query = [(k, v) for k, v in urllib.parse.parse_qsl(u.query, keep_blank_values=True)
+             if not k.lower().startswith(TRACKING_PARAMS)]
+    query.sort()
+    return urllib.parse.urlunsplit((u.scheme.lower(), u.netloc.lower(), u.path or "/",
+                                    urllib.parse.urlencode(query), ""))
+
+
+class CacheEntry:
+    __slots__ = ("key", "final_url", "etag", "last_modified", "content_type",
+                 "encoding", "body", "fetched_at", "complete")
+
+    def __init__(self, key, final_url, etag, last_modified, content_type, encoding,
+                 body, fetched_at, complete):
+        self.key = key
+        self.final_url = final_url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_type = content_type
+        self.encoding = encoding
+        self.body = body
+        self.fetched_at = fetched_at
+        self.complete = bool(complete)
+
+    def validators(self) -> Dict[str, str]:
+        h = {}
+        if self.etag:
+            h["If-None-Match"] = self.etag
+        if self.last_modified:
+            h["If-Modified-Since"] = self.last_modified
+        return h
+
+    def to_response(self) -> requests.Response:
+        r = requests.Response()
+        r.status_code = 200
+        r.reason = "OK"
+        r.url = self.final_url
+        r._content = self.body
+        r.headers = CaseInsensitiveDict({"Content-Type": self.content_type or "text/html"})
+        r.encoding = self.encoding
+        r.from_cache = True
+        return r
+
+
+class HttpCache:
+    """Respostas 200 guardadas comprimidas, chaveadas pela URL canônica.
+    Entradas dentro do TTL do domínio são servidas direto; as vencidas são
+    revalidadas com If-None-Match/If-Modified-Since. Quando o total passa de
+    `max_bytes`, as menos acessadas recentemente saem primeiro (LRU)."""
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = MAX_BYTES,
+                 default_ttl: int = DEFAULT_TTL, domain_ttl: Optional[Dict[str, int]] = None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.domain_ttl = dict(DOMAIN_TTL if domain_ttl is None else domain_ttl)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS respostas ("
+            " key TEXT PRIMARY KEY, final_url TEXT, etag TEXT, last_modified TEXT,"
+            " content_type TEXT, encoding TEXT, body BLOB, size INTEGER,"
+            " fetched_at REAL, accessed_at REAL, complete INTEGER DEFAULT 1)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS respostas_lru ON respostas(accessed_at)")
+        self.total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM respostas").fetchone()[0]
+
+    def ttl_for(self, url: str) -> int:
+        return self.domain_ttl.get(host_key(url), self.default_ttl)
+
+    def is_fresh(self, url: str, entry: CacheEntry) -> bool:
+        return time.time() - entry.fetched_at < self.ttl_for(url)
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        key = canonical_url(url)
+        with self.lock:
+            row = self.db.execute(
+                "SELECT final_url, etag, last_modified, content_type, encoding, body,"
+                " fetched_at, complete FROM respostas WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            self.db.execute("UPDATE respostas SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        final_url, etag, lm, ctype, enc, body, fetched_at, complete = row
+        return CacheEntry(key, final_url, etag, lm, ctype, enc, zlib.decompress(body), fetched_at, complete)
+
+    def store(self, url: str, resp: requests.Response, body: Optional[bytes] = None,
+              complete: bool = True) -> None:
+        body = resp.content if body is None else body
+        blob = zlib.compress(body, 6)
+        now = time.time()
+        key = canonical_url(url)
+        with self.lock:
+            old = self.db.execute("SELECT size FROM respostas WHERE key = ?", (key,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO respostas VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                (key, resp.url or url, resp.headers.get("ETag"), resp.headers.get("Last-Modified"),
+                 resp.headers.get("Content-Type"), resp.encoding, blob, len(blob), now, now,
+                 int(complete)))
+            self.total += len(blob) - (old[0] if old else 0)
+            if self.total > self.max_bytes:
+                self._evict()
+
+    def touch(self, url: str) -> None:
+        """Resposta 304: o conteúdo guardado continua valendo por mais um TTL."""
+        now = time.time()
+        with self.lock:
+            self.db.execute("UPDATE respostas SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                            (now, now, canonical_url(url)))
+
+    def _evict(self) -> None:
+        target = int(self.max_bytes * 0.9)
+        rows = self.db.execute("SELECT key, size FROM respostas ORDER BY accessed_at").fetchall()
+        drop = []
+        for key, size in rows:
+            if self.total <= target:
+                break
+            drop.append((key,))
+            self.total -= size
+        self.db.executemany("DELETE FROM respostas WHERE key = ?", drop)
+
+
+def default_cache() -> Optional[HttpCache]:
+    """Cache padrão dos crawlers; HTTP_CACHE=0 desliga."""
+    if os.environ.get("HTTP_CACHE", "1") == "0":
+        return None
+    return HttpCache()
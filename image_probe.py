@@ -0,0 +1,250 @@
+# image_probe.py - checa as imagens antes de criar produto no WooCommerce
+#
+# O WordPress baixa cada `images[].src` de forma síncrona dentro da chamada à
+# API; uma imagem morta ou enorme trava (ou derruba) o produto inteiro. Aqui
+# cada URL recebe um GET com Range dos primeiros KB, só o cabeçalho do arquivo
+# é lido (formato e dimensões) e o resultado fica em cache por URL.
+#
+#   python image_probe.py https://m.media-amazon.com/images/I/xxx._AC_UL300_.jpg ...
+import os, re, sys, json, time, struct, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import requests
+
+from fetcher import Fetcher
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.environ.get("IMAGE_CACHE_PATH") or os.path.join(BASE_DIR, ".cache", "imagens", "sondagens.json")
+
+WORKERS = int(os.environ.get("IMAGE_WORKERS", "16"))
+TIMEOUT = 10
+HEAD_BYTES = 64 * 1024                  # JPEG com EXIF grande pode ter o SOF depois de 32 KB
+MAX_BYTES = int(float(os.environ.get("IMAGE_MAX_MB", "5")) * 1024 * 1024)
+MAX_PIXELS = 25_000_000
+MIN_SIDE = int(os.environ.get("IMAGE_MIN_SIDE", "200"))
+SIZE = int(os.environ.get("IMAGE_SIZE", "1000"))   # lado pedido às CDNs que aceitam
+TTL_OK = 7 * 24 * 3600
+TTL_ERR = 6 * 3600
+# o que fazer com produto sem imagem utilizável: "sem_imagem" (envia sem) ou "descartar"
+POLICY = os.environ.get("IMAGE_POLICY", "sem_imagem")
+
+HDRS = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                      "Chrome/124.0 Safari/537.36",
+        "Accept": "image/avif,image/webp,image/*,*/*;q=0.8"}
+
+# Amazon: ._AC_UL300_.jpg, ._AC_SX342_.jpg, ._SL500_.jpg ... -> ._AC_SL1000_.jpg
+AMAZON_RX = re.compile(r"\._[A-Z0-9_,]+_\.(jpe?g|png|webp)$", re.I)
+# Mercado Livre: D_NQ_NP_123-MLB456-I.jpg (I/V = miniaturas) -> -O (original)
+ML_RX = re.compile(r"(mlstatic\.com/.+-)[IVFS](\.(?:jpe?g|webp))$", re.I)
+
+
+def upsize(url: str, size: int = SIZE) -> str:
+    """Troca miniaturas conhecidas por uma versão de `size` px."""
+    if "media-amazon.com" in url or "ssl-images-amazon.com" in url:
+        return AMAZON_RX.sub(lambda m: f"._AC_SL{size}_.{m.group(1)}", url)
+    if "mlstatic.com" in url:
+        return ML_RX.sub(r"\1O\2", url)
+    return url
+
+
+def sniff(head: bytes) -> Optional[Tuple[str, int, int]]:
+    """(formato, largura, altura) a partir dos primeiros bytes, ou None se
+    ainda não deu para saber (ou não é imagem)."""
+    if head[:8] == b"\x89PNG\r\n\x1a\n" and len(head) >= 24:
+        w, h = struct.unpack(">II", head[16:24])
+        return "png", w, h
+    if head[:4] == b"GIF8" and len(head) >= 10:
+        w, h = struct.unpack("<HH", head[6:10])
+        return "gif", w, h
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP" and len(head) >= 30:
+        chunk = head[12:16]
+        if chunk == b"VP8 ":
+            w, h = struct.unpack("<HH", head[26:30])
+            return "webp", w & 0x3FFF, h & 0x3FFF
+        if chunk == b"VP8L":
+            b = struct.unpack("<I", head[21:25])[0]
+            return "webp", (b & 0x3FFF) + 1, ((b >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return "webp", 1 + int.from_bytes(head[24:27], "little"), 1 + int.from_bytes(head[27:30], "little")
+        return None
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        i = head.find(b"ispe")
+        if i < 0 or len(head) < i + 16:
+            return None
+        w, h = struct.unpack(">II", head[i + 8:i + 16])
+        return "avif", w, h
+    if head[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 <= len(head):
+            if head[i] != 0xFF:
+                i += 1
+                continue
+            marker = head[i + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+                i += 1 if marker == 0xFF else 2
+                continue
+            if marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+                h, w = struct.unpack(">HH", head[i + 5:i + 9])
+                return "jpeg", w, h
+            i += 2 + struct.unpack(">H", head[i + 2:i + 4])[0]
+        return None
+    return None
+
+
+def _total(r: requests.Response) -> Optional[int]:
+    cr = r.headers.get("Content-Range", "")
+    if "/" in cr and cr.rsplit("/", 1)[1].isdigit():
+        return int(cr.rsplit("/", 1)[1])
+    cl = r.headers.get("Content-Length", "")
+    return int(cl) if r.status_code == 200 and cl.isdigit() else None
+
+
+def verdict(info: Dict) -> str:
+    """ok | quebrada | pesada | pequena | indefinida. Só "ok" vai para a API;
+    "indefinida" (rede, circuito aberto, 429/5xx) não condena a imagem."""
+    status = info.get("status")
+    if status == "erro" or status == 429 or (isinstance(status, int) and status >= 500):
+        return "indefinida"
+    if status not in (200, 206) or not info.get("fmt"):
+        return "quebrada"
+    if (info.get("bytes") or 0) > MAX_BYTES or info["w"] * info["h"] > MAX_PIXELS:
+        return "pesada"
+    if min(info["w"], info["h"]) < MIN_SIDE:
+        return "pequena"
+    return "ok"
+
+
+def probe(session, url: str) -> Dict:
+    """Um GET com Range: lê até achar as dimensões (ou HEAD_BYTES) e fecha.
+    Servidor que ignora Range responde 200 e o resto do corpo nem é baixado."""
+    info = {"status": "erro", "fmt": None, "w": 0, "h": 0, "bytes": None}
+    try:
+        r = session.get(url, headers={"Range": f"bytes=0-{HEAD_BYTES - 1}"}, stream=True, timeout=TIMEOUT)
+    except requests.RequestException:
+        return info
+    try:
+        info["status"] = r.status_code
+        info["bytes"] = _total(r)
+        if r.status_code not in (200, 206):
+            return info
+        head = b""
+        for chunk in r.iter_content(8192):
+            head += chunk
+            found = sniff(head)
+            if found or len(head) >= HEAD_BYTES:
+                break
+        else:
+            found = sniff(head)
+        if found:
+            info["fmt"], info["w"], info["h"] = found
+    except requests.RequestException:
+        info["status"] = "erro"
+    finally:
+        r.close()
+    return info
+
+
+class ImageProbe:
+    """Sondagem concorrente com cache em disco ({url: info + ts}). Imagem
+    quebrada expira antes (TTL_ERR); falha de rede nem entra no cache, para
+    uma CDN fora do ar não condenar a imagem."""
+
+    def __init__(self, path: str = CACHE_PATH, workers: int = WORKERS, session: Optional[Fetcher] = None):
+        self.path = path
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.items: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.items = json.load(f)
+        # CDNs de imagem aguentam bem mais que as páginas; o AIMD recua se reclamarem
+        self.session = session or Fetcher(headers=HDRS, timeout=TIMEOUT, max_in_flight=workers,
+                                          rate=50, burst=8, retries=2, host_max=workers)
+        self.stats = {"sondadas": 0, "cache": 0}
+
+    def _cached(self, url: str) -> Optional[Dict]:
+        it = self.items.get(url)
+        if not it:
+            return None
+        v = verdict(it)
+        if v == "indefinida":
+            return None
+        ttl = TTL_OK if v != "quebrada" else TTL_ERR
+        return it if time.time() - it.get("ts", 0) < ttl else None
+
+    def _probe(self, url: str) -> Dict:
+        info = dict(probe(self.session, url), ts=int(time.time()))
+        with self.lock:
+            self.items[url] = info
+            self.stats["sondadas"] += 1
+        return info
+
+    def check(self, urls: Iterable[str]) -> Dict[str, Dict]:
+        urls = list(dict.fromkeys(u for u in urls if u and u.startswith("http")))
+        out = {}
+        pending = []
+        for u in urls:
+            hit = self._cached(u)
+            if hit:
+                out[u] = hit
+            else:
+                pending.append(u)
+        with self.lock:
+            self.stats["cache"] += len(urls) - len(pending)
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(pending)))) as pool:
+                out.update(zip(pending, pool.map(self._probe, pending)))
+        return out
+
+    def preflight(self, urls: Iterable[str]) -> Dict[str, Optional[str]]:
+        """url original -> url a enviar (maior, se a CDN aceitar) ou None.
+        A versão ampliada é tentada primeiro; se falhar, vale a original. Só
+        um veredito definitivo (4xx, não é imagem, pesada/pequena) dá None;
+        sem resposta da CDN a original segue como está."""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        big = {u: upsize(u) for u in urls}
+        first = self.check(big.values())
+        out: Dict[str, Optional[str]] = {}
+        retry = []
+        for u in urls:
+            if verdict(first.get(big[u], {})) == "ok":
+                out[u] = big[u]
+            elif big[u] != u:
+                retry.append(u)
+            else:
+                out[u] = u if verdict(first.get(u, {})) == "indefinida" else None
+        second = self.check(retry)
+        for u in retry:
+            out[u] = u if verdict(second.get(u, {})) in ("ok", "indefinida") else None
+        return out
+
+    def usable(self, url: str) -> Optional[str]:
+        return self.preflight([url]).get(url) if url else None
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with self.lock, open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.items, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+
+def main():
+    urls = sys.argv[1:]
+    if not urls:
+        print("uso: python image_probe.py URL [URL ...]")
+        return
+    p = ImageProbe()
+    t0 = time.time()
+    best = p.preflight(urls)
+    for u in urls:
+        final = best.get(u)
+        info = p.items.get(final or upsize(u)) or p.items.get(u) or {}
+        print(json.dumps({"url": u, "enviar": final, "veredito": verdict(info), **info}, ensure_ascii=False))
+    p.save()
+    print(json.dumps(dict(p.stats, segundos=round(time.time() - t0, 2))))
+
+
+if __name__ == "__main__":
+    main()
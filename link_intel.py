@@ -0,0 +1,251 @@
+# link_intel.py - resolve links curtos e classifica os links de inteligencia_links
+#
+#   python link_intel.py                 # só as linhas novas
+#   python link_intel.py --refazer       # reclassifica tudo (resoluções seguem em cache)
+#
+# Encurtadores (s.shopee, mercadolivre.com/sec, vt.tiktok, bit.ly, share do
+# Facebook...) são seguidos com HEAD em paralelo; o destino final fica num
+# cache em disco. Cada URL final é classificada por regras pré-compiladas por
+# domínio em produto / video / ajuda / social / desconhecido.
+import os, re, json, time, argparse, threading, urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+from canonical import product_key
+from fetcher import Fetcher
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LINKS_DIR = os.path.join(BASE_DIR, "inteligencia_links")
+SOURCES = [os.path.join(LINKS_DIR, "links_extraidos.txt"), os.path.join(LINKS_DIR, "FILTRO_LUCRO_ALTO.txt")]
+OUT_PATH = os.path.join(LINKS_DIR, "links_classificados.json")
+RESOLVED_PATH = os.path.join(LINKS_DIR, "links_resolvidos.json")
+CACHE_PATH = os.environ.get("LINK_CACHE_PATH") or os.path.join(BASE_DIR, ".cache", "links", "resolucoes.json")
+
+WORKERS = int(os.environ.get("LINK_WORKERS", "16"))
+TIMEOUT = 12
+MAX_HOPS = 8
+RETRY_FAILED_S = 24 * 3600   # resolução que falhou é tentada de novo depois disso
+FAILED = ("erro", "parcial")
+
+HDRS = {"User-Agent": "Mozilla/5.0 (Linux; Android 13) AppleWebKit/537.36 (KHTML, like Gecko) "
+                      "Chrome/124.0 Mobile Safari/537.36",
+        "Accept-Language": "pt-BR,pt;q=0.9"}
+
+URL_RX = re.compile(r"https?://[^\s\"'<>]+")
+
+# tipo -> chave em links_classificados.json (as demais chaves do arquivo são manuais e ficam intactas)
+BUCKETS = {"produto": "produtos", "video": "video_viral", "ajuda": "ajuda", "social": "social",
+           "desconhecido": "desconhecido"}
+# baldes curados à mão: só recebem links novos, nada sai deles
+CURATED = {"video_viral"}
+
+# (sufixo do host, prefixo do path ou None = qualquer): só esses são seguidos
+SHORTENERS = [
+    ("s.shopee.com.br", None), ("shope.ee", None), ("mercadolivre.com", "/sec/"),
+    ("vt.tiktok.com", None), ("vm.tiktok.com", None), ("bit.ly", None), ("amzn.to", None),
+    ("tinyurl.com", None), ("facebook.com", "/share/"), ("fb.watch", None), ("youtu.be", None),
+    ("a.co", None), ("magazinevoce.com.br", None), ("compre.vc", None),
+]
+
+# regras por domínio, na ordem: primeira que casar decide
+_RULES = {
+    "mercadolivre.com.br": [(r"^/(ajuda|central-de-ajuda|privacidade|termos)", "ajuda"),
+                            (r"^/(social|perfil)/", "social")],
+    "shopee.com.br": [(r"^/(help|buyer/help)", "ajuda")],
+    "help.shopee.com.br": [(r"", "ajuda")],
+    "amazon.com.br": [(r"^/(gp/help|hz|ap/|gp/css)", "ajuda")],
+    "instagram.com": [(r"^/(reels?|tv)/", "video"), (r"", "social")],
+    "facebook.com": [(r"^/(reel|watch|share/[rv])/|/videos/", "video"), (r"", "social")],
+    "fb.watch": [(r"", "video")],
+    "tiktok.com": [(r"/video/|^/t/", "video"), (r"", "social")],
+    "vt.tiktok.com": [(r"", "video")],
+    "youtube.com": [(r"^/(shorts|watch|live)", "video"), (r"", "social")],
+    "youtu.be": [(r"", "video")],
+    "kwai.com": [(r"", "video")],
+    "t.me": [(r"", "social")], "wa.me": [(r"", "social")], "chat.whatsapp.com": [(r"", "social")],
+    "linktr.ee": [(r"", "social")], "pinterest.com": [(r"", "social")], "x.com": [(r"", "social")],
+    "twitter.com": [(r"", "social")],
+}
+RULES: Dict[str, List[Tuple[re.Pattern, str]]] = {
+    host: [(re.compile(rx, re.I), tipo) for rx, tipo in rules] for host, rules in _RULES.items()
+}
+
+
+def _suffixes(host: str) -> Iterable[str]:
+    parts = host.split(".")
+    for i in range(len(parts) - 1):
+        yield ".".join(parts[i:])
+
+
+def is_short(url: str) -> bool:
+    u = urllib.parse.urlsplit(url)
+    host = (u.hostname or "").lower()
+    for suffix, prefix in SHORTENERS:
+        if (host == suffix or host.endswith("." + suffix)) and (prefix is None or u.path.startswith(prefix)):
+            return True
+    return False
+
+
+def classify(url: str) -> str:
+    if not product_key(url).startswith("URL:"):
+        return "produto"
+    u = urllib.parse.urlsplit(url)
+    for suffix in _suffixes((u.hostname or "").lower()):
+        for rx, tipo in RULES.get(suffix, ()):
+            if rx.search(u.path or "/"):
+                return tipo
+    return "desconhecido"
+
+
+class ResolutionCache:
+    """{url curta: {"final", "status", "ts"}} em JSON, salvo de forma atômica."""
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self.items: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.items = json.load(f)
+
+    def get(self, url: str) -> Optional[Dict]:
+        it = self.items.get(url)
+        if it and it.get("status") in FAILED and time.time() - it.get("ts", 0) > RETRY_FAILED_S:
+            return None
+        return it
+
+    def set(self, url: str, final: str, status) -> None:
+        with self.lock:
+            self.items[url] = {"final": final, "status": status, "ts": int(time.time())}
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with self.lock, open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.items, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+
+def make_session(workers: int = WORKERS) -> Fetcher:
+    # encurtador fora do ar abre o circuito e o resto do lote falha na hora
+    return Fetcher(headers=HDRS, timeout=TIMEOUT, max_in_flight=workers, rate=20, burst=4,
+                   retries=2, host_max=workers)
+
+
+def resolve(session: Fetcher, url: str) -> Tuple[str, object]:
+    """Segue Location salto a salto com HEAD (sem baixar corpo). Se o
+    servidor recusar HEAD, tenta GET em stream e fecha sem ler. Devolve
+    (URL final, status HTTP | "parcial" | "erro" | "loop")."""
+    cur = url
+    for hop in range(MAX_HOPS):
+        try:
+            r = session.head(cur, allow_redirects=False, timeout=TIMEOUT)
+            if r.status_code in (403, 404, 405, 501):
+                r = session.get(cur, allow_redirects=False, timeout=TIMEOUT, stream=True)
+                r.close()
+        except requests.RequestException:
+            # o destino já é conhecido mesmo que ele não responda
+            return cur, "parcial" if hop else "erro"
+        loc = r.headers.get("Location")
+        if r.is_redirect and loc:
+            cur = urllib.parse.urljoin(cur, loc)
+            continue
+        return cur, r.status_code
+    return cur, "loop"
+
+
+def extract_links(path: str) -> List[str]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return [m.group(0).rstrip(".,);") for m in URL_RX.finditer(f.read())]
+
+
+def load_json(path: str, default):
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return default
+
+
+def save_json(path: str, data) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp, path)
+
+
+def run(sources: List[str] = SOURCES, workers: int = WORKERS, redo: bool = False) -> Dict:
+    t0 = time.time()
+    buckets = load_json(OUT_PATH, {})
+    resolved: Dict[str, Dict] = {} if redo else load_json(RESOLVED_PATH, {})
+
+    # entradas: arquivos de links + o que já estava nos baldes automáticos
+    links: List[str] = []
+    for path in sources:
+        links += extract_links(path)
+    for key in BUCKETS.values():
+        links += [u for u in buckets.get(key, []) if isinstance(u, str)]
+    links = list(dict.fromkeys(l.strip() for l in links if l.strip()))
+    # resolução que falhou volta para a fila (o cache decide quando tentar de novo)
+    novos = [u for u in links if u not in resolved or resolved[u].get("status") in FAILED]
+
+    cache = ResolutionCache()
+    session = make_session(workers)
+    pending = [u for u in novos if is_short(u) and cache.get(u) is None]
+
+    def work(u: str):
+        final, status = resolve(session, u)
+        cache.set(u, final, status)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(work, pending))
+        cache.save()
+
+    for u in novos:
+        hit = cache.get(u) if is_short(u) else None
+        final = hit["final"] if hit and hit.get("status") != "erro" else u
+        resolved[u] = {"final": final, "tipo": classify(final)}
+        if hit and hit.get("status") in FAILED:
+            resolved[u]["status"] = hit["status"]
+        if final != u and resolved[u]["tipo"] == "desconhecido":
+            # destino desconhecido (ex.: tela de login): o link curto ainda diz algo
+            resolved[u]["tipo"] = classify(u)
+
+    # baldes automáticos refeitos a partir do estado; chaves manuais preservadas
+    # e os curados só ganham entradas
+    curated = {u for key in CURATED for u in buckets.get(key, []) if isinstance(u, str)}
+    for key in BUCKETS.values():
+        if key in CURATED:
+            buckets.setdefault(key, [])
+        else:
+            buckets[key] = []
+    for u in links:
+        if u in curated:
+            continue
+        buckets[BUCKETS[resolved[u]["tipo"]]].append(u)
+    buckets = {k: v for k, v in buckets.items() if v or k not in BUCKETS.values()}
+    save_json(OUT_PATH, buckets)
+    save_json(RESOLVED_PATH, resolved)
+
+    por_tipo: Dict[str, int] = {}
+    for u in links:
+        por_tipo[resolved[u]["tipo"]] = por_tipo.get(resolved[u]["tipo"], 0) + 1
+    return {"linhas": len(links), "novas": len(novos), "resolvidas_http": len(pending),
+            "por_tipo": por_tipo, "segundos": round(time.time() - t0, 2)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Resolve e classifica os links de inteligencia_links.")
+    ap.add_argument("arquivos", nargs="*", help="arquivos de links (padrão: links_extraidos + FILTRO_LUCRO_ALTO)")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--refazer", action="store_true", help="reclassifica tudo; resoluções seguem em cache")
+    args = ap.parse_args()
+    print(json.dumps(run(args.arquivos or SOURCES, args.workers, args.refazer), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+# merchants.py - um extrator por loja e um agendador de listagens em paralelo
+#
+# Cada loja é uma subclasse de Merchant registrada em REGISTRY: declara as
+# listagens (categorias fixas e/ou uma página de onde descobri-las), como
+# paginar, os seletores CSS de cada campo do card (tuplas: vale o primeiro
+# que casar) e as regras de afiliado. O Scheduler roda os jobs
+# (loja, listagem, página) num pool só, sem deixar uma loja lenta ocupar
+# todas as vagas, e devolve um fluxo único de ofertas normalizadas, sem
+# repetir produto (chave de canonical.product_key).
+#
+#   python merchants.py                          # todas as lojas -> ProductSink + catalog.py
+#   python merchants.py amazon mercadolivre --paginas 5 --categorias 10
+import os, sys, json, time, threading, argparse, urllib.parse
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from bs4 import BeautifulSoup
+
+from canonical import canonical_url, product_key
+import metrics
+from fetcher import Fetcher
+from price import parse_price
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
+}
+
+MAX_PAGES = int(os.environ.get("MERCHANT_MAX_PAGES", "20"))
+MAX_CATEGORIES = int(os.environ.get("MERCHANT_MAX_CATEGORIES", "60"))
+LOOKAHEAD = 2       # páginas pedidas além da última que veio cheia
+
+Selectors = Tuple[str, ...]
+
+
+def _first(node, selectors: Selectors):
+    for sel in selectors:
+        hit = node.select_one(sel)
+        if hit is not None:
+            return hit
+    return None
+
+
+def _text(node, sep: str = " ") -> str:
+    return " ".join(node.get_text(sep).split()) if node is not None else ""
+
+
+def _img(node) -> str:
+    if node is None:
+        return ""
+    src = node.get("src") or node.get("data-src") or ""
+    if not src.startswith("http"):
+        srcset = node.get("srcset") or node.get("data-srcset") or ""
+        src = srcset.split(",")[0].split(" ")[0] if srcset else src
+    return src if src.startswith("http") else ""
+
+
+def with_params(url: str, params: Dict[str, str]) -> str:
+    parts = urllib.parse.urlsplit(url)
+    q = dict(urllib.parse.parse_qsl(parts.query, keep_blank_values=True))
+    q.update({k: str(v) for k, v in params.items()})
+    return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(q)))
+
+
+class Merchant:
+    """Extrator de listagens de uma loja. As subclasses só declaram
+    atributos; sobrescrevem métodos quando a loja foge do padrão HTML."""
+
+    name = ""                   # chave no REGISTRY e na linha de comando
+    store = ""                  # prefixo da chave de produto (AMZN, ML, ...)
+    domain = ""
+    base = ""
+    listings: Sequence[str] = ()        # categorias fixas
+    discover_url = ""                   # página com os links das categorias
+    discover: Selectors = ()
+    page_param = "page"
+    page_extra: Dict[str, str] = {}
+    max_pages = MAX_PAGES
+    # campos do card
+    card: Selectors = ()
+    link: Selectors = ("a[href]",)
+    title: Selectors = ()
+    price: Selectors = ()
+    image: Selectors = ("img",)
+    # afiliado: parâmetro -> (variável de ambiente, padrão); deeplink_env, se
+    # definida, é um modelo com {url} (Awin, Lomadee...) aplicado por último
+    affiliate_params: Dict[str, Tuple[str, str]] = {}
+    deeplink_env = ""
+
+    def categories(self, fetcher) -> List[str]:
+        found = list(self.listings)
+        if self.discover_url:
+            r = fetcher.get(self.discover_url)
+            r.raise_for_status()
+            soup = BeautifulSoup(r.text, "lxml")
+            for sel in self.discover:
+                for a in soup.select(sel):
+                    u = self.listing_url(urllib.parse.urljoin(self.base, a.get("href", "")))
+                    if u:
+                        found.append(u)
+        return list(dict.fromkeys(found))
+
+    def listing_url(self, url: str) -> Optional[str]:
+        # link descoberto -> listagem canônica (None descarta)
+        return url.split("#")[0] or None
+
+    def label(self, listing: str) -> str:
+        # nome curto da listagem para a coluna de categoria
+        return urllib.parse.urlsplit(listing).path.strip("/").split("/")[0] or listing
+
+    def page_url(self, listing: str, page: int) -> str:
+        return with_params(listing, dict(self.page_extra, **{self.page_param: page}))
+
+    def parse(self, text: str) -> Iterator[Dict]:
+        """Cards da página como {url, name, price_text, image_url}."""
+        soup = BeautifulSoup(text, "lxml")
+        cards: list = []
+        for sel in self.card:
+            cards = soup.select(sel)
+            if cards:
+                break
+        for card in cards:
+            a = card if card.name == "a" and card.get("href") else _first(card, self.link)
+            if a is None or not a.get("href"):
+                continue
+            img = _first(card, self.image)
+            name = _text(_first(card, self.title)) or (img.get("alt", "") if img is not None else "") \
+                or a.get("title", "")
+            yield {"url": urllib.parse.urljoin(self.base, a["href"]),
+                   "name": " ".join(name.split()),
+                   "price_text": self.price_text(_first(card, self.price)),
+                   "image_url": _img(img)}
+
+    def price_text(self, node) -> str:
+        return _text(node, "")
+
+    def affiliate(self, url: str) -> str:
+        params = {p: os.environ.get(env, default) for p, (env, default) in self.affiliate_params.items()}
+        params = {k: v for k, v in params.items() if v}
+        if params:
+            url = with_params(url, params)
+        tpl = os.environ.get(self.deeplink_env, "") if self.deeplink_env else ""
+        return tpl.format(url=urllib.parse.quote(url, safe="")) if "{url}" in tpl else url
+
+    def normalize(self, raw: Dict, listing: str, page: int, rank: int) -> Optional[Dict]:
+        key = product_key(raw["url"])
+        if not key.startswith(self.store + ":"):
+            return None     # link de anúncio, busca, outra loja...
+        url = canonical_url(raw["url"])
+        p = parse_price(raw.get("price_text")) if raw.get("price_text") else None
+        return {
+            "key": key,
+            "url": url,
+            "affiliate_url": self.affiliate(url),
+            "merchant_domain": self.domain,
+            "store": self.store,
+            "name": raw.get("name") or "",
+            "price": float(p.amount) if p and p.amount is not None else None,
+            "currency": (p.currency if p and p.amount is not None else None) or "BRL",
+            "image_url": raw.get("image_url") or "",
+            "category": self.label(listing),
+            "listing": listing,
+            "page": page,
+            "rank": rank,
+            "ts": int(time.time()),
+        }
+
+    def scrape(self, fetcher, listing: str, page: int) -> List[Dict]:
+        r = fetcher.get(self.page_url(listing, page))
+        r.raise_for_status()
+        out = []
+        with metrics.timed("parse", parser=self.name):
+            for raw in self.parse(r.text):
+                rec = self.normalize(raw, listing, page, len(out))
+                if rec:
+                    out.append(rec)
+        return out
+
+
+REGISTRY: Dict[str, Merchant] = {}
+
+
+def register(cls):
+    REGISTRY[cls.name] = cls()
+    return cls
+
+
+@register
+class Amazon(Merchant):
+    name, store, domain = "amazon", "AMZN", "amazon.com.br"
+    base = "https://www.amazon.com.br"
+    # mais vendidos: cada categoria tem 2 páginas de 50 (só ~30 vêm no HTML)
+    discover_url = "https://www.amazon.com.br/gp/bestsellers/"
+    discover = ("div[role='treeitem'] a[href*='/gp/bestsellers/']", "a[href*='/gp/bestsellers/']")
+    listings = tuple(f"https://www.amazon.com.br/gp/bestsellers/{c}/" for c in (
+        "kitchen", "electronics", "computers", "home", "appliances", "videogames", "beauty", "hpc",
+        "toys", "sports", "pet-products", "baby", "office-products", "automotive", "hi", "books"))
+    page_param = "pg"
+    max_pages = 2
+    card = ("div[id^='p13n-asin-index-']", ".zg-grid-general-faceout")
+    link = ("a.a-link-normal[href*='/dp/']", "a[href*='/dp/']")
+    title = ("div[class*='p13n-sc-css-line-clamp']", "._cDEzb_p13n-sc-css-line-clamp-3_g3dy1")
+    price = ("span[class*='p13n-sc-price']", ".a-color-price", "span.a-price > span.a-offscreen")
+    affiliate_params = {"tag": ("AMAZON_TAG", "ctctechstore-20")}
+
+    def listing_url(self, url):
+        # /gp/bestsellers/kitchen/ref=zg_bs_nav_kitchen_0 -> /gp/bestsellers/kitchen/
+        path = urllib.parse.urlsplit(url).path.split("/ref=")[0].strip("/").split("/")
+        if len(path) != 3 or path[:2] != ["gp", "bestsellers"]:
+            return None
+        return f"{self.base}/gp/bestsellers/{path[2]}/"
+
+    def label(self, listing):
+        return listing.rstrip("/").rsplit("/", 1)[-1]
+
+
+@register
+class MercadoLivre(Merchant):
+    name, store, domain = "mercadolivre", "ML", "mercadolivre.com.br"
+    base = "https://www.mercadolivre.com.br"
+    listings = (
+        "https://www.mercadolivre.com.br/ofertas",
+        "https://www.mercadolivre.com.br/ofertas?promotion_type=lightning",
+        "https://www.mercadolivre.com.br/ofertas?promotion_type=deal_of_the_day",
+    )
+    card = ("div.poly-card", "li.promotion-item")
+    link = ("a.poly-component__title", "a.promotion-item__link-container", "a[href]")
+    title = ("a.poly-component__title", ".poly-component__title", ".promotion-item__title")
+    price = (".poly-price__current .andes-money-amount", ".andes-money-amount", ".promotion-item__price")
+    image = ("img.poly-component__picture", "img")
+    affiliate_params = {"matt_tool": ("ML_MATT_TOOL", ""), "matt_word": ("ML_MATT_WORD", "")}
+
+    def price_text(self, node):
+        # reais e centavos vêm em spans separados (R$ 89 <cents>90</cents>);
+        # juntos sem separador virariam 8990
+        if node is None:
+            return ""
+        frac = node.select_one(".andes-money-amount__fraction")
+        cents = node.select_one(".andes-money-amount__cents, sup")
+        if frac is None:
+            if cents is None:
+                return _text(node, "")
+            cents.extract()
+            return f"{_text(node, '')},{_text(cents)}"
+        return f"R$ {_text(frac)},{_text(cents) if cents is not None else '00'}"
+
+
+@register
+class KaBuM(Merchant):
+    name, store, domain = "kabum", "KABUM", "kabum.com.br"
+    base = "https://www.kabum.com.br"
+    listings = tuple(f"https://www.kabum.com.br/{c}" for c in (
+        "hardware", "perifericos", "computadores", "celular-smartphone", "tv",
+        "gamer", "espaco-gamer", "eletrodomesticos", "audio", "casa-inteligente"))
+    page_param = "page_number"
+    page_extra = {"page_size": "100"}
+    card = ("article.productCard", "div.productCard")
+    link = ("a.productLink", "a[href*='/produto/']")
+    title = ("span.nameCard", ".nameCard")
+    price = ("span.priceCard", ".priceCard")
+    image = ("img.imageCard", "img")
+    deeplink_env = "KABUM_DEEPLINK"
+
+
+@register
+class Magalu(Merchant):
+    name, store, domain = "magalu", "MAGALU", "magazineluiza.com.br"
+    base = "https://www.magazineluiza.com.br"
+    listings = tuple(f"https://www.magazineluiza.com.br/{c}" for c in (
+        "selecao/ofertasdodia/", "celulares-e-smartphones/l/te/", "informatica/l/in/",
+        "tv-e-video/l/et/", "eletrodomesticos/l/ed/", "games/l/ga/", "eletroportateis/l/ep/"))
+    card = ("a[data-testid='product-card-container']", "li[data-testid='product-card-container']")
+    link = ("a[href*='/p/']",)
+    title = ("[data-testid='product-title']", "h2")
+    price = ("[data-testid='price-value']", "[data-testid='price-default']")
+    image = ("img[data-testid='image']", "img")
+
+    def affiliate(self, url):
+        # Magazine Você: a vitrine do parceiro fica no path de outro domínio
+        loja = os.environ.get("MAGALU_VOCE_LOJA", "")
+        if not loja:
+            return url
+        path = urllib.parse.urlsplit(url).path
+        return f"https://www.magazinevoce.com.br/magazine{loja}{path}"
+
+
+@register
+class Shopee(Merchant):
+    """A vitrine da Shopee é montada por JavaScript: as "listagens" são
+    buscas por palavra na API pública de busca (60 por página, mais vendidos
+    primeiro). Quando a API exige sessão, a página falha e conta como erro."""
+
+    name, store, domain = "shopee", "SHOPEE", "shopee.com.br"
+    base = "https://shopee.com.br"
+    listings = ("fone bluetooth", "smartwatch", "carregador", "air fryer", "mouse gamer",
+                "teclado mecanico", "ssd", "caixa de som", "luminaria led", "organizador")
+    max_pages = 5
+    per_page = 60
+    api = "https://shopee.com.br/api/v4/search/search_items"
+    affiliate_params = {"af_siteid": ("SHOPEE_AFFILIATE_ID", "")}
+
+    def page_url(self, listing, page):
+        return with_params(self.api, {"by": "sales", "keyword": listing, "limit": self.per_page,
+                                      "newest": (page - 1) * self.per_page, "order": "desc",
+                                      "page_type": "search", "scenario": "PAGE_GLOBAL_SEARCH", "version": 2})
+
+    def label(self, listing):
+        return listing
+
+    def parse(self, text):
+        try:
+            items = json.loads(text).get("items") or []
+        except ValueError:
+            return
+        for it in items:
+            b = it.get("item_basic") or it
+            if not b.get("itemid") or not b.get("shopid"):
+                continue
+            price = b.get("price_min") or b.get("price")
+            yield {"url": f"{self.base}/product/{b['shopid']}/{b['itemid']}",
+                   "name": b.get("name") or "",
+                   # a API devolve o preço multiplicado por 100000
+                   "price_text": f"{price / 100000:.2f}" if price else "",
+                   "image_url": f"https://down-br.img.susercontent.com/file/{b['image']}" if b.get("image") else ""}
+
+
+def get(name: str) -> Merchant:
+    try:
+        return REGISTRY[name]
+    except KeyError:
+        raise KeyError(f"loja desconhecida: {name} (disponíveis: {', '.join(REGISTRY)})") from None
+
+
+class Scheduler:
+    """Roda (loja, listagem, página) em paralelo. A descoberta de categorias
+    e a página 1 de cada listagem entram primeiro; uma página cheia libera
+    as próximas LOOKAHEAD, uma vazia (ou só com repetidos) encerra a
+    listagem. Cada loja ocupa no máximo `per_merchant` vagas, e a vaga livre
+    vai para a loja com menos jobs rodando."""
+
+    def __init__(self, fetcher: Optional[Fetcher] = None, pages: Optional[int] = None,
+                 max_categories: int = MAX_CATEGORIES, per_merchant: Optional[int] = None,
+                 budget_s: Optional[float] = None):
+        self.fetcher = fetcher or Fetcher(headers=HEADERS, timeout=25)
+        self.pages = pages
+        self.max_categories = max_categories
+        self.per_merchant = per_merchant or self.fetcher.host_max
+        self.budget_s = budget_s
+        self.lock = threading.Lock()
+        self.stats = {"paginas": 0, "erros": 0, "ofertas": 0, "repetidas": 0, "listagens": 0}
+        self.errors: List[Tuple[str, str, str]] = []
+
+    def _job(self, m: Merchant, listing: Optional[str], page: int):
+        if listing is None:
+            return m.categories(self.fetcher)[:self.max_categories]
+        return m.scrape(self.fetcher, listing, page)
+
+    def run(self, merchants: Iterable[Merchant]) -> Iterator[Dict]:
+        merchants = list(merchants)
+        t0 = time.monotonic()
+        queues: Dict[str, deque] = {m.name: deque([(m, None, 0)]) for m in merchants}
+        running: Dict[str, int] = {m.name: 0 for m in merchants}
+        requested: Dict[Tuple[str, str], int] = {}     # maior página já enfileirada
+        closed = set()
+        seen = set()
+        pool = ThreadPoolExecutor(max_workers=self.fetcher.max_in_flight)
+        pending = {}
+
+        def submit_ready():
+            while len(pending) < self.fetcher.max_in_flight:
+                ready = [n for n, q in queues.items() if q and running[n] < self.per_merchant]
+                if not ready:
+                    return
+                n = min(ready, key=running.get)
+                m, listing, page = queues[n].popleft()
+                if listing is not None and (n, listing) in closed:
+                    continue
+                running[n] += 1
+                pending[pool.submit(self._job, m, listing, page)] = (m, listing, page)
+
+        def enqueue(m: Merchant, listing: str, upto: int):
+            last = min(upto, self.pages or m.max_pages)
+            for p in range(requested.get((m.name, listing), 0) + 1, last + 1):
+                queues[m.name].append((m, listing, p))
+            requested[(m.name, listing)] = max(last, requested.get((m.name, listing), 0))
+
+        try:
+            submit_ready()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    m, listing, page = pending.pop(fut)
+                    running[m.name] -= 1
+                    try:
+                        got = fut.result()
+                    except Exception as e:
+                        self.stats["erros"] += 1
+                        self.errors.append((m.name, listing or "(categorias)", repr(e)[:200]))
+                        if listing is not None:
+                            closed.add((m.name, listing))
+                        continue
+                    if listing is None:
+                        self.stats["listagens"] += len(got)
+                        for cat in got:
+                            enqueue(m, cat, 1)
+                        continue
+                    self.stats["paginas"] += 1
+                    fresh = 0
+                    for rec in got:
+                        if rec["key"] in seen:
+                            self.stats["repetidas"] += 1
+                            continue
+                        seen.add(rec["key"])
+                        fresh += 1
+                        self.stats["ofertas"] += 1
+                        yield rec
+                    if fresh:
+                        enqueue(m, listing, page + LOOKAHEAD)
+                    else:
+                        closed.add((m.name, listing))
+                if self.budget_s is not None and time.monotonic() - t0 > self.budget_s:
+                    for q in queues.values():
+                        q.clear()
+                submit_ready()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def crawl(names: Optional[Sequence[str]] = None, **kwargs) -> Iterator[Dict]:
+    """Fluxo de ofertas das lojas pedidas (todas, se nenhuma)."""
+    return Scheduler(**kwargs).run(get(n) for n in (names or list(REGISTRY)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="ofertas das listagens das lojas -> ProductSink e catálogo")
+    ap.add_argument("lojas", nargs="*", help=f"padrão: todas ({', '.join(REGISTRY)})")
+    ap.add_argument("--paginas", type=int, default=None, help="máximo de páginas por listagem")
+    ap.add_argument("--categorias", type=int, default=MAX_CATEGORIES)
+    ap.add_argument("--orcamento", type=float, default=None, help="segundos para parar de agendar")
+    args = ap.parse_args()
+
+    from catalog import Catalog
+    from product_sink import ProductSink
+    from price_history import PriceHistory
+
+    metrics.start_run("merchants")
+    sched = Scheduler(pages=args.paginas, max_categories=args.categorias, budget_s=args.orcamento)
+    sink, hist, cat = ProductSink(), PriceHistory(), Catalog()
+    t0 = time.time()
+    batch, new, upd = [], 0, 0
+    for rec in sched.run(get(n) for n in (args.lojas or list(REGISTRY))):
+        if rec["price"]:
+            hist.observe(rec["key"], rec["price"], rec["ts"])
+        batch.append(rec)
+        if len(batch) >= 200:
+            new += sink.extend(batch)
+            upd += cat.upsert(batch, "merchants")["atualizados"]
+            batch = []
+    new += sink.extend(batch)
+    upd += cat.upsert(batch, "merchants")["atualizados"]
+    for loja, listing, err in sched.errors[:20]:
+        print(f"[erro] {loja} {listing}: {err}", file=sys.stderr)
+    print(json.dumps(dict(sched.stats, novas=new, atualizadas_catalogo=upd, segundos=round(time.time() - t0, 1),
+                          hosts=sched.fetcher.host_stats()), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
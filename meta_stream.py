@@ -0,0 +1,212 @@
+# meta_stream.py - extração de metadados de produto sem montar a árvore inteira
+import re, json, codecs
+from html.parser import HTMLParser
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import metrics
+from price import find_price, format_price, parse_price
+
+# depois do </head>, quanto ainda vale a pena ler atrás de preço estruturado
+MAX_SCAN_BYTES = 512 * 1024
+CHUNK_SIZE = 16 * 1024
+
+CHARSET_RX = re.compile(rb"""charset=["']?([\w-]+)""", re.I)
+
+PRICE_KEYS = ("product:price:amount", "og:price:amount", "price")
+CURRENCY_KEYS = ("product:price:currency", "og:price:currency", "pricecurrency")
+
+
+class _Done(Exception):
+    pass
+
+
+def _find_product(node) -> Optional[dict]:
+    if isinstance(node, list):
+        for n in node:
+            p = _find_product(n)
+            if p:
+                return p
+    elif isinstance(node, dict):
+        kind = node.get("@type")
+        if kind == "Product" or (isinstance(kind, list) and "Product" in kind):
+            return node
+        if "@graph" in node:
+            return _find_product(node["@graph"])
+    return None
+
+
+def _offer_price(product: dict) -> Tuple[Optional[str], Optional[str]]:
+    offers = product.get("offers")
+    if isinstance(offers, list):
+        offers = offers[0] if offers else None
+    if not isinstance(offers, dict):
+        return None, None
+    price = offers.get("price") or offers.get("lowPrice")
+    if price is None and isinstance(offers.get("priceSpecification"), dict):
+        price = offers["priceSpecification"].get("price")
+    return (str(price) if price is not None else None), offers.get("priceCurrency")
+
+
+class MetaParser(HTMLParser):
+    """Lê og:*, description, itemprop=price e o primeiro JSON-LD Product à
+    medida que o HTML chega; levanta _Done assim que não há mais o que ler."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta: Dict[str, str] = {}
+        self.title: Optional[str] = None
+        self.h1: Optional[str] = None
+        self.product: Optional[dict] = None
+        self.head_closed = False
+        self._buf = None   # texto em coleta: "title", "h1" ou "ld"
+        self._parts = []
+
+    def has_price(self) -> bool:
+        return bool(self.product and _offer_price(self.product)[0]) or any(k in self.meta for k in PRICE_KEYS)
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "meta" or (tag != "link" and any(k == "itemprop" for k, _ in attrs)):
+            a = dict(attrs)
+            key = (a.get("property") or a.get("name") or a.get("itemprop") or "").lower()
+            content = a.get("content")
+            if key and content and content.strip():
+                self.meta.setdefault(key, content.strip())
+        elif tag == "title" and self.title is None:
+            self._start("title")
+        elif tag == "h1" and self.h1 is None:
+            self._start("h1")
+        elif tag == "script" and (dict(attrs).get("type") or "").lower() == "application/ld+json":
+            self._start("ld")
+        elif tag == "body":
+            self._close_head()
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            self._close_head()
+        elif self._buf and tag == {"title": "title", "h1": "h1", "ld": "script"}[self._buf]:
+            text = "".join(self._parts).strip()
+            kind, self._buf, self._parts = self._buf, None, []
+            if kind == "title":
+                self.title = text
+            elif kind == "h1":
+                self.h1 = " ".join(text.split())
+            else:
+                try:
+                    self.product = _find_product(json.loads(text))
+                except ValueError:
+                    pass
+                if self.product:
+                    raise _Done()
+
+    def handle_data(self, data):
+        if self._buf:
+            self._parts.append(data)
+
+    def _start(self, kind):
+        self._buf, self._parts = kind, []
+
+    def _close_head(self):
+        if self.head_closed:
+            return
+        self.head_closed = True
+        if self.has_price() and (self.title or "og:title" in self.meta):
+            raise _Done()
+
+
+def _fmt_price(amount: str, currency: Optional[str]) -> str:
+    p = parse_price(amount, currency or "BRL")
+    return format_price(p.amount, p.currency) if p.amount is not None else amount
+
+
+def extract_from_chunks(chunks: Iterable[Union[bytes, str]], encoding: Optional[str] = None,
+                        max_bytes: int = MAX_SCAN_BYTES) -> Dict:
+    """Alimenta o parser pedaço a pedaço e para de consumir `chunks` assim que
+    o <head> (ou o primeiro JSON-LD Product) entregou o necessário. O
+    dicionário tem o mesmo formato de crawler.extract_meta, mais `price`,
+    `currency`, `h1` e `bytes` (quanto foi lido)."""
+    p = MetaParser()
+    decoder = None
+    scanned = []
+    read = after_head = 0
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                if not encoding:
+                    m = CHARSET_RX.search(chunk[:4096])
+                    encoding = m.group(1).decode("ascii") if m else "utf-8"
+                try:
+                    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+                except LookupError:
+                    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            read += len(chunk)
+            text = decoder.decode(chunk)
+        else:
+            read += len(chunk)
+            text = chunk
+        scanned.append(text)
+        try:
+            p.feed(text)
+        except _Done:
+            break
+        if p.head_closed:
+            after_head += len(chunk)
+            if after_head > max_bytes:
+                break
+
+    m = p.meta.get
+    title = m("og:title") or p.title or None
+    price = currency = None
+    if p.product:
+        price, currency = _offer_price(p.product)
+        title = title or p.product.get("name")
+    if not price:
+        price = next((m(k) for k in PRICE_KEYS if m(k)), None)
+    currency = currency or next((m(k) for k in CURRENCY_KEYS if m(k)), None)
+
+    if price:
+        price_text = _fmt_price(price, currency)
+    else:
+        found = find_price("".join(scanned))
+        price_text = format_price(found.amount, found.currency) if found.amount is not None else None
+
+    image = m("og:image") or m("twitter:image")
+    if not image and p.product:
+        img = p.product.get("image")
+        image = img[0] if isinstance(img, list) and img else (img if isinstance(img, str) else None)
+
+    return {
+        "title": title,
+        "image": image,
+        "description": m("og:description") or m("description"),
+        "price_text": price_text,
+        "price": price,
+        "currency": currency,
+        "h1": p.h1,
+        "bytes": read,
+    }
+
+
+@metrics.profiled
+@metrics.timed("parse", parser="meta_stream")
+def extract_meta(html_text: str) -> Dict:
+    # mesmo contrato de crawler.extract_meta para quem já tem o HTML em mãos
+    step = CHUNK_SIZE
+    meta = extract_from_chunks(html_text[i:i + step] for i in range(0, len(html_text or ""), step))
+    return {k: meta[k] for k in ("title", "image", "description", "price_text")}
+
+
+@metrics.profiled
+@metrics.timed("crawl_fetch", via="stream")
+def fetch_meta(fetcher, url: str) -> Tuple[Optional[Dict], str]:
+    """Baixa `url` em streaming pelo Fetcher e fecha a conexão assim que o
+    extrator terminar. Devolve (meta, url final) ou (None, url) em erro."""
+    try:
+        final_url, encoding, chunks = fetcher.stream(url, chunk_size=CHUNK_SIZE)
+    except Exception:
+        return None, url
+    try:
+        return extract_from_chunks(chunks, encoding), final_url
+    except Exception:
+        return None, final_url
+    finally:
+        chunks.close()
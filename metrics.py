@@ -0,0 +1,325 @@
+# metrics.py - contadores, histogramas e cronômetros dos caminhos quentes
+#
+# Registro único por processo, criado sob demanda pelo nome:
+#
+#   with metrics.timed("woo_sync", op="batch"): ...      # histograma woo_sync_seconds
+#   @metrics.timed("parse", parser="meta_stream")          # idem, como decorador
+#   metrics.count("products", outcome="created")          # contador products_total
+#   metrics.observe("http_response_bytes", n, buckets=metrics.BYTES, host=h)
+#
+# Saídas: texto do Prometheus (render, rota /metrics do app.py) e um relatório
+# JSON por execução (start_run grava em METRICS_DIR/<job>.json na saída, para
+# o CI guardar como artefato). METRICS=0 desliga tudo; PROFILE_SAMPLE=0.05
+# roda 5% das chamadas decoradas com @profiled sob cProfile.
+import os, sys, glob, json, time, atexit, bisect, random, cProfile, functools, io, pstats, threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS_DIR = os.environ.get("METRICS_DIR") or os.path.join(BASE_DIR, ".cache", "metrics")
+ENABLED = os.environ.get("METRICS", "1") != "0"
+PROFILE_SAMPLE = float(os.environ.get("PROFILE_SAMPLE", "0") or 0)
+PREFIX = "tepi_"
+
+LATENCY = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+HELP = {
+    "http_request_seconds": "Latência de cada tentativa HTTP, por domínio",
+    "http_response_bytes": "Tamanho do corpo baixado, por domínio",
+    "http_requests_total": "Tentativas HTTP por domínio e status",
+    "http_cache_total": "Respostas servidas pelo cache HTTP (hit/revalidated)",
+    "parse_seconds": "Tempo de extração por parser",
+    "serp_fetch_seconds": "Página de SERP (cache ou rede + parse)",
+    "crawl_fetch_seconds": "Download de página de produto no crawler",
+    "stage_seconds": "Etapas dos jobs (feed, imagens, woo, ...)",
+    "woo_sync_seconds": "Chamadas de sincronização com o WooCommerce",
+    "catalog_upsert_seconds": "Gravação em lote no catálogo",
+    "products_total": "Produtos processados por resultado",
+    "job_last_run_timestamp": "Fim da última execução de cada job (epoch)",
+}
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _num(v) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def _labels_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, labels: Sequence[str]):
+        self.name = name
+        self.labels = tuple(labels)
+        self.series: Dict[Tuple, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, key: Tuple, n: float = 1) -> None:
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + n
+
+    def snapshot(self) -> List[Dict]:
+        with self.lock:
+            return [{"labels": dict(zip(self.labels, k)), "value": v} for k, v in sorted(self.series.items())]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, labels: Sequence[str], buckets: Sequence[float] = LATENCY):
+        self.name = name
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series: Dict[Tuple, list] = {}    # key -> [contagens por balde (+Inf no fim), soma, n]
+        self.lock = threading.Lock()
+
+    def observe(self, key: Tuple, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            s = self.series.get(key)
+            if s is None:
+                s = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def _quantile(self, counts: List[int], n: int, q: float) -> float:
+        # interpolação linear dentro do balde (estimativa, como no Prometheus)
+        rank, acc = q * n, 0
+        for i, c in enumerate(counts):
+            if acc + c >= rank and c:
+                lo = self.buckets[i - 1] if i else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else lo
+                return lo + (hi - lo) * (rank - acc) / c
+            acc += c
+        return 0.0
+
+    def snapshot(self) -> List[Dict]:
+        with self.lock:
+            items = [(k, list(s[0]), s[1], s[2]) for k, s in sorted(self.series.items())]
+        return [{"labels": dict(zip(self.labels, k)), "buckets": list(self.buckets), "counts": counts,
+                 "sum": round(total, 6), "count": n, "p50": round(self._quantile(counts, n, 0.5), 6),
+                 "p95": round(self._quantile(counts, n, 0.95), 6)} for k, counts, total, n in items]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.job = ""
+
+    def _get(self, cls, name: str, labels: Sequence[str], **kw):
+        m = self.metrics.get(name)
+        if m is None:
+            with self.lock:
+                m = self.metrics.get(name)
+                if m is None:
+                    m = self.metrics[name] = cls(name, sorted(labels), **kw)
+        return m
+
+    def count(self, name: str, n: float = 1, **labels) -> None:
+        m = self._get(Counter, name + "_total", labels)
+        m.inc(tuple(str(labels[k]) for k in m.labels), n)
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY, **labels) -> None:
+        m = self._get(Histogram, name, labels, buckets=buckets)
+        m.observe(tuple(str(labels[k]) for k in m.labels), value)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.metrics.clear()
+            self.started = time.time()
+
+    def report(self) -> Dict:
+        with self.lock:
+            metrics = dict(self.metrics)
+        return {"job": self.job, "inicio": int(self.started), "duracao_s": round(time.time() - self.started, 3),
+                "metricas": {n: {"tipo": m.kind, "series": m.snapshot()} for n, m in sorted(metrics.items())}}
+
+
+REGISTRY = Registry()
+
+
+class timed:
+    """Cronômetro: `with timed("x", a="1")` ou `@timed("x", a="1")` grava
+    a duração em x_seconds{a="1"}; se sair por exceção, conta também
+    x_errors_total."""
+
+    __slots__ = ("name", "labels", "t0")
+
+    def __init__(self, name: str, **labels):
+        self.name = name + "_seconds"
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if ENABLED:
+            REGISTRY.observe(self.name, time.perf_counter() - self.t0, **self.labels)
+            if exc_type is not None:
+                REGISTRY.count(self.name[:-len("_seconds")] + "_errors", **self.labels)
+        return False
+
+    def __call__(self, fn):
+        if not ENABLED:
+            return fn
+        name, labels = self.name, self.labels
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                REGISTRY.count(name[:-len("_seconds")] + "_errors", **labels)
+                raise
+            finally:
+                REGISTRY.observe(name, time.perf_counter() - t0, **labels)
+        return wrapper
+
+
+def stage(name: str) -> timed:
+    return timed("stage", stage=name)
+
+
+def count(name: str, n: float = 1, **labels) -> None:
+    if ENABLED:
+        REGISTRY.count(name, n, **labels)
+
+
+def observe(name: str, value: float, buckets: Sequence[float] = LATENCY, **labels) -> None:
+    if ENABLED:
+        REGISTRY.observe(name, value, buckets, **labels)
+
+
+# ---------- perfil por amostragem ----------
+
+_profiler: Optional[cProfile.Profile] = None
+_profile_lock = threading.Lock()    # o cProfile não aceita dois ativos ao mesmo tempo
+_profiled_calls = 0
+
+
+def profiled(fn):
+    """Com PROFILE_SAMPLE > 0, uma fração das chamadas roda sob cProfile
+    (uma por vez; as outras seguem normais). Sem a variável, devolve a
+    própria função."""
+    if PROFILE_SAMPLE <= 0:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        global _profiler, _profiled_calls
+        if random.random() >= PROFILE_SAMPLE or not _profile_lock.acquire(blocking=False):
+            return fn(*args, **kwargs)
+        try:
+            if _profiler is None:
+                _profiler = cProfile.Profile()
+            _profiled_calls += 1
+            _profiler.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _profiler.disable()
+        finally:
+            _profile_lock.release()
+    return wrapper
+
+
+def profile_top(n: int = 25) -> str:
+    with _profile_lock:
+        if _profiler is None:
+            return ""
+        buf = io.StringIO()
+        pstats.Stats(_profiler, stream=buf).sort_stats("cumulative").print_stats(n)
+        return buf.getvalue()
+
+
+# ---------- saídas ----------
+
+def _render_series(out: List[str], full: str, kind: str, s: Dict, extra: Dict[str, str]) -> None:
+    labels = dict(extra, **s["labels"])
+    names, values = list(labels), list(labels.values())
+    if kind != "histogram":
+        out.append(f"{full}{_labels_text(names, values)} {_num(s['value'])}")
+        return
+    acc = 0
+    for le, c in zip(list(s["buckets"]) + ["+Inf"], s["counts"]):
+        acc += c
+        le_label = 'le="%s"' % le
+        out.append(f"{full}_bucket{_labels_text(names, values, le_label)} {acc}")
+    out.append(f"{full}_sum{_labels_text(names, values)} {_num(s['sum'])}")
+    out.append(f"{full}_count{_labels_text(names, values)} {s['count']}")
+
+
+def render(reports_dir: Optional[str] = METRICS_DIR) -> str:
+    """Texto do Prometheus: o registro deste processo e, com job="<nome>",
+    o último relatório de cada job que gravou em reports_dir."""
+    merged: Dict[str, Tuple[str, List[Tuple[Dict, Dict]]]] = {}
+    for name, m in REGISTRY.report()["metricas"].items():
+        merged.setdefault(name, (m["tipo"], []))[1].extend((s, {}) for s in m["series"])
+    for path in sorted(glob.glob(os.path.join(reports_dir, "*.json"))) if reports_dir else []:
+        try:
+            with open(path, encoding="utf-8") as f:
+                r = json.load(f)
+        except (OSError, ValueError):
+            continue
+        job = r.get("job") or os.path.splitext(os.path.basename(path))[0]
+        for name, m in r.get("metricas", {}).items():
+            merged.setdefault(name, (m["tipo"], []))[1].extend((s, {"job": job}) for s in m["series"])
+        merged.setdefault("job_last_run_timestamp", ("gauge", []))[1].append(
+            ({"labels": {}, "value": r.get("inicio", 0) + r.get("duracao_s", 0)}, {"job": job}))
+    out: List[str] = []
+    for name, (kind, series) in sorted(merged.items()):
+        full = PREFIX + name
+        help_text = HELP.get(name) or ("Saídas por exceção de " + name[:-len("_errors_total")]
+                                       if name.endswith("_errors_total") else name)
+        out.append(f"# HELP {full} {help_text}")
+        out.append(f"# TYPE {full} {kind}")
+        for s, extra in series:
+            _render_series(out, full, kind, s, extra)
+    return "\n".join(out) + "\n"
+
+
+def write_report(path: Optional[str] = None, extra: Optional[Dict] = None) -> str:
+    rep = REGISTRY.report()
+    if extra:
+        rep.update(extra)
+    top = profile_top()
+    if top:
+        rep["perfil"] = {"chamadas": _profiled_calls, "top": top.splitlines()}
+    path = path or os.environ.get("METRICS_REPORT") or os.path.join(METRICS_DIR, (REGISTRY.job or "run") + ".json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(rep, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    return path
+
+
+def start_run(job: str) -> None:
+    """Marca o início do job e grava o relatório na saída do processo."""
+    REGISTRY.job = job
+    REGISTRY.started = time.time()
+    if ENABLED:
+        atexit.register(write_report)
+
+
+def main():
+    # python metrics.py            -> texto do Prometheus dos relatórios em METRICS_DIR
+    sys.stdout.write(render())
+
+
+if __name__ == "__main__":
+    main()
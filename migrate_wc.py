@@ -1,4 +1,9 @@
-import os, csv, io, requests, html, re
+import os, csv, io, html, re, json, time, threading
+from concurrent.futures import ThreadPoolExecutor
+from woo_taxonomy import TaxonomyResolver, fetch_all
+from fetcher import Fetcher
+import image_probe
+import metrics
 
 WC_URL  = os.environ.get("WC_URL","").rstrip("/")
 WC_CK   = os.environ.get("WC_CK","")
@@ -7,57 +12,70 @@ CSV_URL = os.environ.get("CSV_URL","")
 
 REQUIRED = ("Name","External URL","Images","Description")
 DEFAULT_CATEGORY = "Afiliados"
+WORKERS = int(os.environ.get("MIGRATE_WORKERS","4"))
+RETRIES = 5
+
+# sessão keep-alive compartilhada pelos workers; concorrência por domínio
+# ajustada pelo Fetcher (AIMD) e circuito aberto se a loja cair
+S=Fetcher(timeout=40,max_in_flight=WORKERS+2,rate=float(os.environ.get("WOO_RATE","10")),
+          burst=WORKERS,retries=RETRIES)
+
+def req(m,p,**k):
+    # 429/5xx: espera (Retry-After ou exponencial com jitter) e tenta de novo;
+    # POST só repete em 429/conexão recusada, senão um create lento duplicaria o produto
+    with metrics.timed("woo_sync",op=m.lower()):
+        return S.request(m,f"{WC_URL}/wp-json/wc/v3{p}",auth=(WC_CK,WC_CS),**k)
 
 def api(m,p,**k):
-    u=f"{WC_URL}/wp-json/wc/v3{p}"
-    r=requests.request(m,u,auth=(WC_CK,WC_CS),timeout=40,**k)
+    r=req(m,p,**k)
     if not r.ok: raise SystemExit(f"Erro {r.status_code}: {r.text[:400]}")
     return r.json()
 
+# nome normalizado -> id; com o índice carregado, nada de search por linha
+NAMES=None
+NAME_LOCKS={}; NAMES_LOCK=threading.Lock()
+
+def name_key(name): return " ".join(html.unescape(name or "").lower().split())
+
+def load_names():
+    global NAMES
+    NAMES={name_key(p["name"]):p["id"] for p in fetch_all(req,"/products",_fields="id,name")}
+
+def name_lock(k):
+    with NAMES_LOCK: return NAME_LOCKS.setdefault(k,threading.Lock())
+
 def find_by_name(name):
+    if NAMES is not None:
+        pid=NAMES.get(name_key(name))
+        return {"id":pid} if pid else None
     r=api("GET","/products",params={"search":name,"per_page":1})
     return r[0] if r else None
 
-def get_cat(name,parent=0):
-    r=api("GET","/products/categories",params={"search":name,"per_page":1,"parent":parent})
-    for c in r or []:
-        if c["name"].strip().lower()==name.strip().lower() and c["parent"]==parent: return c
-    return None
+# categorias/tags: carregadas uma vez e resolvidas em memória
+TAX=TaxonomyResolver(req,default_category=DEFAULT_CATEGORY)
 
 def ensure_cat_path(path):
-    parts=[p.strip() for p in re.split(r"[|>/]",path) if p.strip()]
-    if not parts: parts=[DEFAULT_CATEGORY]
-    parent=0; last=None
-    for p in parts:
-        c=get_cat(p,parent)
-        if not c: c=api("POST","/products/categories",json={"name":p,"parent":parent})
-        parent=c["id"]; last=c
-    return {"id":last["id"]}
+    return {"id":TAX.category_path(path)}
 
 def ensure_cats(cell):
-    if not cell: return [ensure_cat_path(DEFAULT_CATEGORY)]
-    out=[]; seen=set()
-    for tok in re.split(r"[;,]",cell):
-        tok=tok.strip()
-        if not tok: continue
-        c=ensure_cat_path(tok)
-        if c["id"] not in seen: out.append(c); seen.add(c["id"])
-    return out or [ensure_cat_path(DEFAULT_CATEGORY)]
+    return TAX.categories(cell)
 
 def ensure_tags(cell):
-    names=[x.strip() for x in re.split(r"[;,]",cell or "") if x.strip()]
-    out=[]
-    for n in names:
-        q=api("GET","/products/tags",params={"search":n,"per_page":1})
-        t=next((t for t in q if t["name"].lower()==n.lower()),None)
-        if not t: t=api("POST","/products/tags",json={"name":n})
-        out.append({"id":t["id"]})
-    return out
+    return TAX.tag_ids(cell)
 
 def parse_imgs(cell):
     urls=[u.strip() for u in re.split(r"[,\s]+",cell or "") if u.strip().startswith("http")]
     return [{"src":u} for u in urls]
 
+# imagens sondadas antes do POST: o WordPress baixa cada src dentro da chamada
+PROBE=image_probe.ImageProbe()
+
+def check_imgs(imgs):
+    # quebradas/pesadas saem; miniaturas viram a versão grande; sem resposta
+    # da CDN a original fica
+    best=PROBE.preflight(i["src"] for i in imgs)
+    return [{"src":best[i["src"]]} for i in imgs if best.get(i["src"])]
+
 def valid(row):
     # obrigatório: Name, External URL, Images, Description
     return all((row.get("Name") or row.get("Nome"),
@@ -65,45 +83,100 @@ def valid(row):
                 (row.get("Images") or "").strip(),
                 (row.get("Description") or "").strip()))
 
-def upsert(row):
-    if not valid(row):
-        print(f"Pulado (incompleto): {row.get('Name') or row.get('Nome')}")
-        return
-
+def normalize(row):
+    # estágio 2: valida e limpa a linha; categorias/tags ficam como texto
+    if not valid(row): return None
     name=(row.get("Name") or row.get("Nome")).strip()
-    url =(row.get("External URL") or row.get("Link")).strip()
-    btn =(row.get("Button text") or "Comprar").strip()
-    desc=(row.get("Description") or "").strip()
-    sdesc=(row.get("Short description") or f"{name} — produto afiliado.").strip()
-    imgs=parse_imgs(row.get("Images"))
-    cats=ensure_cats(row.get("Categories") or row.get("Categoria") or "")
-    tags=ensure_tags(row.get("Tags") or "")
-    price=(row.get("Regular price") or "").strip() or None
+    return {
+      "name":name,
+      "url":(row.get("External URL") or row.get("Link")).strip(),
+      "btn":(row.get("Button text") or "Comprar").strip(),
+      "desc":(row.get("Description") or "").strip(),
+      "sdesc":(row.get("Short description") or f"{name} — produto afiliado.").strip(),
+      "imgs":parse_imgs(row.get("Images")),
+      "cats":row.get("Categories") or row.get("Categoria") or "",
+      "tags":row.get("Tags") or "",
+      "price":(row.get("Regular price") or "").strip() or None,
+    }
 
+@metrics.timed("woo_sync",op="upsert")
+def write(n):
+    imgs=check_imgs(n["imgs"])
+    if n["imgs"] and not imgs:
+        print(f"Imagem inutilizável: {n['name']}")
+        if image_probe.POLICY=="descartar": return "skipped"
+    n["imgs"]=imgs
     payload={
-      "name":name,
+      "name":n["name"],
       "type":"external",
-      "external_url":url,
-      "button_text":btn,
-      "regular_price":price,
-      "images":imgs,
-      "categories":cats,
-      "tags":tags,
-      "description":html.unescape(desc),
-      "short_description":html.unescape(sdesc),
+      "external_url":n["url"],
+      "button_text":n["btn"],
+      "regular_price":n["price"],
+      "categories":ensure_cats(n["cats"]),
+      "tags":ensure_tags(n["tags"]),
+      "description":html.unescape(n["desc"]),
+      "short_description":html.unescape(n["sdesc"]),
       "catalog_visibility":"visible",
       "status":"publish",
     }
+    # sem imagem a chave fica de fora: "images":[] apagaria as do produto
+    if n["imgs"]: payload["images"]=n["imgs"]
+    name=n["name"]
+    # mesmo nome em duas linhas: um worker cria, o outro atualiza
+    with name_lock(name_key(name)):
+        ex=find_by_name(name)
+        if ex:
+            api("PUT",f"/products/{ex['id']}",json=payload); print(f"Atualizado: {name}")
+            return "updated"
+        c=api("POST","/products",json=payload); print(f"Criado: {name}")
+        if NAMES is not None: NAMES[name_key(name)]=c["id"]
+        return "created"
+
+def upsert(row):
+    n=normalize(row)
+    if not n:
+        print(f"Pulado (incompleto): {row.get('Name') or row.get('Nome')}")
+        return
+    write(n)
 
-    ex=find_by_name(name)
-    if ex: api("PUT",f"/products/{ex['id']}",json=payload); print(f"Atualizado: {name}")
-    else:  api("POST","/products",json=payload);           print(f"Criado: {name}")
+def stream_rows(url):
+    # estágio 1: o CSV é lido e interpretado à medida que chega
+    r=S.get(url,stream=True,timeout=40); r.raise_for_status()
+    r.raw.decode_content=True; r.raw.auto_close=False
+    yield from csv.DictReader(io.TextIOWrapper(r.raw,encoding="utf-8-sig",newline=""))
 
 def run():
     if not (WC_URL and WC_CK and WC_CS and CSV_URL):
         raise SystemExit("Defina WC_URL, WC_CK, WC_CS e CSV_URL.")
-    r=requests.get(CSV_URL,timeout=40); r.raise_for_status()
-    for row in csv.DictReader(io.StringIO(r.text)):
-        upsert(row)
+    t0=time.time()
+    stats={"rows":0,"created":0,"updated":0,"skipped":0,"failed":0}
+    lock=threading.Lock()
+    metrics.start_run("migrate_wc")
+    with metrics.stage("woo_load"): load_names(); TAX.load()
+
+    # estágio 3: pool limitado; no máximo 2×WORKERS linhas em memória
+    slots=threading.BoundedSemaphore(WORKERS*2)
+    def task(n):
+        try: res=write(n)
+        except (SystemExit,Exception) as e:
+            print(f"Falhou: {n['name']}: {e}"); res="failed"
+        finally: slots.release()
+        with lock: stats[res]+=1
+        metrics.count("products",outcome=res)
+
+    with metrics.stage("woo"), ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        for row in stream_rows(CSV_URL):
+            with lock: stats["rows"]+=1
+            n=normalize(row)
+            if not n:
+                print(f"Pulado (incompleto): {row.get('Name') or row.get('Nome')}")
+                with lock: stats["skipped"]+=1
+                metrics.count("products",outcome="skipped"); continue
+            slots.acquire()
+            pool.submit(task,n)
+
+    PROBE.save()
+    el=time.time()-t0
+    print(json.dumps(dict(stats,images=PROBE.stats,hosts=S.host_stats(),seconds=round(el,2),rows_per_s=round(stats["rows"]/el,2) if el else None),ensure_ascii=False))
 
 if __name__=="__main__": run()
@@ -0,0 +1,159 @@
+# price.py - interpretação de preços (texto solto, metatags, CSV) num lugar só
+import re
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple, Optional
+
+CURRENCIES = {"R$": "BRL", "US$": "USD", "$": "USD", "€": "EUR", "£": "GBP",
+              "BRL": "BRL", "USD": "USD", "EUR": "EUR", "GBP": "GBP"}
+
+_CUR = r"R\$|US\$|BRL|USD|EUR|GBP|€|£|\$"
+_NUM = r"\d{1,3}(?:[.,]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?"
+
+# valor com símbolo de moeda dentro de texto corrido ("por R$ 1.234,56 à vista")
+PRICE_RX = re.compile(rf"(?P<cur>{_CUR})\s?(?P<num>{_NUM})(?!\d)", re.I)
+# campo que deveria conter só um preço ("849,00", "R$ 1.299", "683.46")
+FIELD_RX = re.compile(rf"^\s*(?P<cur>{_CUR})?\s*(?P<num>-?(?:{_NUM}))\s*(?P<cur2>{_CUR})?\s*$", re.I)
+THOUSANDS_DOT = re.compile(r"^-?\d{1,3}(?:\.\d{3})+$")
+THOUSANDS_COMMA = re.compile(r"^-?\d{1,3}(?:,\d{3})+$")
+# número isolado do campo para o caminho vetorizado (a gramática é a de FIELD_RX)
+SERIES_RX = rf"(?i)^\s*(?:{_CUR})?\s*(-?\d[\d.,]*)\s*(?:{_CUR})?\s*$"
+
+
+class Price(NamedTuple):
+    amount: Optional[Decimal]
+    currency: Optional[str]
+    confidence: float   # 1.0 inequívoco, 0.5 separador adivinhado, 0.0 nada
+
+
+NO_PRICE = Price(None, None, 0.0)
+
+
+def _normalize(num: str, currency: Optional[str]):
+    """'1.234,56' -> ('1234.56', certeza). Com os dois separadores, o último é o
+    decimal; com um só, grupos exatos de 3 dígitos são milhar (',' só no
+    padrão americano), o resto é decimal."""
+    has_c, has_d = "," in num, "." in num
+    if has_c and has_d:
+        if num.rfind(",") > num.rfind("."):
+            return num.replace(".", "").replace(",", "."), 1.0
+        return num.replace(",", ""), 1.0
+    if has_d:
+        if THOUSANDS_DOT.match(num):
+            return num.replace(".", ""), 0.5
+        return num, 1.0
+    if has_c:
+        if currency == "USD" and THOUSANDS_COMMA.match(num):
+            return num.replace(",", ""), 0.5
+        if THOUSANDS_COMMA.match(num) and num.count(",") > 1:
+            return num.replace(",", ""), 0.5
+        return num.replace(",", "."), 1.0
+    return num, 1.0
+
+
+def _build(cur: Optional[str], num: str, default_currency: Optional[str]) -> Price:
+    currency = CURRENCIES.get((cur or "").upper()) if cur else None
+    raw, certainty = _normalize(num, currency)
+    try:
+        amount = Decimal(raw)
+    except InvalidOperation:
+        return NO_PRICE
+    confidence = certainty if currency else certainty * 0.8
+    return Price(amount, currency or default_currency, round(confidence, 2))
+
+
+def parse_price(text, default_currency: Optional[str] = "BRL") -> Price:
+    """Interpreta um campo de preço. Aceita float/int/Decimal e strings em
+    formato brasileiro ou americano, com ou sem moeda."""
+    if text is None:
+        return NO_PRICE
+    if isinstance(text, (int, float, Decimal)) and not isinstance(text, bool):
+        return Price(Decimal(str(text)), default_currency, 0.8)
+    s = str(text).replace("\xa0", " ").strip()
+    m = FIELD_RX.match(s)
+    if not m:
+        return find_price(s, default_currency)
+    return _build(m.group("cur") or m.group("cur2"), m.group("num"), default_currency)
+
+
+def find_price(text: str, default_currency: Optional[str] = "BRL") -> Price:
+    """Primeiro valor com símbolo de moeda dentro de um texto qualquer."""
+    m = PRICE_RX.search((text or "").replace("\xa0", " "))
+    if not m:
+        return NO_PRICE
+    return _build(m.group("cur"), m.group("num"), default_currency)
+
+
+def parse_amount(text, default: float = 0.0) -> float:
+    p = parse_price(text)
+    return float(p.amount) if p.amount is not None else default
+
+
+def format_brl(amount) -> str:
+    txt = f"{float(amount):,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+    return f"R$ {txt}"
+
+
+def format_price(amount, currency: Optional[str] = "BRL") -> str:
+    if (currency or "BRL").upper() == "BRL":
+        return format_brl(amount)
+    return f"{currency} {float(amount):.2f}"
+
+
+def parse_series(series, default_currency: Optional[str] = "BRL"):
+    """Versão vetorizada de parse_price para uma coluna inteira (pandas).
+    Devolve um DataFrame com amount (float64), currency e confidence,
+    alinhado ao índice de `series` (listas também servem). Feeds repetem
+    muito os mesmos textos, então só os valores distintos passam pelas
+    operações de string."""
+    import numpy as np
+    import pandas as pd
+
+    if not isinstance(series, pd.Series):
+        series = pd.Series(list(series), dtype="object")
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    u = pd.Series(uniques, dtype="object").astype(str)  # \s das regex já cobre o \xa0
+    num = u.str.extract(SERIES_RX, expand=False)
+    num = num.where(num.str.fullmatch(rf"-?(?:{_NUM})", na=False))
+    cur = u.str.extract(rf"(?i)({_CUR})", expand=False).str.upper().map(CURRENCIES)
+
+    # mesmas regras de _normalize, em colunas: o último separador é o decimal
+    # (casas = o que vem depois dele), salvo quando é milhar
+    size = num.str.len().to_numpy(dtype="float64")
+    last_c = num.str.rfind(",").to_numpy(dtype="float64")
+    last_d = num.str.rfind(".").to_numpy(dtype="float64")
+    last = np.maximum(last_c, last_d)
+    tail = np.where(last >= 0, size - last - 1, 0)
+    n_c = num.str.count(",").to_numpy(dtype="float64")
+    n_d = num.str.count(r"\.").to_numpy(dtype="float64")
+    has_c, has_d = n_c > 0, n_d > 0
+    grouped = np.where(has_c & has_d, False, np.where(
+        has_d, num.str.fullmatch(THOUSANDS_DOT.pattern, na=False).to_numpy(),
+        num.str.fullmatch(THOUSANDS_COMMA.pattern, na=False).to_numpy() & ((cur == "USD").to_numpy() | (n_c > 1))))
+    decimals = np.where(grouped, 0, tail)
+    guessed = grouped
+    # separador decimal repetido ("1.234.56") é inválido, como no Decimal()
+    bad = ~grouped & (np.where(last_c > last_d, n_c, n_d) > 1)
+
+    digits = num.str.replace(r"[.,]", "", regex=True).astype("float64").to_numpy()
+    amount = np.where(bad, np.nan, digits / np.power(10.0, decimals))
+
+    found = ~np.isnan(amount)
+    has_cur = cur.notna().to_numpy()
+    confidence = np.where(found, np.round(np.where(guessed, 0.5, 1.0) * np.where(has_cur, 1.0, 0.8), 2), 0.0)
+    currency = np.where(found, cur.fillna(default_currency).to_numpy(dtype=object), None)
+
+    # texto corrido ("por R$ 99,90 à vista") é raro em feed: vai pelo caminho escalar
+    for i in np.flatnonzero(~found & has_cur):
+        p = find_price(u.iat[i], default_currency)
+        if p.amount is not None:
+            amount[i], currency[i], confidence[i] = float(p.amount), p.currency, p.confidence
+
+    valid = codes >= 0
+    take = np.where(valid, codes, 0)
+    if not len(uniques):
+        amount, currency, confidence = np.array([np.nan]), np.array([None]), np.array([0.0])
+    return pd.DataFrame({
+        "amount": np.where(valid, amount[take], np.nan),
+        "currency": np.where(valid, currency[take], None),
+        "confidence": np.where(valid, confidence[take], 0.0),
+    }, index=series.index)
@@ -0,0 +1,211 @@
+# price_history.py - histórico de preços por produto (séries append-only em NumPy)
+#
+# Um par de arquivos por loja em .cache/precos: <loja>.bin com registros fixos
+# (id do produto, ts, preço, flags) só de acréscimo, e <loja>.keys com a chave
+# canônica de cada id (uma por linha). Ao abrir uma loja, o .bin é lido de uma
+# vez com np.fromfile e ordenado por produto; observações novas vão para o fim
+# do arquivo e para uma cauda em memória.
+#
+#   python price_history.py AMZN:B0DQQCGG3Q      # série e resumo de um produto
+import os, sys, json, time, threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from canonical import is_key, product_key
+from fetcher import host_key
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_DIR = os.environ.get("PRICE_HISTORY_DIR") or os.path.join(BASE_DIR, ".cache", "precos")
+
+# só vai para a loja (WooCommerce) mudança acima de um dos limites
+ABS_THRESHOLD = float(os.environ.get("PRICE_ABS_THRESHOLD", "5.0"))      # R$
+REL_THRESHOLD = float(os.environ.get("PRICE_REL_THRESHOLD", "0.02"))     # 2%
+WINDOW_DAYS = int(os.environ.get("PRICE_WINDOW_DAYS", "30"))
+# selo "menor preço": histórico mínimo antes de valer (observações e dias cobertos)
+LOWEST_MIN_OBS = int(os.environ.get("PRICE_LOWEST_MIN_OBS", "3"))
+LOWEST_MIN_DAYS = float(os.environ.get("PRICE_LOWEST_MIN_DAYS", "7"))
+
+PUBLISHED = 1   # flag: este preço foi gravado na loja (ver mark_published)
+
+RECORD = np.dtype([("k", "<u4"), ("ts", "<u4"), ("price", "<f8"), ("flags", "<u4")])   # 20 bytes
+
+
+class Quote(NamedTuple):
+    price: float            # preço a publicar (o anterior, se a mudança foi pequena)
+    old_price: float        # maior preço da janela, se bem acima do atual (o "de R$ X"); senão 0
+    min_price: float        # menor preço da janela, o atual incluso
+    changed: bool           # o preço a publicar difere do último publicado
+    observed: float         # o que foi visto agora
+    lowest: bool = False    # abaixo de todo o histórico anterior da janela (com histórico suficiente)
+
+
+def merchant_of(key: str) -> str:
+    prefix, _, rest = key.partition(":")
+    if prefix != "URL":
+        return prefix.lower()
+    return host_key(rest) or "outros"
+
+
+def significant(old: Optional[float], new: float, abs_t: float = ABS_THRESHOLD, rel_t: float = REL_THRESHOLD) -> bool:
+    if old is None or old <= 0:
+        return True
+    diff = abs(new - old)
+    return diff >= abs_t or diff / old >= rel_t
+
+
+class _Merchant:
+    """Série de uma loja: base ordenada (do disco) + cauda desta execução."""
+
+    def __init__(self, root: str, name: str):
+        safe = "".join(c if c.isalnum() or c in ".-_" else "_" for c in name)
+        self.bin_path = os.path.join(root, safe + ".bin")
+        self.keys_path = os.path.join(root, safe + ".keys")
+        self.keys: List[str] = []
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, encoding="utf-8") as f:
+                self.keys = [line.rstrip("\n") for line in f]
+        self.ids: Dict[str, int] = {k: i for i, k in enumerate(self.keys)}
+        base = np.fromfile(self.bin_path, dtype=RECORD) if os.path.exists(self.bin_path) else np.empty(0, RECORD)
+        # registro de um id sem linha no .keys (queda entre as duas escritas) é ignorado
+        base = base[base["k"] < len(self.keys)]
+        order = np.argsort(base["k"], kind="stable")      # dentro do produto, segue a ordem de chegada
+        self.base = base[order]
+        self.starts = np.searchsorted(self.base["k"], np.arange(len(self.keys) + 1))
+        self.tail: Dict[int, List[tuple]] = {}
+        self.published: Dict[int, float] = {}
+
+    def _id(self, key: str) -> int:
+        kid = self.ids.get(key)
+        if kid is None:
+            kid = self.ids[key] = len(self.keys)
+            self.keys.append(key)
+            with open(self.keys_path, "a", encoding="utf-8") as f:
+                f.write(key + "\n")
+        return kid
+
+    def series(self, kid: int) -> np.ndarray:
+        base = self.base[self.starts[kid]:self.starts[kid + 1]] if kid + 1 < len(self.starts) else self.base[:0]
+        tail = self.tail.get(kid)
+        return np.concatenate([base, np.array(tail, dtype=RECORD)]) if tail else base
+
+    def last_published(self, kid: int) -> Optional[float]:
+        if kid in self.published:
+            return self.published[kid]
+        s = self.series(kid)
+        pub = s["price"][(s["flags"] & PUBLISHED) != 0]
+        val = float(pub[-1]) if len(pub) else None
+        if val is not None:
+            self.published[kid] = val
+        return val
+
+    def append(self, kid: int, ts: int, price: float, flags: int) -> None:
+        rec = (kid, ts, price, flags)
+        with open(self.bin_path, "ab") as f:
+            f.write(np.array([rec], dtype=RECORD).tobytes())
+        self.tail.setdefault(kid, []).append(rec)
+        if flags & PUBLISHED:
+            self.published[kid] = price
+
+
+class PriceHistory:
+    """Observações de preço por chave canônica (product_key). `observe` grava
+    e diz o que publicar; as consultas leem só a série do produto."""
+
+    def __init__(self, root: str = HISTORY_DIR, abs_threshold: float = ABS_THRESHOLD,
+                 rel_threshold: float = REL_THRESHOLD, window_days: int = WINDOW_DAYS):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.abs_threshold = abs_threshold
+        self.rel_threshold = rel_threshold
+        self.window_s = window_days * 86400
+        self.merchants: Dict[str, _Merchant] = {}
+        self.lock = threading.Lock()
+        self.stats = {"observacoes": 0, "publicar": 0, "segurados": 0}
+
+    def _locate(self, url_or_key: str, create: bool = False) -> Tuple[Optional[_Merchant], Optional[int]]:
+        key = url_or_key if is_key(url_or_key) else product_key(url_or_key)
+        name = merchant_of(key)
+        m = self.merchants.get(name)
+        if m is None:
+            m = self.merchants[name] = _Merchant(self.root, name)
+        kid = m._id(key) if create else m.ids.get(key)
+        return m, kid
+
+    def series(self, url_or_key: str) -> np.ndarray:
+        """Registros (k, ts, price, flags) do produto, do mais antigo ao mais novo."""
+        with self.lock:
+            m, kid = self._locate(url_or_key)
+            return m.series(kid) if kid is not None else np.empty(0, RECORD)
+
+    def _window(self, s: np.ndarray, now: float) -> np.ndarray:
+        return s["price"][(s["ts"] >= now - self.window_s) & (s["price"] > 0)]
+
+    def _lowest(self, s: np.ndarray, price: float, now: float) -> bool:
+        # estritamente abaixo de tudo o que veio antes na janela, e só com
+        # histórico de verdade: produto novo ou preço parado não ganham selo
+        s = s[(s["ts"] >= now - self.window_s) & (s["price"] > 0)]
+        if price <= 0 or len(s) < LOWEST_MIN_OBS or now - float(s["ts"].min()) < LOWEST_MIN_DAYS * 86400:
+            return False
+        return price < float(s["price"].min()) - 1e-9
+
+    def observe(self, url_or_key: str, price: float, ts: Optional[float] = None) -> Quote:
+        """Registra uma observação e diz o que publicar. O preço a publicar só
+        muda se passar de um dos limites (absoluto ou relativo) em relação ao
+        último publicado; preço 0/ausente é gravado mas não conta. Nada é
+        marcado como publicado aqui: quem grava na loja chama mark_published."""
+        now = time.time() if ts is None else ts
+        price = float(price or 0.0)
+        with self.lock:
+            m, kid = self._locate(url_or_key, create=True)
+            pub = m.last_published(kid)
+            changed = price > 0 and (pub is None or significant(pub, price, self.abs_threshold, self.rel_threshold))
+            before = m.series(kid)
+            m.append(kid, int(now), price, 0)
+            self.stats["observacoes"] += 1
+            self.stats["publicar" if changed else "segurados"] += 1
+            window = self._window(m.series(kid), now)
+        current = price if changed else (pub or price)
+        hi = float(window.max()) if len(window) else 0.0
+        lo = float(window.min()) if len(window) else current
+        # "de R$ X" só quando a diferença também passa dos limites
+        old = hi if hi > current and significant(current, hi, self.abs_threshold, self.rel_threshold) else 0.0
+        return Quote(price=current, old_price=old, min_price=lo, changed=changed, observed=price,
+                     lowest=self._lowest(before, current, now))
+
+    def mark_published(self, url_or_key: str, price: float, ts: Optional[float] = None) -> None:
+        """O preço foi aceito pela loja: passa a ser a referência dos limites."""
+        price = float(price or 0.0)
+        if price <= 0:
+            return
+        with self.lock:
+            m, kid = self._locate(url_or_key, create=True)
+            if m.last_published(kid) != price:
+                m.append(kid, int(time.time() if ts is None else ts), price, PUBLISHED)
+
+    def min_price(self, url_or_key: str, days: Optional[int] = None, now: Optional[float] = None) -> Optional[float]:
+        s = self.series(url_or_key)
+        now = time.time() if now is None else now
+        w = s["price"][(s["ts"] >= now - (days * 86400 if days else self.window_s)) & (s["price"] > 0)]
+        return float(w.min()) if len(w) else None
+
+    def is_lowest(self, url_or_key: str, price: float, now: Optional[float] = None) -> bool:
+        """Selo "menor preço em N dias": abaixo de todo o histórico da janela."""
+        return self._lowest(self.series(url_or_key), float(price or 0.0), time.time() if now is None else now)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("uso: python price_history.py <url ou chave>")
+        return
+    h = PriceHistory()
+    s = h.series(sys.argv[1])
+    print(json.dumps({
+        "observacoes": int(len(s)),
+        "serie": [[int(r["ts"]), float(r["price"]), bool(r["flags"] & PUBLISHED)] for r in s[-50:]],
+        "menor_preco_janela": h.min_price(sys.argv[1]),
+    }, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# product_sink.py - saída de ofertas em JSON Lines, só acrescenta e sem duplicar
+import os, json, threading
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from canonical import product_key
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SINK_PATH = os.environ.get("PRODUCT_SINK") or os.path.join(BASE_DIR, "alimentar", "produtos_novos.jsonl")
+
+
+def record_key(rec: Dict) -> Optional[str]:
+    url = rec.get("url") or rec.get("affiliate_url")
+    return product_key(url) if url else None
+
+
+def iter_jsonl(path: str) -> Iterator[Dict]:
+    """Lê registro a registro, sem carregar o arquivo; linhas truncadas ou
+    inválidas são ignoradas."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+class ProductSink:
+    """Acrescenta ofertas a um arquivo .jsonl com write + fsync por lote e
+    mantém ao lado um índice persistente (<arquivo>.idx, "offset\\tchave"),
+    com a chave de produto de canonical.py, para descartar em O(1) o que já
+    foi gravado. Se o processo cair entre os dois arquivos, o índice é
+    completado relendo só a cauda do .jsonl."""
+
+    def __init__(self, path: str = SINK_PATH, key: Callable[[Dict], Optional[str]] = record_key):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.key = key
+        self.index: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._repair_tail()
+        self._load_index()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, rec_or_key) -> bool:
+        k = rec_or_key if isinstance(rec_or_key, str) else self.key(rec_or_key)
+        return k in self.index
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter_jsonl(self.path)
+
+    def _repair_tail(self) -> None:
+        # uma escrita interrompida deixa meia linha no fim: descarta
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            pos = size
+            while pos > 0:
+                step = min(4096, pos)
+                f.seek(pos - step)
+                chunk = f.read(step)
+                nl = chunk.rfind(b"\n")
+                if nl >= 0:
+                    pos = pos - step + nl + 1
+                    break
+                pos -= step
+            if pos != size:
+                f.truncate(pos)
+
+    def _load_index(self) -> None:
+        last = -1
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                for line in f:
+                    off, _, k = line.rstrip("\n").partition("\t")
+                    if k and off.isdigit():
+                        self.index.setdefault(k, int(off))
+                        last = max(last, int(off))
+        if not os.path.exists(self.path):
+            return
+        # registros gravados depois da última linha do índice
+        missing = []
+        with open(self.path, "rb") as f:
+            if last >= 0:
+                f.seek(last)
+                f.readline()
+            while True:
+                off = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                try:
+                    k = self.key(json.loads(line))
+                except ValueError:
+                    continue
+                if k and k not in self.index:
+                    self.index[k] = off
+                    missing.append(f"{off}\t{k}\n")
+        if missing:
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.writelines(missing)
+
+    def extend(self, records: Iterable[Dict]) -> int:
+        """Grava os registros inéditos numa única escrita + fsync e devolve
+        quantos entraram."""
+        with self.lock:
+            batch, keys, fresh = [], [], set()
+            for rec in records:
+                k = self.key(rec)
+                if not k or k in self.index or k in fresh:
+                    continue
+                batch.append((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+                keys.append(k)
+                fresh.add(k)
+            if not batch:
+                return 0
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                off = os.lseek(fd, 0, os.SEEK_END)
+                os.write(fd, b"".join(batch))
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            idx = []
+            for k, line in zip(keys, batch):
+                self.index[k] = off
+                idx.append(f"{off}\t{k}\n")
+                off += len(line)
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.writelines(idx)
+            return len(batch)
+
+    def add(self, rec: Dict) -> bool:
+        return self.extend([rec]) == 1
+
+    def import_json(self, json_path: str) -> int:
+        # migra um dump antigo (lista JSON) para o sink
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path, encoding="utf-8") as f:
+            try:
+                data = json.load(f)
+            except ValueError:
+                return 0
+        return self.extend(r for r in data if isinstance(r, dict))
+
+    def compact(self) -> int:
+        """Reescreve o arquivo mantendo um registro por chave (o primeiro) e
+        refaz o índice; a troca é atômica (os.replace)."""
+        with self.lock:
+            tmp, tmp_idx = self.path + ".tmp", self.index_path + ".tmp"
+            seen: Dict[str, int] = {}
+            with open(tmp, "wb") as out, open(tmp_idx, "w", encoding="utf-8") as idx:
+                for rec in iter_jsonl(self.path):
+                    k = self.key(rec)
+                    if not k or k in seen:
+                        continue
+                    seen[k] = out.tell()
+                    out.write((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+                    idx.write(f"{seen[k]}\t{k}\n")
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp, self.path)
+            os.replace(tmp_idx, self.index_path)
+            self.index = seen
+            return len(seen)
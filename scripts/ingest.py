@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import argparse
 import csv
+import json
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 
 import requests
 from slugify import slugify
@@ -14,6 +17,17 @@ from slugify import slugify
 # ---------- Configuração básica ----------
 
 BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from sync_manifest import SyncManifest, digest  # noqa: E402
+from woo_taxonomy import TaxonomyResolver  # noqa: E402
+from canonical import product_key  # noqa: E402
+from price import parse_series  # noqa: E402
+import image_probe  # noqa: E402
+from price_history import PriceHistory  # noqa: E402
+from fetcher import Fetcher  # noqa: E402
+from catalog import Catalog  # noqa: E402
+import metrics  # noqa: E402
 FEED_PATH = BASE_DIR / "alimentar" / "produtos_woo_01.csv"
 
 # Essas variáveis já devem estar configuradas como segredos no GitHub
@@ -44,6 +58,16 @@ if not (WOO_BASE_URL and WOO_CONSUMER_KEY and WOO_CONSUMER_SECRET):
 
 API_BASE = WOO_BASE_URL.rstrip("/") + "/wp-json/wc/v3"
 
+# modo em lote: /products/batch aceita até 100 itens (create + update) por chamada
+BATCH_SIZE = min(int(os.environ.get("WOO_BATCH_SIZE", "50")), 100)
+BATCH_WORKERS = int(os.environ.get("WOO_BATCH_WORKERS", "2"))
+LOOKUP_CHUNK = 50
+
+# uma única sessão com keep-alive para todas as chamadas à API; 429/5xx são
+# repetidos com backoff (Retry-After) e a concorrência se ajusta à loja
+WOO = Fetcher(timeout=60, max_in_flight=max(4, BATCH_WORKERS),
+              rate=float(os.environ.get("WOO_RATE", "10")), burst=max(2, BATCH_WORKERS))
+
 
 @dataclass
 class AffiliateProduct:
@@ -58,6 +82,7 @@ class AffiliateProduct:
     image_url: str
     description: str
     source: str
+    lowest_30d: bool = False
 
     @property
     def sku(self) -> str:
@@ -76,47 +101,109 @@ def read_feed(path: Path) -> List[AffiliateProduct]:
         print(f"[ERRO] Arquivo de feed não encontrado: {path}")
         return []
 
-    products: List[AffiliateProduct] = []
     with path.open(newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if not row.get("affiliate_url"):
-                continue
+        rows = [row for row in csv.DictReader(f) if row.get("affiliate_url")]
 
-            def parse_price(v: str) -> float:
-                if v is None:
-                    return 0.0
-                s = str(v).replace("\xa0", "").strip()
-                if not s:
-                    return 0.0
-                # aceita formatos 849.00 ou 849,00
-                if "," in s and "." in s:
-                    s = s.replace(".", "").replace(",", ".")
-                elif "," in s:
-                    s = s.replace(".", "").replace(",", ".")
-                try:
-                    return float(s)
-                except ValueError:
-                    return 0.0
-
-            price = parse_price(row.get("price", ""))
-            old_price = parse_price(row.get("old_price", ""))
-
-            products.append(
-                AffiliateProduct(
-                    merchant_domain=(row.get("merchant_domain") or row.get("domínio_do_comerciante") or "").strip(),
-                    affiliate_url=row.get("affiliate_url", "").strip(),
-                    name=row.get("name", "").strip(),
-                    price=price,
-                    old_price=old_price,
-                    currency=(row.get("currency") or row.get("moeda") or "BRL").strip(),
-                    category=row.get("category", "").strip(),
-                    tags=row.get("tags", "").strip(),
-                    image_url=row.get("image_url", "").strip(),
-                    description=row.get("description", "").strip(),
-                    source=row.get("source", "").strip(),
-                )
+    # preços do feed inteiro de uma vez (849.00, 849,00, R$ 1.234,56...)
+    prices = parse_series([row.get("price") for row in rows])["amount"].fillna(0.0).tolist()
+    old_prices = parse_series([row.get("old_price") for row in rows])["amount"].fillna(0.0).tolist()
+
+    products: List[AffiliateProduct] = []
+    for row, price, old_price in zip(rows, prices, old_prices):
+        products.append(
+            AffiliateProduct(
+                merchant_domain=(row.get("merchant_domain") or row.get("domínio_do_comerciante") or "").strip(),
+                affiliate_url=row.get("affiliate_url", "").strip(),
+                name=row.get("name", "").strip(),
+                price=price,
+                old_price=old_price,
+                currency=(row.get("currency") or row.get("moeda") or "BRL").strip(),
+                category=row.get("category", "").strip(),
+                tags=row.get("tags", "").strip(),
+                image_url=row.get("image_url", "").strip(),
+                description=row.get("description", "").strip(),
+                source=row.get("source", "").strip(),
             )
+        )
+    return products
+
+
+def read_catalog(**filters) -> Iterable[AffiliateProduct]:
+    """Mesmo resultado de read_feed, lendo do catálogo (catalog.py) em vez
+    do CSV; os filtros são os de Catalog.query. Produz um a um, à medida
+    que o cursor entrega."""
+    for rec in Catalog().query(**filters):
+        yield AffiliateProduct(
+            merchant_domain=rec.get("merchant_domain") or "",
+            affiliate_url=rec["affiliate_url"],
+            name=rec.get("name") or "",
+            price=rec.get("price") or 0.0,
+            old_price=rec.get("old_price") or 0.0,
+            currency=rec.get("currency") or "BRL",
+            category=rec.get("category") or "",
+            tags=rec.get("tags") or "",
+            image_url=rec.get("image_url") or "",
+            description=rec.get("description") or "",
+            source=rec.get("source") or "",
+        )
+
+
+def dedupe(products: Iterable[AffiliateProduct]) -> Tuple[List[AffiliateProduct], int]:
+    """Uma linha por produto: variantes do mesmo link (fragmentos de
+    rastreio do ML, ref= da Amazon...) têm a mesma chave canônica. Devolve
+    os únicos e quantas linhas repetidas foram descartadas."""
+    seen = set()
+    out: List[AffiliateProduct] = []
+    dup = 0
+    for p in products:
+        key = product_key(p.affiliate_url)
+        if key not in seen:
+            seen.add(key)
+            out.append(p)
+        else:
+            dup += 1
+    return out, dup
+
+
+def check_images(products: List[AffiliateProduct]) -> List[AffiliateProduct]:
+    """Sonda todas as imagens em paralelo antes de falar com a API: a
+    miniatura vira a versão grande, a imagem quebrada/pesada sai (o produto
+    vai sem imagem ou é descartado, conforme IMAGE_POLICY). Falha de rede na
+    sondagem mantém a URL original."""
+    probe = image_probe.ImageProbe()
+    best = probe.preflight(p.image_url for p in products if p.image_url)
+    probe.save()
+    out: List[AffiliateProduct] = []
+    dropped = 0
+    for p in products:
+        if p.image_url and not best.get(p.image_url):
+            dropped += 1
+            print(f"[AVISO] Imagem inutilizável para {p.sku}: {p.image_url}")
+            if image_probe.POLICY == "descartar":
+                continue
+        if p.image_url:
+            p.image_url = best.get(p.image_url) or ""
+        out.append(p)
+    print(f"[INFO] Imagens: {len(best)} verificada(s), {dropped} sem uso "
+          f"({probe.stats['cache']} do cache, {probe.stats['sondadas']} sondada(s)).")
+    return out
+
+
+def apply_price_history(products: List[AffiliateProduct], hist: PriceHistory) -> List[AffiliateProduct]:
+    """Grava o preço visto de cada produto e decide o que vai para a loja:
+    variação abaixo de PRICE_ABS_THRESHOLD/PRICE_REL_THRESHOLD mantém o preço
+    já publicado (payload igual, hash igual, nenhum PUT). O "de R$ X" sai do
+    maior preço da janela; sem histórico, vale o old_price do CSV. O preço só
+    vira "publicado" depois que a loja aceita (mark_published no envio)."""
+    for p in products:
+        if not p.price:
+            continue
+        q = hist.observe(p.affiliate_url, p.price)
+        p.price = q.price
+        p.old_price = q.old_price or p.old_price
+        p.lowest_30d = q.lowest
+    print(f"[INFO] Preços: {hist.stats['publicar']} mudança(s) para publicar, "
+          f"{hist.stats['segurados']} variação(ões) abaixo do limite.")
     return products
 
 
@@ -125,18 +212,11 @@ def wc_request(method: str, path: str, **kwargs) -> requests.Response:
     params = kwargs.pop("params", {})
     params.setdefault("consumer_key", WOO_CONSUMER_KEY)
     params.setdefault("consumer_secret", WOO_CONSUMER_SECRET)
-    resp = requests.request(method, url, params=params, timeout=60, **kwargs)
+    resp = WOO.request(method, url, params=params, **kwargs)
     return resp
 
 
-def ensure_product(p: AffiliateProduct) -> None:
-    # Verifica se já existe produto com este SKU
-    r = wc_request("GET", "/products", params={"sku": p.sku, "per_page": 1})
-    if r.status_code not in (200, 201):
-        print(f"[ERRO] Falha ao consultar produto {p.sku}: {r.status_code} {r.text}")
-        return
-
-    items = r.json()
+def build_payload(p: AffiliateProduct) -> Dict[str, Any]:
     data: Dict[str, Any] = {
         "name": p.name,
         "type": "external",
@@ -146,26 +226,72 @@ def ensure_product(p: AffiliateProduct) -> None:
         "button_text": p.button_text,
         "description": p.description or p.name,
         "short_description": p.name,
-        "images": [{"src": p.image_url}] if p.image_url else [],
         "meta_data": [
             {"key": "_ctctech_source", "value": p.source or p.merchant_domain},
             {"key": "_ctctech_merchant_domain", "value": p.merchant_domain},
         ],
     }
+    if p.image_url:
+        # sem imagem a chave fica de fora: "images": [] apagaria as da loja
+        data["images"] = [{"src": p.image_url}]
+    if p.lowest_30d:
+        # selo "menor preço em 30 dias" no tema
+        data["meta_data"].append({"key": "_ctctech_menor_preco_30d", "value": "1"})
 
-    # tags simples (Woo cria se não existir)
+    # tags por nome; resolve_terms() troca pelos ids antes do envio
     if p.tags:
         tag_names = [t.strip() for t in p.tags.split(",") if t.strip()]
         if tag_names:
             data["tags"] = [{"name": t} for t in tag_names]
+    if p.category:
+        data["categories"] = [{"name": p.category}]
+    return data
+
+
+def resolve_terms(p: AffiliateProduct, data: Dict[str, Any], tax: TaxonomyResolver) -> Dict[str, Any]:
+    # a API só associa categorias/tags por id
+    if p.tags:
+        data["tags"] = tax.tag_ids(p.tags)
+    if p.category:
+        data["categories"] = tax.categories(p.category)
+    return data
+
+
+@metrics.timed("woo_sync", op="ensure_product")
+def ensure_product(p: AffiliateProduct, manifest: Optional[SyncManifest] = None,
+                   tax: Optional[TaxonomyResolver] = None, history: Optional[PriceHistory] = None) -> None:
+    data = build_payload(p)
+    content_hash = digest(data)
+    known = manifest.get(p.sku) if manifest is not None else None
+    if known and known[1] == content_hash:
+        print(f"[OK] Sem mudanças {p.sku}")
+        return
+    if tax is not None:
+        resolve_terms(p, data, tax)
+
+    if known:
+        prod_id = known[0]
+    else:
+        # Verifica se já existe produto com este SKU
+        r = wc_request("GET", "/products", params={"sku": p.sku, "per_page": 1})
+        if r.status_code not in (200, 201):
+            print(f"[ERRO] Falha ao consultar produto {p.sku}: {r.status_code} {r.text}")
+            return
+        items = r.json()
+        prod_id = items[0]["id"] if items else None
 
-    if items:
-        prod_id = items[0]["id"]
+    if prod_id:
         r2 = wc_request("PUT", f"/products/{prod_id}", json=data)
         if r2.status_code not in (200, 201):
             print(f"[ERRO] Falha ao atualizar {p.sku}: {r2.status_code} {r2.text}")
+            if manifest is not None and r2.status_code == 404:
+                manifest.drop(p.sku)
         else:
             print(f"[OK] Atualizado {p.sku} – {p.name}")
+            if manifest is not None:
+                manifest.set(p.sku, prod_id, content_hash)
+            if history is not None:
+                history.mark_published(p.affiliate_url, p.price)
     else:
         data["sku"] = p.sku
         r2 = wc_request("POST", "/products", json=data)
@@ -173,21 +299,214 @@ def ensure_product(p: AffiliateProduct) -> None:
             print(f"[ERRO] Falha ao criar {p.sku}: {r2.status_code} {r2.text}")
         else:
             print(f"[OK] Criado {p.sku} – {p.name}")
+            if manifest is not None:
+                manifest.set(p.sku, r2.json()["id"], content_hash)
+            if history is not None:
+                history.mark_published(p.affiliate_url, p.price)
+
+
+def chunked(seq: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+@metrics.timed("woo_sync", op="lookup")
+def lookup_skus(skus: List[str]) -> Dict[str, int]:
+    """SKU -> id dos produtos já existentes, em poucas chamadas paginadas
+    (o parâmetro `sku` da API aceita vários valores separados por vírgula)."""
+    found: Dict[str, int] = {}
+    for part in chunked(skus, LOOKUP_CHUNK):
+        page = 1
+        while True:
+            r = wc_request("GET", "/products", params={
+                "sku": ",".join(part), "per_page": 100, "page": page, "_fields": "id,sku",
+            })
+            if r.status_code != 200:
+                raise RuntimeError(f"Falha ao consultar SKUs: {r.status_code} {r.text[:300]}")
+            items = r.json()
+            for it in items:
+                if it.get("sku"):
+                    found[it["sku"]] = it["id"]
+            if len(items) < 100:
+                break
+            page += 1
+    return found
+
+
+# (ação, produto, payload, hash do payload)
+Op = Tuple[str, AffiliateProduct, Dict[str, Any], str]
+
+
+@metrics.timed("woo_sync", op="batch")
+def send_batch(ops: List[Op], manifest: SyncManifest, history: Optional[PriceHistory] = None) -> Dict[str, int]:
+    """Envia um lote para /products/batch e reporta o resultado de cada item,
+    na mesma ordem em que foram enviados. Os que deram certo vão para o
+    manifesto com o id e o hash do payload."""
+    body: Dict[str, List[Dict[str, Any]]] = {"create": [], "update": []}
+    sent: Dict[str, List[Op]] = {"create": [], "update": []}
+    for op in ops:
+        body[op[0]].append(op[2])
+        sent[op[0]].append(op)
+
+    counts = {"created": 0, "updated": 0, "failed": 0}
+    try:
+        r = wc_request("POST", "/products/batch", json=body)
+    except requests.RequestException as e:
+        # timeout/conexão: o lote pode ter sido gravado; sem hash no manifesto,
+        # a próxima execução consulta os SKUs e atualiza em vez de duplicar
+        print(f"[ERRO] Lote sem resposta: {e}")
+        counts["failed"] = len(ops)
+        return counts
+    if r.status_code not in (200, 201):
+        print(f"[ERRO] Lote recusado: {r.status_code} {r.text[:300]}")
+        counts["failed"] = len(ops)
+        return counts
+
+    resp = r.json()
+    for action, verb, label, key in (("create", "criar", "Criado", "created"),
+                                     ("update", "atualizar", "Atualizado", "updated")):
+        for (_, p, _, content_hash), item in zip(sent[action], resp.get(action) or []):
+            err = item.get("error")
+            if err:
+                counts["failed"] += 1
+                print(f"[ERRO] Falha ao {verb} {p.sku}: {err.get('code')} {err.get('message')}")
+                if action == "update" and err.get("code") == "woocommerce_rest_product_invalid_id":
+                    manifest.drop(p.sku)  # apagado na loja: a próxima execução consulta de novo
+            else:
+                counts[key] += 1
+                manifest.set(p.sku, item["id"], content_hash)
+                if history is not None:
+                    history.mark_published(p.affiliate_url, p.price)
+                print(f"[OK] {label} {p.sku} – {p.name}")
+    return counts
+
+
+def batch_upsert(products: List[AffiliateProduct], manifest: SyncManifest,
+                 history: Optional[PriceHistory] = None) -> Dict[str, int]:
+    # SKU repetido no feed: vale a última linha
+    by_sku: Dict[str, AffiliateProduct] = {}
+    for p in products:
+        by_sku[p.sku] = p
+
+    totals = {"created": 0, "updated": 0, "unchanged": 0, "failed": 0}
+    ops: List[Op] = []
+    unknown: List[Tuple[AffiliateProduct, Dict[str, Any], str]] = []
+    for sku, p in by_sku.items():
+        data = build_payload(p)
+        content_hash = digest(data)
+        known = manifest.get(sku)
+        if known and known[1] == content_hash:
+            totals["unchanged"] += 1
+        elif known:
+            ops.append(("update", p, dict(data, id=known[0]), content_hash))
+        else:
+            unknown.append((p, data, content_hash))
+
+    # só o que o manifesto não conhece precisa de consulta por SKU
+    existing = lookup_skus([p.sku for p, _, _ in unknown]) if unknown else {}
+    for p, data, content_hash in unknown:
+        if p.sku in existing:
+            ops.append(("update", p, dict(data, id=existing[p.sku]), content_hash))
+        else:
+            ops.append(("create", p, dict(data, sku=p.sku), content_hash))
+
+    if ops:
+        tax = TaxonomyResolver(wc_request).load()
+        for _, p, data, _ in ops:
+            resolve_terms(p, data, tax)
+
+    with ThreadPoolExecutor(max_workers=max(1, BATCH_WORKERS)) as pool:
+        for counts in pool.map(lambda part: send_batch(part, manifest, history), chunked(ops, BATCH_SIZE)):
+            for k, v in counts.items():
+                totals[k] += v
+    return totals
+
+
+def reconcile(manifest: SyncManifest) -> int:
+    """Reconstrói o manifesto a partir da loja (SKU -> id). Hashes só são
+    mantidos quando o id confere; os demais serão reenviados uma vez."""
+    def page(n: int) -> requests.Response:
+        r = wc_request("GET", "/products", params={"per_page": 100, "page": n, "_fields": "id,sku"})
+        if r.status_code != 200:
+            raise RuntimeError(f"Falha ao listar produtos: {r.status_code} {r.text[:300]}")
+        return r
+
+    first = page(1)
+    pages = [first]
+    total_pages = int(first.headers.get("X-WP-TotalPages") or 1)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        pages.extend(pool.map(page, range(2, total_pages + 1)))
+
+    old = dict(manifest.items)
+    manifest.items = {}
+    for r in pages:
+        for it in r.json():
+            sku = it.get("sku")
+            if not sku:
+                continue
+            prev = old.get(sku)
+            manifest.set(sku, it["id"], prev[1] if prev and prev[0] == it["id"] else "")
+    return len(manifest)
 
 
 def main() -> None:
-    print(f"[INFO] Lendo feed: {FEED_PATH}")
-    products = read_feed(FEED_PATH)
+    parser = argparse.ArgumentParser(description="Importa o feed de afiliados para o WooCommerce.")
+    parser.add_argument("--single", action="store_true",
+                        help="um produto por vez (GET + PUT/POST), sem /products/batch")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="reconstrói o manifesto de sincronização a partir da loja e sai")
+    parser.add_argument("--catalogo", action="store_true",
+                        help="lê os produtos do catálogo local em vez do CSV do feed")
+    parser.add_argument("--categoria", help="com --catalogo: só esta categoria")
+    parser.add_argument("--loja", help="com --catalogo: só esta loja (amzn, ml, ...)")
+    args = parser.parse_args()
+
+    manifest = SyncManifest()
+    if args.reconcile:
+        n = reconcile(manifest)
+        manifest.save()
+        print(f"[INFO] Manifesto reconstruído: {n} SKU(s) em {manifest.path}")
+        return
+
+    metrics.start_run("ingest")
+    with metrics.stage("feed"):
+        if args.catalogo:
+            print("[INFO] Lendo catálogo local")
+            rows = read_catalog(category=args.categoria, merchant=args.loja)
+        else:
+            print(f"[INFO] Lendo feed: {FEED_PATH}")
+            rows = read_feed(FEED_PATH)
+        products, duplicates = dedupe(rows)
+    with metrics.stage("imagens"):
+        products = check_images(products)
+    with metrics.stage("precos"):
+        history = PriceHistory()
+        products = apply_price_history(products, history)
     if not products:
         print("[INFO] Nenhum produto válido encontrado no feed.")
         return
 
-    print(f"[INFO] {len(products)} produto(s) no feed. Enviando para WooCommerce...")
-    for p in products:
-        try:
-            ensure_product(p)
-        except Exception as e:
-            print(f"[ERRO] Exceção ao processar {p.sku}: {e}")
+    print(f"[INFO] {len(products)} produto(s) no feed ({duplicates} duplicado(s) "
+          f"descartado(s)). Enviando para WooCommerce...")
+    try:
+        if not args.single:
+            with metrics.stage("woo"):
+                totals = batch_upsert(products, manifest, history)
+            for k, v in totals.items():
+                metrics.count("products", v, outcome=k)
+            print(json.dumps(totals, ensure_ascii=False))
+            return
+
+        tax = TaxonomyResolver(wc_request)
+        with metrics.stage("woo"):
+            for p in products:
+                try:
+                    ensure_product(p, manifest, tax, history)
+                except Exception as e:
+                    print(f"[ERRO] Exceção ao processar {p.sku}: {e}")
+    finally:
+        manifest.save()
+        print(json.dumps({"http": WOO.stats, "hosts": WOO.host_stats()}, ensure_ascii=False))
 
 
 if __name__ == "__main__":
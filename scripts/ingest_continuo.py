@@ -0,0 +1,317 @@
+# ingest_continuo.py - ingestão contínua (job de 15 em 15 min) sobre uma fronteira persistente
+#
+#   python scripts/ingest_continuo.py                  # roda até INGEST_BUDGET_S ou MAX_PER_RUN
+#   python scripts/ingest_continuo.py --status         # só mostra a fronteira
+#
+# Buscas (consulta, buscador, página) e páginas de produto (URL, profundidade)
+# vivem em .cache/crawl/fronteira.sqlite3 com prioridade e próxima visita. Cada
+# execução pega os itens vencidos, grava o resultado de cada um na hora e para
+# no orçamento de tempo; a seguinte continua dali, sem repetir SERP nem página.
+import os, re, sys, json, time, html, random, hashlib, argparse, urllib.parse
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from fetcher import Fetcher  # noqa: E402
+from http_cache import default_cache  # noqa: E402
+from canonical import SeenIndex, product_key, canonical_url  # noqa: E402
+from price import find_price  # noqa: E402
+from image_probe import ImageProbe  # noqa: E402
+from crawl_frontier import Frontier, Item, DONE, serp_id  # noqa: E402
+import serp  # noqa: E402
+from price_history import PriceHistory  # noqa: E402
+import metrics  # noqa: E402
+
+BASE = (os.environ.get("WC_BASE") or "").rstrip("/")
+CK = os.environ.get("WC_CK", "")
+CS = os.environ.get("WC_CS", "")
+
+BUDGET_S = float(os.environ.get("INGEST_BUDGET_S", "600"))   # folga para o cron de 15 min
+MAX_PER_RUN = int(os.environ.get("INGEST_MAX_PER_RUN", "40"))
+SERP_PAGES = 3
+SERP_EVERY_S = 6 * 3600
+FALLBACK_EVERY_S = 24 * 3600
+MAX_DEPTH = 2
+RELATED_PER_PAGE = 20
+
+# prioridade: página de produto antes de SERP (o que já foi achado sai primeiro)
+PRIO_PAGE = 20.0
+PRIO_SERP = 10.0
+PRIO_FALLBACK = 2.0
+
+HDRS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122 Safari/537.36",
+    "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
+}
+
+ENGINES = ("bing", "ddg")
+
+DOMAINS_PRIMARY = [
+    "amazon.com.br", "mercadolivre.com.br", "shopee.com.br", "magazineluiza.com.br",
+    "americanas.com.br", "submarino.com.br", "kabum.com.br", "casasbahia.com.br",
+    "aliexpress.com", "temu.com",
+]
+
+BAD_PATH = (
+    "login", "cart", "checkout", "track", "seller", "support", "help", "mailto:",
+    "account", "orders", "wishlist", "entrar", "minha-conta",
+)
+
+QUERIES = [
+    "iphone 14 128gb preço", "xiaomi redmi note 13 256gb",
+    "galaxy s23 256gb oferta", "notebook i5 16gb ssd 512",
+    "macbook air m2 8gb 256", "tv 55 4k hdr",
+    "monitor 27 144hz", "ssd nvme 1tb gen4",
+    "placa de video rtx 4060", "headset gamer bluetooth",
+    "caixa de som portátil bt", "fone bluetooth tws anc",
+    "smartwatch amoled gps", "roteador wi-fi 6 ax3000",
+    "impressora tanque de tinta", "câmera action 4k",
+    "airfryer 5 litros", "cafeteira espresso",
+    "cadeira gamer ergonômica", "kit ferramentas makita",
+]
+
+HREF_RX = re.compile(r"href=[\"'](https?://[^\"'\s<>]+)", re.I)
+
+# API do WooCommerce: novas tentativas com backoff e circuito se a loja cair
+WOO = Fetcher(timeout=30, max_in_flight=4, rate=float(os.environ.get("WOO_RATE", "10")), burst=2)
+# SERPs e páginas de produto passam pelo cache em disco (ETag/Last-Modified)
+PAGES = Fetcher(headers=dict(HDRS), timeout=30, cache=default_cache())
+
+
+# ---------- fronteira ----------
+
+def seed(frontier: Frontier) -> int:
+    """Primeira página de cada consulta em cada buscador. Itens existentes
+    mantêm a agenda; só consulta nova entra."""
+    items = []
+    for q in QUERIES:
+        for eng in ENGINES:
+            items.append((serp_id(eng, q, 1), "serp", {"query": q, "engine": eng, "page": 1, "domains": "primary"},
+                          PRIO_SERP, 0, SERP_EVERY_S))
+            # sem filtro de domínio: só roda quando não há nada melhor vencido
+            items.append((serp_id(eng, q, 1, "any"), "serp", {"query": q, "engine": eng, "page": 1, "domains": "any"},
+                          PRIO_FALLBACK, 0, FALLBACK_EVERY_S))
+    return frontier.push_many(items)
+
+
+def page_id(url: str) -> str:
+    key = product_key(url)
+    return "page:" + (key if not key.startswith("URL:") else canonical_url(url))
+
+
+def push_pages(frontier: Frontier, urls: List[str], depth: int, seen: SeenIndex) -> int:
+    items = [(page_id(u), "page", {"url": u}, PRIO_PAGE - 5 * (depth - 1), depth, DONE)
+             for u in urls if u not in seen]
+    return frontier.push_many(items) if items else 0
+
+
+# ---------- rede (roda nos workers do Fetcher) ----------
+
+def search_links(data: Dict) -> Optional[List[str]]:
+    # a página da SERP vem do cache de serp.py enquanto não vencer (SERP_TTL)
+    domains = DOMAINS_PRIMARY if data["domains"] == "primary" else []
+    try:
+        results = serp.fetch_page(PAGES, data["engine"], data["query"], domains, data["page"])
+    except Exception:
+        return None
+    out = []
+    for r in results:
+        u = r.url
+        if any(x in u for x in BAD_PATH):
+            continue
+        if (not domains) or any(d in u for d in domains):
+            out.append(u)
+    return list(dict.fromkeys(out))
+
+
+def extract_meta(url: str) -> Optional[Dict]:
+    try:
+        r = PAGES.get(url)
+        r.raise_for_status()
+    except Exception:
+        return None
+    t = r.text
+    with metrics.timed("parse", parser="ingest_continuo"):
+        return _parse_meta(url, t)
+
+
+def _parse_meta(url: str, t: str) -> Dict:
+    def meta(prop):
+        m = re.search(rf'<meta[^>]+property=["\']{prop}["\'][^>]+content=["\']([^"\']+)["\']', t, re.I)
+        if not m:
+            m = re.search(rf'<meta[^>]+name=["\']{prop}["\'][^>]+content=["\']([^"\']+)["\']', t, re.I)
+        return html.unescape(m.group(1).strip()) if m else ""
+
+    title = meta("og:title") or meta("twitter:title")
+    if not title:
+        m = re.search(r"<title>(.*?)</title>", t, re.I | re.S)
+        title = m.group(1).strip() if m else ""
+
+    img = meta("og:image") or meta("twitter:image")
+
+    mp = find_price(t)
+    price = f"{mp.amount:.2f}" if mp.amount is not None else ""
+
+    # outros produtos da mesma loja linkados na página (relacionados, "quem viu")
+    host = urllib.parse.urlsplit(url).hostname or ""
+    related = [u for u in dict.fromkeys(HREF_RX.findall(t))
+               if host and host in u and not product_key(u).startswith("URL:")
+               and product_key(u) != product_key(url)][:RELATED_PER_PAGE]
+    return {"title": title[:180] if title else "", "image": img, "price": price, "related": related}
+
+
+def fetch_item(item: Item):
+    with metrics.stage(item.kind):
+        return search_links(item.data) if item.kind == "serp" else extract_meta(item.data["url"])
+
+
+# ---------- WooCommerce ----------
+
+def get_by_sku(sku: str):
+    api = f"{BASE}/wp-json/wc/v3/products"
+    try:
+        r = WOO.get(api, params={"sku": sku, "per_page": 1, "consumer_key": CK, "consumer_secret": CS}, timeout=25)
+        r.raise_for_status()
+        arr = r.json()
+        if arr:
+            item = arr[0]
+            return item["id"], bool(item.get("images") or [])
+    except Exception:
+        pass
+    return None, False
+
+
+@metrics.timed("woo_sync", op="create_or_update")
+def create_or_update(meta: Dict, url: str, images: ImageProbe) -> str:
+    title = meta["title"]
+    img = images.usable(meta["image"]) or ""
+    price = meta["price"] or "0"
+    sku = hashlib.md5(product_key(url).encode("utf-8")).hexdigest()[:12].upper()
+
+    api = f"{BASE}/wp-json/wc/v3/products"
+    pid, has_img = get_by_sku(sku)
+
+    if pid and (not has_img) and img:
+        try:
+            r = WOO.request("PUT", f"{api}/{pid}", params={"consumer_key": CK, "consumer_secret": CS},
+                            json={"images": [{"src": img}]})
+            r.raise_for_status()
+            return "updated"
+        except Exception:
+            return "error"
+
+    if pid:
+        return "skip"
+
+    data = {
+        "name": title or "Produto afiliado",
+        "type": "simple",
+        "status": "publish",
+        "regular_price": price,
+        "sku": sku,
+        "external_url": url,
+        "catalog_visibility": "visible",
+        "short_description": f"Importado automaticamente. Fonte: {url}",
+        "images": ([{"src": img}] if img else []),
+    }
+    try:
+        r = WOO.request("POST", api, params={"consumer_key": CK, "consumer_secret": CS}, json=data)
+        r.raise_for_status()
+        return "created"
+    except Exception:
+        return "error"
+
+
+# ---------- laço principal ----------
+
+def run(budget_s: float = BUDGET_S, max_per_run: int = MAX_PER_RUN) -> Dict:
+    t0 = time.time()
+    deadline = t0 + budget_s
+    frontier = Frontier()
+    seen = SeenIndex()                       # produtos já enviados em execuções anteriores
+    images = ImageProbe()
+    history = PriceHistory()
+    seed(frontier)
+    counts = {"created": 0, "updated": 0, "skipped": 0, "errors": 0, "serps": 0, "pages": 0}
+
+    def quota_left() -> bool:
+        return time.time() < deadline and counts["created"] + counts["updated"] < max_per_run
+
+    try:
+        while quota_left():
+            batch = frontier.lease(PAGES.max_in_flight)
+            if not batch:
+                break
+            handled = set()
+            for item, res in PAGES.map(fetch_item, batch):
+                handled.add(item.id)
+                if res is None:
+                    frontier.fail(item)
+                elif item.kind == "serp":
+                    counts["serps"] += 1
+                    n = push_pages(frontier, res, 1, seen)
+                    d = item.data
+                    if n and d["page"] < SERP_PAGES:
+                        nxt = dict(d, page=d["page"] + 1)
+                        frontier.push(serp_id(d["engine"], d["query"], nxt["page"], d["domains"]), "serp", nxt,
+                                      item.priority - 1, 0, item.interval)
+                    frontier.done(item)
+                else:
+                    counts["pages"] += 1
+                    url = item.data["url"]
+                    if url in seen:
+                        counts["skipped"] += 1
+                        frontier.done(item, DONE)
+                    elif not res["title"]:
+                        frontier.done(item, DONE)
+                    else:
+                        if res["price"]:
+                            history.observe(url, float(res["price"]))
+                        status = create_or_update(res, url, images)
+                        metrics.count("products", outcome=status)
+                        if status == "error":
+                            counts["errors"] += 1
+                            frontier.fail(item)
+                        else:
+                            seen.add(url, "ingest_continuo")
+                            frontier.done(item, DONE)
+                            counts[status if status in ("created", "updated") else "skipped"] += 1
+                            if item.depth < MAX_DEPTH:
+                                push_pages(frontier, res["related"], item.depth + 1, seen)
+                            if status in ("created", "updated"):
+                                time.sleep(random.uniform(0.6, 1.2))
+                if not quota_left():
+                    break
+            # o que foi arrendado e não processado volta para a fila agora
+            frontier.release([it for it in batch if it.id not in handled])
+    finally:
+        seen.save()
+        images.save()
+    return dict(counts, segundos=round(time.time() - t0, 1), fronteira=frontier.summary(),
+                fetch=PAGES.stats, imagens=images.stats, hosts=PAGES.host_stats(), woo=WOO.host_stats())
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Ingestão contínua com fronteira persistente.")
+    ap.add_argument("--status", action="store_true", help="só mostra o estado da fronteira")
+    ap.add_argument("--orcamento", type=float, default=BUDGET_S, help="segundos de trabalho nesta execução")
+    args = ap.parse_args()
+
+    if args.status:
+        f = Frontier()
+        seed(f)
+        print(json.dumps(f.summary(), ensure_ascii=False))
+        return
+    if not (BASE and CK and CS):
+        print("[ERRO] Defina WC_BASE, WC_CK e WC_CS.")
+        return
+    # execução sem produto novo não é falha: a fronteira guarda o progresso
+    metrics.start_run("ingest_continuo")
+    print(json.dumps(run(args.orcamento), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
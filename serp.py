@@ -0,0 +1,208 @@
+# serp.py - buscas no Bing/DuckDuckGo com cache de resultados e parsers leves
+#
+# Os resultados (url, título) de cada (buscador, consulta normalizada, filtro
+# site:, página) ficam em SQLite por SERP_TTL; "SSD NVMe  1tb" e "ssd nvme 1tb"
+# caem na mesma chave. O HTML é lido por regex específica de cada buscador,
+# resultado a resultado, e search() é um gerador: quem para no MAX_PER_RUN não
+# paga a página seguinte nem o outro buscador.
+import os, re, json, time, html, base64, sqlite3, threading, unicodedata, urllib.parse
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import metrics
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.environ.get("SERP_CACHE_PATH") or os.path.join(BASE_DIR, ".cache", "serp", "resultados.sqlite3")
+TTL = int(os.environ.get("SERP_TTL", str(6 * 3600)))
+
+
+class Result(NamedTuple):
+    url: str
+    title: str
+    engine: str
+    rank: int
+
+
+# ---------- parsers ----------
+
+_TAG_RX = re.compile(r"<[^>]+>")
+_HREF_RX = re.compile(r"""\bhref\s*=\s*["']([^"']+)["']""", re.I)
+_BING_ITEM_RX = re.compile(r"""<li\b[^>]*\bclass=["'][^"']*\bb_algo\b""", re.I)
+_BING_LINK_RX = re.compile(r"<h2\b[^>]*>\s*<a\b([^>]*)>(.*?)</a>", re.I | re.S)
+_DDG_LINK_RX = re.compile(r"""<a\b([^>]*\bclass=["'][^"']*\bresult__a\b[^"']*["'][^>]*)>(.*?)</a>""", re.I | re.S)
+BING_WINDOW = 4000      # o <h2> do resultado fica logo depois do <li class="b_algo">
+
+
+def _text(fragment: str) -> str:
+    return " ".join(html.unescape(_TAG_RX.sub("", fragment)).split())
+
+
+def _bing_url(href: str) -> str:
+    # links de clique do Bing: /ck/a?...&u=a1<base64url da URL>
+    if "bing.com/ck/a" in href:
+        u = urllib.parse.parse_qs(urllib.parse.urlsplit(href).query).get("u", [""])[0]
+        if u.startswith("a1"):
+            raw = u[2:]
+            try:
+                return base64.urlsafe_b64decode(raw + "=" * (-len(raw) % 4)).decode("utf-8")
+            except (ValueError, UnicodeDecodeError):
+                return ""
+    return href
+
+
+def parse_bing(page: str) -> Iterator[Tuple[str, str]]:
+    for m in _BING_ITEM_RX.finditer(page):
+        a = _BING_LINK_RX.search(page, m.end(), m.end() + BING_WINDOW)
+        if not a:
+            continue
+        href = _HREF_RX.search(a.group(1))
+        url = _bing_url(html.unescape(href.group(1))) if href else ""
+        if url.startswith("http"):
+            yield url, _text(a.group(2))
+
+
+def parse_ddg(page: str) -> Iterator[Tuple[str, str]]:
+    for a in _DDG_LINK_RX.finditer(page):
+        href = _HREF_RX.search(a.group(1))
+        if not href:
+            continue
+        url = html.unescape(href.group(1))
+        if "duckduckgo.com/l/" in url:       # redirecionador: a URL real vem em uddg=
+            url = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query).get("uddg", [""])[0]
+        if url.startswith("http"):
+            yield url, _text(a.group(2))
+
+
+# nome -> (URL com {q} e {off}, resultados por página, primeiro offset, parser)
+ENGINES: Dict[str, Tuple[str, int, int, Callable[[str], Iterator[Tuple[str, str]]]]] = {
+    "bing": ("https://www.bing.com/search?q={q}&first={off}", 10, 1, parse_bing),
+    "ddg": ("https://duckduckgo.com/html/?q={q}&s={off}", 30, 0, parse_ddg),
+}
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+def site_filter(sites: Iterable[str]) -> str:
+    return " OR ".join("site:" + s for s in sorted({s.lower() for s in sites}))
+
+
+def serp_url(engine: str, query: str, sites: Sequence[str] = (), page: int = 1) -> str:
+    tpl, step, first, _ = ENGINES[engine]
+    q = f"{normalize_query(query)} {site_filter(sites)}".strip()
+    return tpl.format(q=urllib.parse.quote_plus(q), off=first + (page - 1) * step)
+
+
+# ---------- cache ----------
+
+class SerpCache:
+    """(buscador, consulta, sites, página) -> [[url, título], ...]."""
+
+    def __init__(self, path: str = CACHE_PATH, ttl: int = TTL):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS serp (key TEXT PRIMARY KEY, fetched_at REAL, results TEXT)")
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def key(engine: str, query: str, sites: Sequence[str], page: int) -> str:
+        return f"{engine}|{normalize_query(query)}|{site_filter(sites)}|{page}"
+
+    def get(self, key: str, ttl: Optional[int] = None) -> Optional[List[List[str]]]:
+        with self.lock:
+            row = self.db.execute("SELECT fetched_at, results FROM serp WHERE key = ?", (key,)).fetchone()
+            if row and time.time() - row[0] < (self.ttl if ttl is None else ttl):
+                self.stats["hits"] += 1
+                return json.loads(row[1])
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, results: List[List[str]]) -> None:
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO serp VALUES (?,?,?)",
+                            (key, time.time(), json.dumps(results, ensure_ascii=False)))
+
+    def prune(self, max_age: Optional[int] = None) -> int:
+        with self.lock:
+            cur = self.db.execute("DELETE FROM serp WHERE fetched_at < ?", (time.time() - (max_age or 4 * self.ttl),))
+            return cur.rowcount
+
+
+_default: Optional[SerpCache] = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> Optional[SerpCache]:
+    """Cache padrão; SERP_CACHE=0 desliga."""
+    global _default
+    if os.environ.get("SERP_CACHE", "1") == "0":
+        return None
+    with _default_lock:
+        if _default is None:
+            _default = SerpCache()
+        return _default
+
+
+# ---------- busca ----------
+
+def _page(fetcher, engine: str, query: str, sites: Sequence[str], page: int,
+          cache: Optional[SerpCache], ttl: Optional[int]) -> Iterator[Tuple[str, str]]:
+    key = SerpCache.key(engine, query, sites, page)
+    hit = cache.get(key, ttl) if cache is not None else None
+    if hit is not None:
+        yield from (tuple(r) for r in hit)
+        return
+    r = fetcher.get(serp_url(engine, query, sites, page))
+    r.raise_for_status()
+    parsed = ENGINES[engine][3](r.text)
+    got: List[List[str]] = []
+    try:
+        for url, title in parsed:
+            got.append([url, title])
+            yield url, title
+    finally:
+        # quem parou no meio: termina o parse (barato) para a próxima vez não
+        # precisar buscar de novo; página sem resultado (captcha, bloqueio) não entra
+        got += [[u, t] for u, t in parsed]
+        if cache is not None and got:
+            cache.put(key, got)
+
+
+def fetch_page(fetcher, engine: str, query: str, sites: Sequence[str] = (), page: int = 1,
+               cache: Optional[SerpCache] = None, ttl: Optional[int] = None) -> List[Result]:
+    """Uma página de um buscador, inteira (com cache)."""
+    cache = default_cache() if cache is None else cache
+    with metrics.timed("serp_fetch", engine=engine):
+        return [Result(u, t, engine, i) for i, (u, t) in enumerate(_page(fetcher, engine, query, sites, page, cache, ttl))]
+
+
+def search(fetcher, query: str, sites: Sequence[str] = (), engines: Sequence[str] = ("bing", "ddg"),
+           pages: int = 1, cache: Optional[SerpCache] = None, ttl: Optional[int] = None,
+           errors: str = "skip") -> Iterator[Result]:
+    """Resultados orgânicos, sem repetição de URL, buscador por buscador e
+    página por página, sob demanda. `fetcher` é um fetcher.Fetcher (ou algo
+    com .get(url)). errors="skip" pula buscador que falhou; "raise" propaga."""
+    cache = default_cache() if cache is None else cache
+    seen = set()
+    for engine in engines:
+        rank = 0
+        for page in range(1, pages + 1):
+            n = 0
+            try:
+                for url, title in _page(fetcher, engine, query, sites, page, cache, ttl):
+                    n += 1
+                    u = url.split("#")[0]
+                    if u in seen:
+                        continue
+                    seen.add(u)
+                    yield Result(u, title, engine, rank)
+                    rank += 1
+            except Exception:
+                if errors == "raise":
+                    raise
+                break
+            if not n:
+                break
@@ -0,0 +1,272 @@
+# signal_engine.py - indicadores vetorizados + força / % do saldo por perfil de risco
+import time, threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from candles import CandleEngine, CandleRing, TIMEFRAMES, TS, HIGH, LOW, CLOSE, VOLUME
+
+EMA_FAST, EMA_SLOW, RSI_N, ATR_N, BB_N, BB_K, VOL_N = 9, 21, 14, 14, 20, 2.0, 20
+WARMUP = 200            # velas usadas no scan vetorizado
+MIN_GAP_S = 30.0        # "Janela mínima entre sinais: 30s" (por ativo)
+SIGNAL_WINDOW_S = 45.0  # validade, igual ao SIGNAL_WINDOW_MS das telas
+
+
+@dataclass(frozen=True)
+class Profile:
+    nome: str
+    min_forca: int       # abaixo disso não sai sinal
+    pct_min: float       # % do saldo no limiar de força
+    pct_max: float       # % do saldo com força 100
+    max_atr_pct: float   # acima dessa volatilidade (ATR/preço, %) a posição encolhe
+
+
+PROFILES: Dict[str, Profile] = {p.nome: p for p in (
+    Profile("conservador", 80, 1, 5, 0.8),
+    Profile("moderado", 70, 5, 15, 1.5),
+    Profile("agressivo_moderado", 60, 10, 25, 2.5),
+    Profile("agressivo_total", 50, 20, 40, 5.0),
+)}
+
+
+# ---------- indicadores sobre o último eixo (1 série ou matriz ativos × tempo) ----------
+
+def _ewm(x: np.ndarray, alpha: float) -> np.ndarray:
+    # série longa (backtest): o laço em C do pandas; lote de janelas curtas
+    # (scan): a recorrência anda no tempo e vetoriza entre as séries
+    if x.ndim == 1:
+        return pd.Series(x).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    out = np.empty_like(x, dtype=np.float64)
+    acc = x[..., 0].astype(np.float64)
+    out[..., 0] = acc
+    for t in range(1, x.shape[-1]):
+        acc = acc + alpha * (x[..., t] - acc)
+        out[..., t] = acc
+    return out
+
+
+def _prev(x: np.ndarray) -> np.ndarray:
+    return np.concatenate([x[..., :1], x[..., :-1]], axis=-1)
+
+
+def _rolling(x: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    # média e desvio das últimas n posições; as n-1 primeiras ficam NaN
+    mean = np.full(x.shape, np.nan)
+    std = np.full(x.shape, np.nan)
+    if x.shape[-1] >= n:
+        win = np.lib.stride_tricks.sliding_window_view(x, n, axis=-1)
+        mean[..., n - 1:] = win.mean(axis=-1)
+        std[..., n - 1:] = win.std(axis=-1)
+    return mean, std
+
+
+def ema(x: np.ndarray, n: int) -> np.ndarray:
+    return _ewm(x, 2.0 / (n + 1))
+
+
+def rsi(close: np.ndarray, n: int = RSI_N) -> np.ndarray:
+    d = close - _prev(close)
+    ag = _ewm(np.maximum(d, 0.0), 1.0 / n)
+    al = _ewm(np.maximum(-d, 0.0), 1.0 / n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(al > 0, 100.0 - 100.0 / (1.0 + ag / al), np.where(ag > 0, 100.0, 50.0))
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    pc = _prev(close)
+    return np.maximum(high - low, np.maximum(np.abs(high - pc), np.abs(low - pc)))
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, n: int = ATR_N) -> np.ndarray:
+    return _ewm(true_range(high, low, close), 1.0 / n)
+
+
+def bollinger(close: np.ndarray, n: int = BB_N, k: float = BB_K):
+    """(média, banda superior, banda inferior, %b)."""
+    mid, sd = _rolling(close, n)
+    up, lo = mid + k * sd, mid - k * sd
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_b = np.where(up > lo, (close - lo) / (up - lo), 0.5)
+    return mid, up, lo, pct_b
+
+
+def volume_z(volume: np.ndarray, n: int = VOL_N) -> np.ndarray:
+    mean, sd = _rolling(volume, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(sd > 0, (volume - mean) / sd, 0.0)
+
+
+# ---------- força e tamanho ----------
+
+def combine(close, ema_f, ema_s, rsi_v, atr_v, pct_b, vz) -> Tuple[np.ndarray, np.ndarray]:
+    """Junta os indicadores num placar em [-1, 1]: tendência das EMAs medida
+    em ATRs, momento do RSI, posição nas bandas e volume a favor. Devolve
+    (direção +1/-1/0, força 0..100)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trend = np.clip(np.where(atr_v > 0, (ema_f - ema_s) / atr_v, 0.0), -1, 1)
+    mom = np.clip((rsi_v - 50.0) / 25.0, -1, 1)
+    band = np.clip(2.0 * np.nan_to_num(pct_b, nan=0.5) - 1.0, -1, 1)
+    raw = 0.4 * trend + 0.3 * mom + 0.2 * band
+    raw = raw + 0.1 * np.clip(np.nan_to_num(vz) / 3.0, 0, 1) * np.sign(raw)
+    # RSI esticado na direção do sinal: metade da força
+    stretched = ((rsi_v > 80) & (raw > 0)) | ((rsi_v < 20) & (raw < 0))
+    raw = np.where(stretched, raw * 0.5, raw)
+    return np.sign(raw), np.round(np.abs(raw) * 100.0)
+
+
+def position_pct(forca, atr_v, close, profile: Profile) -> np.ndarray:
+    span = max(1, 100 - profile.min_forca)
+    pct = profile.pct_min + (profile.pct_max - profile.pct_min) * (np.asarray(forca) - profile.min_forca) / span
+    with np.errstate(divide="ignore", invalid="ignore"):
+        atr_pct = np.where(close > 0, atr_v / close * 100.0, 0.0)
+        scale = np.where(atr_pct > profile.max_atr_pct, profile.max_atr_pct / atr_pct, 1.0)
+    pct = np.clip(pct * scale, 0, profile.pct_max)
+    return np.where(np.asarray(forca) >= profile.min_forca, np.round(pct), 0)
+
+
+def score_bars(bars: np.ndarray, ema_fast: int = EMA_FAST, ema_slow: int = EMA_SLOW, rsi_n: int = RSI_N,
+               atr_n: int = ATR_N, bb_n: int = BB_N, bb_k: float = BB_K, vol_n: int = VOL_N) -> Dict[str, np.ndarray]:
+    """Indicadores e placar de cada vela de `bars` (n, 6) ou de um lote
+    (k, n, 6) — tudo em operações de array, sem laço por vela. Os períodos
+    só mudam nas varreduras do backtest; o painel usa os padrões."""
+    c, h, l, v = bars[..., CLOSE], bars[..., HIGH], bars[..., LOW], bars[..., VOLUME]
+    out = {"close": c, "ema_f": ema(c, ema_fast), "ema_s": ema(c, ema_slow), "rsi": rsi(c, rsi_n),
+           "atr": atr(h, l, c, atr_n), "pct_b": bollinger(c, bb_n, bb_k)[3], "vz": volume_z(v, vol_n)}
+    out["dir"], out["forca"] = combine(c, out["ema_f"], out["ema_s"], out["rsi"], out["atr"],
+                                       out["pct_b"], out["vz"])
+    return out
+
+
+# ---------- atualização incremental por vela fechada ----------
+
+class IncrementalState:
+    """Recorrências das EMAs, do RSI e do ATR (O(1) por vela); Bollinger e
+    z do volume usam só a janela das últimas BB_N/VOL_N velas."""
+
+    __slots__ = ("ts", "close", "ema_f", "ema_s", "ag", "al", "atr")
+
+    @classmethod
+    def seed(cls, bars: np.ndarray) -> "IncrementalState":
+        c, h, l = bars[:, CLOSE], bars[:, HIGH], bars[:, LOW]
+        d = np.diff(c, prepend=c[:1])
+        st = cls()
+        st.ts, st.close = bars[-1, TS], c[-1]
+        st.ema_f, st.ema_s = ema(c, EMA_FAST)[-1], ema(c, EMA_SLOW)[-1]
+        st.ag = _ewm(np.maximum(d, 0.0), 1.0 / RSI_N)[-1]
+        st.al = _ewm(np.maximum(-d, 0.0), 1.0 / RSI_N)[-1]
+        st.atr = atr(h, l, c)[-1]
+        return st
+
+    def update(self, bar: np.ndarray) -> None:
+        c, h, l = bar[CLOSE], bar[HIGH], bar[LOW]
+        d = c - self.close
+        tr = max(h - l, abs(h - self.close), abs(l - self.close))
+        af, as_, an = 2.0 / (EMA_FAST + 1), 2.0 / (EMA_SLOW + 1), 1.0 / RSI_N
+        self.ema_f += af * (c - self.ema_f)
+        self.ema_s += as_ * (c - self.ema_s)
+        self.ag += an * (max(d, 0.0) - self.ag)
+        self.al += an * (max(-d, 0.0) - self.al)
+        self.atr += (1.0 / ATR_N) * (tr - self.atr)
+        self.ts, self.close = bar[TS], c
+
+    def rsi(self) -> float:
+        if self.al > 0:
+            return 100.0 - 100.0 / (1.0 + self.ag / self.al)
+        return 100.0 if self.ag > 0 else 50.0
+
+
+class SignalEngine:
+    """Liga o motor de velas ao feed: a cada vela fechada atualiza o estado
+    do (corretora, ativo, tempo) e, se a força passar do mínimo do perfil,
+    publica o sinal com validade. scan() pontua todas as séries de uma vez
+    (matriz ativos × velas) para o ranking Top-N."""
+
+    def __init__(self, candles: CandleEngine, profile: str = "moderado", feed=None,
+                 timeframes: Optional[Iterable[str]] = None, min_gap: float = MIN_GAP_S,
+                 window: float = SIGNAL_WINDOW_S):
+        self.candles = candles
+        self.profile = PROFILES[profile]
+        self.feed = feed
+        self.timeframes = set(timeframes or TIMEFRAMES)
+        self.min_gap = min_gap
+        self.window = window
+        self.states: Dict[Tuple[str, str, str], IncrementalState] = {}
+        self.last_signal: Dict[Tuple[str, str], float] = {}
+        self.lock = threading.Lock()
+        candles.on_close(self.on_close)
+
+    def _signal(self, exchange, symbol, tf, direction, forca, pct, close, now) -> dict:
+        return {"corretora": exchange, "ativo": symbol, "vela": tf,
+                "direcao": "COMPRA" if direction > 0 else "VENDA",
+                "forca": int(forca), "pct": int(pct), "preco": float(close),
+                "perfil": self.profile.nome, "ts": now, "exp": now + self.window}
+
+    def on_close(self, exchange: str, symbol: str, tf: str, ring: CandleRing) -> Optional[dict]:
+        if tf not in self.timeframes or len(ring) < 2:
+            return None
+        key = (exchange, symbol, tf)
+        with self.lock:
+            st = self.states.get(key)
+            bar = ring.latest(2)[0]             # a última da ring já é a vela nova
+            if st is None:
+                hist = ring.latest(len(ring))[:-1]
+                if len(hist) < max(EMA_SLOW, BB_N):
+                    return None
+                st = self.states[key] = IncrementalState.seed(hist)
+            elif bar[TS] > st.ts:
+                st.update(bar)
+            else:
+                return None
+        win = ring.latest(max(BB_N, VOL_N) + 1)[:-1]
+        pct_b = bollinger(win[:, CLOSE])[3][-1]
+        vz = volume_z(win[:, VOLUME])[-1]
+        direction, forca = combine(st.close, st.ema_f, st.ema_s, st.rsi(), st.atr, pct_b, vz)
+        pct = position_pct(forca, st.atr, st.close, self.profile)
+        if not direction or forca < self.profile.min_forca:
+            return None
+        return self._emit(exchange, symbol, tf, direction, forca, pct, st.close)
+
+    def _emit(self, exchange, symbol, tf, direction, forca, pct, close) -> Optional[dict]:
+        now = time.time()
+        with self.lock:
+            if now - self.last_signal.get((exchange, symbol), 0.0) < self.min_gap:
+                return None
+            self.last_signal[(exchange, symbol)] = now
+        sig = self._signal(exchange, symbol, tf, direction, forca, pct, close, now)
+        if self.feed is not None:
+            self.feed.publish(sig)
+        return sig
+
+    def scan(self, top: int = 20, keys: Optional[Iterable[Tuple[str, str]]] = None,
+             publish: bool = False) -> List[dict]:
+        """Pontua a vela fechada mais recente de cada série (WARMUP velas de
+        histórico) num único lote vetorizado e devolve as `top` mais fortes
+        acima do mínimo do perfil."""
+        keys = list(keys or self.candles.keys())
+        batch, owners = [], []
+        for tf in self.timeframes:
+            for ex, sym in keys:
+                ring = self.candles.series(ex, sym, tf)
+                if len(ring) > WARMUP:
+                    batch.append(ring.latest(WARMUP + 1)[:-1])
+                    owners.append((ex, sym, tf))
+        if not batch:
+            return []
+        sc = score_bars(np.stack(batch))
+        last = {k: v[:, -1] for k, v in sc.items()}
+        pct = position_pct(last["forca"], last["atr"], last["close"], self.profile)
+        hits = np.flatnonzero((last["dir"] != 0) & (last["forca"] >= self.profile.min_forca))
+        found = [(last["forca"][i], *owners[i], last["dir"][i], pct[i], last["close"][i]) for i in hits]
+        found.sort(key=lambda f: -f[0])
+        now = time.time()
+        out = []
+        for forca, ex, sym, tf, d, pct, close in found[:top]:
+            if publish:
+                sig = self._emit(ex, sym, tf, d, forca, pct, close)
+                if sig:
+                    out.append(sig)
+            else:
+                out.append(self._signal(ex, sym, tf, d, forca, pct, close, now))
+        return out
@@ -0,0 +1,106 @@
+# signal_feed.py - difusão de sinais em memória para SSE / polling do /bot/sinais
+import os, json, time, itertools, threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# mesmo prazo do SIGNAL_WINDOW_MS das telas (45 s); depois disso o sinal sai
+SIGNAL_WINDOW_S = float(os.environ.get("SIGNAL_WINDOW_S", "45"))
+HISTORY = int(os.environ.get("SIGNAL_HISTORY", "1024"))
+KEEPALIVE_S = 15.0
+
+FIELDS = ("corretora", "ativo", "vela", "direcao", "pct", "forca", "preco", "perfil")
+
+
+class SignalFeed:
+    """Um publish vira um evento numerado num buffer circular; cada cliente
+    só guarda o último número que viu e recebe o que veio depois. Eventos são
+    deltas compactos: {"seq", "op": "+", "s": sinal} ou {"seq", "op": "-",
+    "id"} quando o sinal expira. Quem ficou para trás do buffer recebe um
+    "reset" com os sinais ativos."""
+
+    def __init__(self, window: float = SIGNAL_WINDOW_S, history: int = HISTORY):
+        self.window = window
+        self.events: deque = deque(maxlen=history)
+        self.active: Dict[str, dict] = {}
+        self.seq = 0
+        self.ids = itertools.count(1)
+        self.cond = threading.Condition()
+
+    def _push(self, ev: dict) -> None:
+        self.seq += 1
+        ev["seq"] = self.seq
+        self.events.append(ev)
+
+    def _expire(self, now: float) -> bool:
+        gone = [sid for sid, s in self.active.items() if s["exp"] <= now]
+        for sid in gone:
+            del self.active[sid]
+            self._push({"op": "-", "id": sid})
+        return bool(gone)
+
+    def publish(self, signal: dict, now: Optional[float] = None) -> dict:
+        now = time.time() if now is None else now
+        s = {k: signal[k] for k in FIELDS if signal.get(k) is not None}
+        s["id"] = str(signal.get("id") or next(self.ids))
+        s["ts"] = round(float(signal.get("ts") or now), 3)
+        s["exp"] = round(s["ts"] + self.window, 3)
+        with self.cond:
+            self._expire(now)
+            if s["exp"] > now:
+                self.active[s["id"]] = s
+                self._push({"op": "+", "s": s})
+                self.cond.notify_all()
+        return s
+
+    def snapshot(self) -> Tuple[int, List[dict]]:
+        with self.cond:
+            if self._expire(time.time()):
+                self.cond.notify_all()
+            return self.seq, sorted(self.active.values(), key=lambda s: s["ts"])
+
+    def since(self, seq: int) -> Tuple[int, Optional[List[dict]]]:
+        """(último seq, eventos depois de `seq`); None se o cliente perdeu
+        eventos que já saíram do buffer e precisa de snapshot()."""
+        with self.cond:
+            if self._expire(time.time()):
+                self.cond.notify_all()
+            return self._since(seq)
+
+    def _since(self, seq: int) -> Tuple[int, Optional[List[dict]]]:
+        if seq == self.seq:
+            return self.seq, []
+        if seq > self.seq:
+            # processo reiniciado: a numeração do cliente não vale mais
+            return self.seq, None
+        first = self.events[0]["seq"] if self.events else self.seq + 1
+        if seq < first - 1:
+            return self.seq, None
+        return self.seq, [ev for ev in self.events if ev["seq"] > seq]
+
+    def wait(self, seq: int, timeout: float = KEEPALIVE_S) -> Tuple[int, Optional[List[dict]]]:
+        """Bloqueia até haver algo depois de `seq` ou o timeout passar. O
+        próximo vencimento encurta a espera, então a expiração sai no
+        horário mesmo sem novos publishes."""
+        deadline = time.time() + timeout
+        with self.cond:
+            while True:
+                now = time.time()
+                if self._expire(now):
+                    self.cond.notify_all()
+                if self.seq != seq or now >= deadline:
+                    return self._since(seq)
+                nxt = min((s["exp"] for s in self.active.values()), default=deadline)
+                self.cond.wait(max(0.05, min(deadline, nxt) - now))
+
+
+def reset_event(feed: "SignalFeed") -> dict:
+    seq, active = feed.snapshot()
+    return {"seq": seq, "op": "=", "sinais": active, "agora": round(time.time(), 3)}
+
+
+def sse(event: dict) -> str:
+    data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {event['seq']}\ndata: {data}\n\n"
+
+
+FEED = SignalFeed()
@@ -0,0 +1,48 @@
+# sync_manifest.py - o que já foi enviado ao WooCommerce (SKU -> id + hash do payload)
+import os, json, hashlib, threading
+from typing import Any, Dict, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_PATH = os.environ.get("SYNC_MANIFEST_PATH") or os.path.join(BASE_DIR, ".cache", "sync", "woo_manifest.json")
+
+
+def digest(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class SyncManifest:
+    """Mapa compacto em JSON {sku: [id, hash]}. Com ele o importador pula o
+    que não mudou e atualiza por id o que mudou, sem GET de consulta."""
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.items: Dict[str, list] = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.items = json.load(f).get("items", {})
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, sku: str) -> Optional[Tuple[int, str]]:
+        it = self.items.get(sku)
+        return (it[0], it[1]) if it else None
+
+    def set(self, sku: str, product_id: int, content_hash: str) -> None:
+        with self.lock:
+            self.items[sku] = [product_id, content_hash]
+
+    def drop(self, sku: str) -> None:
+        with self.lock:
+            self.items.pop(sku, None)
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with self.lock, open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "items": self.items}, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
@@ -0,0 +1,55 @@
+# tests/test_price.py - parse_series (vetorizado) tem de concordar com parse_price
+#
+#   python -m pytest tests/
+import json, math, sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+pd = pytest.importorskip("pandas")
+from price import parse_price, parse_series  # noqa: E402
+
+CORPUS = BASE_DIR / "bench" / "fixtures" / "precos.jsonl"
+
+# os dois separadores, milhar adivinhado e separador decimal repetido
+MIXED = [
+    "12,345.678", "1.234,567", "1,234.5", "1.234,5", "-1.234,50", "R$ 12.345,678", "US$ 12,345.678",
+    "1.234", "12.345.678", "1,234", "1,234,567", "US$ 1,234", "849,00", "683.46", "10",
+    "1.234.56", "1,234,56", "R$ 1.234.56", "1.234,567,89", "1,234.567.89",
+    "R$ 99,90 à vista", "abc", "", None,
+]
+
+
+def _texts():
+    with open(CORPUS, encoding="utf-8") as f:
+        return MIXED + [json.loads(line)["text"] for line in f if line.strip()]
+
+
+@pytest.mark.parametrize("text", _texts())
+def test_series_matches_scalar(text):
+    row = parse_series([text]).iloc[0]
+    p = parse_price(text)
+    if p.amount is None:
+        assert math.isnan(row["amount"]) and row["currency"] is None and row["confidence"] == 0.0
+    else:
+        assert row["amount"] == pytest.approx(float(p.amount))
+        assert row["currency"] == p.currency
+        assert row["confidence"] == pytest.approx(p.confidence)
+
+
+def test_series_mixed_column():
+    # a coluna inteira (com repetições) dá o mesmo que linha a linha
+    texts = MIXED * 3
+    df = parse_series(texts)
+    for text, (_, row) in zip(texts, df.iterrows()):
+        p = parse_price(text)
+        expected = float(p.amount) if p.amount is not None else None
+        assert (math.isnan(row["amount"]) if expected is None else row["amount"] == pytest.approx(expected)), text
+
+
+def test_mixed_separators():
+    assert parse_price("12,345.678").amount == parse_price("12.345,678").amount
+    assert parse_series(["12,345.678"]).iloc[0]["amount"] == pytest.approx(12345.678)
@@ -0,0 +1,132 @@
+# woo_taxonomy.py - categorias e tags do WooCommerce resolvidas em memória
+import re, html, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+# request(method, path, **kwargs) -> requests.Response, com auth já aplicada
+Request = Callable[..., requests.Response]
+
+DEFAULT_CATEGORY = "Afiliados"
+PATH_SPLIT = re.compile(r"[|>/]")
+LIST_SPLIT = re.compile(r"[;,]")
+
+
+def _norm(name: str) -> str:
+    return html.unescape(name or "").strip().lower()
+
+
+def fetch_all(request: Request, path: str, workers: int = 4, **params) -> List[dict]:
+    """Todas as páginas de uma coleção: a primeira diz quantas são
+    (X-WP-TotalPages) e as demais vêm em paralelo."""
+    def page(n: int) -> List[dict]:
+        r = request("GET", path, params=dict(params, per_page=100, page=n))
+        if r.status_code != 200:
+            raise RuntimeError(f"Falha ao listar {path}: {r.status_code} {r.text[:300]}")
+        return r.json()
+
+    first = request("GET", path, params=dict(params, per_page=100, page=1))
+    if first.status_code != 200:
+        raise RuntimeError(f"Falha ao listar {path}: {first.status_code} {first.text[:300]}")
+    out = list(first.json())
+    total = int(first.headers.get("X-WP-TotalPages") or 1)
+    if total > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for items in pool.map(page, range(2, total + 1)):
+                out.extend(items)
+    return out
+
+
+class TaxonomyResolver:
+    """Carrega categorias e tags uma vez e resolve nomes por um índice
+    (nome sem caixa, pai). Nós que faltam são criados uma única vez, então o
+    custo em chamadas é O(nomes distintos), não O(linhas × profundidade)."""
+
+    def __init__(self, request: Request, workers: int = 4, default_category: str = DEFAULT_CATEGORY):
+        self.request = request
+        self.workers = workers
+        self.default_category = default_category
+        self.cats: Dict[Tuple[str, int], int] = {}
+        self.tags: Dict[str, int] = {}
+        self.created = 0
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def load(self) -> "TaxonomyResolver":
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            cats = pool.submit(fetch_all, self.request, "/products/categories", self.workers)
+            tags = pool.submit(fetch_all, self.request, "/products/tags", self.workers)
+            for c in cats.result():
+                self.cats[(_norm(c["name"]), c.get("parent") or 0)] = c["id"]
+            for t in tags.result():
+                self.tags[_norm(t["name"])] = t["id"]
+        self.loaded = True
+        return self
+
+    def _create(self, path: str, payload: dict) -> int:
+        r = self.request("POST", path, json=payload)
+        if r.status_code in (200, 201):
+            self.created += 1
+            return r.json()["id"]
+        # criado por outro processo desde o load(): a API devolve o id existente
+        try:
+            err = r.json()
+        except ValueError:
+            err = {}
+        if err.get("code") == "term_exists" and (err.get("data") or {}).get("resource_id"):
+            return err["data"]["resource_id"]
+        raise RuntimeError(f"Falha ao criar {payload.get('name')}: {r.status_code} {r.text[:300]}")
+
+    def category(self, name: str, parent: int = 0) -> int:
+        key = (_norm(name), parent)
+        cid = self.cats.get(key)
+        if cid is None:
+            with self.lock:
+                cid = self.cats.get(key)
+                if cid is None:
+                    cid = self.cats[key] = self._create("/products/categories",
+                                                        {"name": name.strip(), "parent": parent})
+        return cid
+
+    def category_path(self, path: str) -> int:
+        """'Casa > Cozinha > Utensílios' -> id da folha, criando o que faltar."""
+        if not self.loaded:
+            self.load()
+        parts = [p.strip() for p in PATH_SPLIT.split(path or "") if p.strip()] or [self.default_category]
+        parent = 0
+        for p in parts:
+            parent = self.category(p, parent)
+        return parent
+
+    def categories(self, cell: str) -> List[Dict[str, int]]:
+        out, seen = [], set()
+        for tok in LIST_SPLIT.split(cell or ""):
+            if tok.strip():
+                cid = self.category_path(tok)
+                if cid not in seen:
+                    out.append({"id": cid})
+                    seen.add(cid)
+        return out or [{"id": self.category_path(self.default_category)}]
+
+    def tag(self, name: str) -> int:
+        if not self.loaded:
+            self.load()
+        key = _norm(name)
+        tid = self.tags.get(key)
+        if tid is None:
+            with self.lock:
+                tid = self.tags.get(key)
+                if tid is None:
+                    tid = self.tags[key] = self._create("/products/tags", {"name": name.strip()})
+        return tid
+
+    def tag_ids(self, cell: Optional[str]) -> List[Dict[str, int]]:
+        out, seen = [], set()
+        for tok in LIST_SPLIT.split(cell or ""):
+            if tok.strip():
+                tid = self.tag(tok)
+                if tid not in seen:
+                    out.append({"id": tid})
+                    seen.add(tid)
+        return out